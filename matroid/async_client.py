@@ -0,0 +1,483 @@
+import asyncio
+import functools
+import time
+
+from matroid import error
+from matroid.client import BASE_URL, MatroidAPI, configure_client
+from matroid.src.accounts import (
+    load_stored_token,
+    requires_new_token,
+    token_request_data,
+)
+from matroid.src.helpers import (
+    STREAM_CHUNK_SIZE,
+    check_api_response,
+    get_retry_policy,
+    parse_formatted,
+    to_formatted,
+)
+from matroid.src.images import (
+    CachedResults,
+    cached_localization,
+    file_batches,
+    localization_key,
+    merge_batch_results,
+)
+from matroid.src.async_session import (
+    AsyncSession,
+    RequestRecorder,
+    TRANSPORT_ERRORS,
+    DEFAULT_ASYNC_POOL_SIZE,
+    DEFAULT_ASYNC_POOL_MAXSIZE,
+    DEFAULT_ASYNC_POOL_IDLE_TIMEOUT,
+    to_response,
+)
+from matroid.src.results import timed_results, typed_results
+from matroid.src.token_renewal import renew_token_forever
+from matroid.src.csv_stream import DEFAULT_CHUNK_ROWS, CSVParser
+from matroid.src.detectors import detector_info_seen
+from matroid.src.streams import (
+    CONNECT_TIMEOUT,
+    INITIAL_BACKOFF_SECS,
+    MAX_BACKOFF_SECS,
+    MonitoringResume,
+    read_timeout,
+    reconnect_delay,
+    request_monitoring_result,
+)
+from matroid.src.video_summary import request_video_summary_tracks
+from matroid.src.videos import VideoResultsParser, request_video_results
+
+
+def async_api_call(api_method):
+    """Turns an @api_call decorated MatroidAPI method into a coroutine on the async transport"""
+    build_request = api_method.__wrapped__
+    default_error = api_method.default_error
+    endpoint = api_method.endpoint
+    name = api_method.public_name
+
+    @functools.wraps(build_request)
+    async def setup_and_teardown(self, *original_args, **original_kwargs):
+        policy = get_retry_policy(self, build_request.__name__, name)
+        if not policy:
+            return await send_api_call(
+                self, build_request, default_error, original_args, original_kwargs, name
+            )
+
+        policy.record_request()
+        (_, method) = self.endpoints[endpoint]
+        started_at = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return await send_api_call(
+                    self, build_request, default_error, original_args, original_kwargs, name
+                )
+            except error.APIError as e:
+                elapsed = time.monotonic() - started_at
+                delay = policy.next_delay(e, attempt, method, elapsed)
+                if delay is None:
+                    raise
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    return setup_and_teardown
+
+
+async def send_api_call(
+    self, build_request, default_error, original_args, original_kwargs, name=None
+):
+    """See matroid.src.helpers.send_api_call"""
+    await self.retrieve_token()
+    token = self.token
+    name = name or build_request.__name__
+
+    if self.rate_limiter:
+        await self.rate_limiter.acquire_async(name)
+
+    response = await self.send(
+        await prepare_request(self, build_request, original_args, original_kwargs)
+    )
+
+    try:
+        check_api_response(self, name, response, default_error)
+    except error.TokenExpirationError:
+        await self.retrieve_token(
+            options={"request_from_server": True, "stale_token": token}
+        )
+        response = await self.send(
+            await prepare_request(self, build_request, original_args, original_kwargs)
+        )
+        check_api_response(self, name, response, default_error)
+
+    return typed_results(self, build_request.__name__, self.format_response(response))
+
+
+async def prepare_request(self, build_request, original_args, original_kwargs):
+    if self.image_preprocessor:
+        # uploads wait for the preprocessing pool, which must not block the event loop
+        return await asyncio.to_thread(
+            build_request, self, *original_args, **original_kwargs
+        )
+
+    return build_request(self, *original_args, **original_kwargs)
+
+
+class AsyncMatroidAPI(object):
+    """
+    asyncio counterpart of MatroidAPI: every API method is a coroutine sharing the
+    endpoint table, request encoding and error mapping of the blocking client.
+
+    async with AsyncMatroid(client_id=..., client_secret=...) as api:
+        res = await api.classify_image(detectorId, url=url)
+    """
+
+    from matroid.src.helpers import (
+        bytes_to_mb,
+        bytes_to_gb,
+        check_errors,
+        format_response,
+        save_token,
+        Token,
+        FileReader,
+    )
+
+    def __init__(
+        self, base_url=BASE_URL, client_id=None, client_secret=None, options={}
+    ):
+        """
+        Takes the same arguments and options as MatroidAPI (token_renewal runs as a task on the
+        event loop), with these pool options:
+          set pool_size to the maximum number of open connections (default 100)
+          set pool_maxsize to the maximum number of open connections per host (default 100)
+          set keep_alive to False to close the connection after every request
+          set pool_idle_timeout to the number of seconds idle connections are kept open (default 60)
+        """
+
+        configure_client(self, base_url, client_id, client_secret, options)
+
+        self.token_lock = asyncio.Lock()
+        # the shared endpoint functions build their requests through self.session
+        self.session = RequestRecorder()
+        self.async_session = AsyncSession(
+            pool_size=options.get("pool_size", DEFAULT_ASYNC_POOL_SIZE),
+            pool_maxsize=options.get("pool_maxsize", DEFAULT_ASYNC_POOL_MAXSIZE),
+            keep_alive=options.get("keep_alive", True),
+            idle_timeout=options.get(
+                "pool_idle_timeout", DEFAULT_ASYNC_POOL_IDLE_TIMEOUT
+            ),
+        )
+        self.token_renewer = None
+
+    async def send(self, prepared, timeout=None):
+        """Sends a request built by one of the endpoint functions"""
+        try:
+            return await self.async_session.send(prepared, timeout)
+        except TRANSPORT_ERRORS as e:
+            raise error.APIConnectionError(message=e)
+
+    async def retrieve_token(self, options={}):
+        """See MatroidAPI.retrieve_token"""
+        self.start_token_renewal()
+
+        if not requires_new_token(self, options):
+            return self.token
+
+        # only one coroutine talks to the token endpoint, the others wait and reuse its token
+        async with self.token_lock:
+            if not requires_new_token(self, options):
+                return self.token
+
+            if not self.token_store:
+                return await self.request_token(options)
+
+            store_lock = self.token_store.lock(self.token_store_key)
+            # waiting for another process to refresh must not block the event loop
+            await asyncio.to_thread(store_lock.__enter__)
+            try:
+                if load_stored_token(self, options):
+                    return self.token
+
+                return await self.request_token(options)
+            finally:
+                store_lock.__exit__(None, None, None)
+
+    async def request_token(self, options):
+        """Requests a new token from the server and saves it"""
+        (endpoint, method) = self.endpoints["token"]
+
+        query_data = token_request_data(self, options)
+        response = await self.send(
+            self.session.request(method, endpoint, data=query_data)
+        )
+
+        self.check_errors(response, error.AuthorizationError)
+
+        self.save_token(response)
+
+        return response.json()
+
+    async def classify_image(self, detectorId, file=None, url=None, **options):
+        """See MatroidAPI.classify_image; the batches of a large file list are sent concurrently"""
+        results = await self.cached_classification(detectorId, file, url, options)
+        return typed_results(self, "classify_image", results)
+
+    async def cached_classification(self, detectorId, file=None, url=None, options={}):
+        if not self.result_cache or (file is None) == (url is None):
+            return await self.classify_in_batches(detectorId, file, url, options)
+
+        if url is None:
+            cached = CachedResults(self, detectorId, file, False, options)
+        else:
+            cached = CachedResults(self, detectorId, url, True, options)
+        response = None
+        if cached.missing:
+            response = await self.classify_in_batches(
+                detectorId, options=options, **cached.request()
+            )
+
+        return cached.complete(response)
+
+    async def classify_in_batches(self, detectorId, file=None, url=None, options={}):
+        batches = file_batches(file) if not url else None
+        if not batches or len(batches) == 1:
+            return await self.classify_image_batch(
+                detectorId, file=file, url=url, **options
+            )
+
+        responses = await asyncio.gather(
+            *[
+                self.classify_image_batch(
+                    detectorId, file=[file[index] for index in batch], **options
+                )
+                for batch in batches
+            ]
+        )
+
+        return merge_batch_results(self, batches, responses)
+
+    async def get_detector_info(self, detectorId):
+        """See MatroidAPI.get_detector_info"""
+        info = await self.request_detector_info(detectorId)
+        if self.result_cache:
+            detector_info_seen(self, detectorId, info)
+        return info
+
+    detector_info = get_detector_info
+
+    async def localize_image(self, localizer, localizerLabel, **options):
+        """See MatroidAPI.localize_image"""
+        if not self.result_cache or options.get("update"):
+            return await self.localize_image_batch(localizer, localizerLabel, **options)
+
+        key = localization_key(self, localizer, localizerLabel, options)
+        result = self.result_cache.get(localizer, key)
+        if result is None:
+            response = await self.localize_image_batch(
+                localizer, localizerLabel, **options
+            )
+            result = parse_formatted(self, response)
+            self.result_cache.put(localizer, key, result)
+        else:
+            result = cached_localization(result, options)
+
+        return to_formatted(self, result)
+
+    async def watch_monitoring_result(self, monitoringId, backfill=True, **options):
+        """
+        See MatroidAPI.watch_monitoring_result; yields detection events with `async for`,
+        reconnecting and resuming the same way without holding a thread. Breaking out of the
+        loop, closing the generator or cancelling the task consuming it closes the
+        connection right away.
+        """
+        events = self.watch_resumed(MonitoringResume(monitoringId, backfill))
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+
+    async def watch_resumed(self, resume):
+        """Watches the monitoring of a MonitoringResume, which keeps its reconnection state"""
+        (endpoint, method) = self.endpoints["watch_monitoring_result"]
+        endpoint = endpoint.replace(":key", resume.monitoringId)
+        parser = resume.parser
+        backoff = INITIAL_BACKOFF_SECS
+
+        while True:
+            parser.reset()
+            await self.retrieve_token()
+            token = self.token
+            headers = {"Authorization": token.authorization_header()}
+            headers.update(resume.headers())
+            prepared = self.session.request(method, endpoint, headers=headers)
+
+            try:
+                async with self.async_session.open(
+                    prepared, timeout=(CONNECT_TIMEOUT, read_timeout(self))
+                ) as res:
+                    if res.status >= 400 and res.status < 500:
+                        content = await res.read()
+                        self.check_errors(
+                            to_response(prepared, res, content), error.InvalidQueryError
+                        )
+                    res.raise_for_status()
+                    resume.opened()
+                    backoff = reconnect_delay(parser)
+
+                    backfill_params = resume.backfill_params()
+                    if backfill_params is not None:
+                        backfill_response = await self.send(
+                            request_monitoring_result(
+                                self, resume.monitoringId, backfill_params
+                            )
+                        )
+                        self.check_errors(backfill_response, error.InvalidQueryError)
+                        for event in resume.backfilled(
+                            self.json_decoder(backfill_response.content)
+                        ):
+                            yield timed_results(event) if self.typed_results else event
+
+                    async for chunk in res.content.iter_any():
+                        # each event is delivered with its own id, if it has one
+                        for message in parser.feed(chunk):
+                            event = resume.deliver(message.data, message.id)
+                            if event is not None:
+                                yield timed_results(event) if self.typed_results else event
+                    resume.disconnected()
+            except error.TokenExpirationError:
+                await self.retrieve_token(
+                    options={"request_from_server": True, "stale_token": token}
+                )
+            except TRANSPORT_ERRORS + (error.APIConnectionError,) as e:
+                # including a failed backfill
+                resume.disconnected(e)
+                await asyncio.sleep(backoff)
+                backoff = min(MAX_BACKOFF_SECS, backoff * 2)
+
+    async def stream_video_results(
+        self, videoId, chunk_size=STREAM_CHUNK_SIZE, **options
+    ):
+        """See MatroidAPI.stream_video_results; yields the frames with `async for`"""
+        options["format"] = "json"
+        async for frame in self.stream_parsed(
+            "get_video_results",
+            lambda: request_video_results(self, videoId, options),
+            VideoResultsParser(self),
+            chunk_size,
+        ):
+            yield frame
+
+    async def stream_monitoring_result(
+        self,
+        monitoringId,
+        columnar=None,
+        chunk_rows=DEFAULT_CHUNK_ROWS,
+        chunk_size=STREAM_CHUNK_SIZE,
+        **options
+    ):
+        """See MatroidAPI.stream_monitoring_result; yields the rows with `async for`"""
+        parser = CSVParser(columnar, chunk_rows)
+        options["format"] = "csv"
+        async for rows in self.stream_parsed(
+            "get_monitoring_result",
+            lambda: request_monitoring_result(self, monitoringId, options),
+            parser,
+            chunk_size,
+        ):
+            yield rows
+
+    async def stream_video_summary_tracks(
+        self,
+        summaryId,
+        columnar=None,
+        chunk_rows=DEFAULT_CHUNK_ROWS,
+        chunk_size=STREAM_CHUNK_SIZE,
+    ):
+        """See MatroidAPI.stream_video_summary_tracks; yields the rows with `async for`"""
+        parser = CSVParser(columnar, chunk_rows)
+        async for rows in self.stream_parsed(
+            "get_video_summary_tracks",
+            lambda: request_video_summary_tracks(self, summaryId),
+            parser,
+            chunk_size,
+        ):
+            yield rows
+
+    async def stream_parsed(self, name, request, parser, chunk_size):
+        """
+        Yields the items an incremental parser decodes from the response to request(), which
+        builds a request of API method `name`. Like open_streamed_response, the call is paced
+        by the rate limiter and the token is refreshed once if the server rejects it.
+        """
+        await self.retrieve_token()
+        token = self.token
+        if self.rate_limiter:
+            await self.rate_limiter.acquire_async(name)
+
+        refreshed = False
+        try:
+            while True:
+                prepared = request()
+                # no total timeout, large results take a while to download
+                async with self.async_session.open(
+                    prepared, timeout=(CONNECT_TIMEOUT, None)
+                ) as res:
+                    if res.status >= 400:
+                        content = await res.read()
+                        try:
+                            check_api_response(
+                                self,
+                                name,
+                                to_response(prepared, res, content),
+                                error.InvalidQueryError,
+                            )
+                        except error.TokenExpirationError:
+                            if refreshed:
+                                raise
+                            refreshed = True
+                            await self.retrieve_token(
+                                options={
+                                    "request_from_server": True,
+                                    "stale_token": token,
+                                }
+                            )
+                            continue
+
+                    async for chunk in res.content.iter_chunked(chunk_size):
+                        for item in parser.feed(chunk):
+                            yield item
+                    for item in parser.close():
+                        yield item
+                    return
+        except TRANSPORT_ERRORS as e:
+            raise error.APIConnectionError(message=e)
+
+    def start_token_renewal(self):
+        if self.token_renewal and not self.token_renewer:
+            self.token_renewer = asyncio.get_running_loop().create_task(
+                renew_token_forever(self)
+            )
+
+    async def close(self):
+        """Closes all pooled connections held by this client and stops token renewal"""
+        if self.token_renewer:
+            self.token_renewer.cancel()
+            self.token_renewer = None
+        await self.async_session.close()
+
+    async def __aenter__(self):
+        self.start_token_renewal()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+for name, member in list(vars(MatroidAPI).items()):
+    if hasattr(member, "default_error"):
+        setattr(AsyncMatroidAPI, name, async_api_call(member))
+
+
+AsyncMatroid = AsyncMatroidAPI
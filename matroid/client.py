@@ -1,6 +1,8 @@
+import json
 import os
 import re
 import sys
+import threading
 
 from matroid import error
 from matroid.src.helpers import api_call
@@ -27,6 +29,7 @@ class MatroidAPI(object):
         train_detector,
         get_detector_info,
         detector_info,
+        request_detector_info,
         import_detector,
         redo_detector,
         search_detectors,
@@ -34,8 +37,18 @@ class MatroidAPI(object):
         add_feedback,
         delete_feedback,
     )
-    from matroid.src.images import classify_image, localize_image
-    from matroid.src.videos import classify_video, get_video_results
+    from matroid.src.images import (
+        classify_image,
+        classify_image_batch,
+        classify_images,
+        localize_image,
+        localize_image_batch,
+    )
+    from matroid.src.videos import (
+        classify_video,
+        get_video_results,
+        stream_video_results,
+    )
     from matroid.src.streams import (
         create_stream,
         update_stream,
@@ -44,6 +57,7 @@ class MatroidAPI(object):
         delete_stream,
         watch_monitoring_result,
         get_monitoring_result,
+        stream_monitoring_result,
         kill_monitoring,
         monitor_stream,
         search_monitorings,
@@ -76,6 +90,7 @@ class MatroidAPI(object):
         create_video_summary,
         get_video_summary,
         get_video_summary_tracks,
+        stream_video_summary_tracks,
         get_video_summary_file,
         delete_video_summary,
         create_stream_summary,
@@ -102,42 +117,126 @@ class MatroidAPI(object):
         client_id: OAuth public API key
         client_secret: OAuth private API key
         options (dict):
-          set json_format to False to return API results as strings instead of objects
+          set json_format to False to return API results as strings instead of objects, or to "bytes" to return the undecoded response bytes
+          set typed_results to True to return the detections of classify_image, get_video_results, get_monitoring_result and watch_monitoring_result as compact, columnar DetectionResults
+          set json_decoder to a function decoding JSON from bytes, e.g. orjson.loads, to decode large results faster than the standard json module
           set print_output to True to print the API results to the screen in addition to returning them
           set access_token with your auth token e.g., 43174a480adebf5b8e2bf39c0dcb53f1, to preload the token instead of requesting it from the server
+          set pool_connections to the number of per-host connection pools to cache (default 10)
+          set pool_maxsize to the maximum number of keep-alive connections per host (default 10)
+          set pool_block to True to wait for a free pooled connection instead of opening an extra one
+          set keep_alive to False to close the connection after every request
+          set pool_idle_timeout to the number of idle seconds after which pooled connections are closed (default 60, None to disable)
+          set token_store to a TokenStore, or to a directory path for a FileTokenStore, to share access tokens between processes
+          set retry_policy to a RetryPolicy to retry failed requests with backoff (by default nothing is retried)
+          set retry_overrides to a dict of method name to RetryPolicy (or None) to override retry_policy per endpoint
+          set rate_limiter to a RateLimiter to pace requests per endpoint group; share one between clients to pace them together
+          set image_preprocessor to an ImagePreprocessor to downsize and re-encode images before classify_image and localize_image upload them
+          set result_cache to a ResultCache to answer repeated classify_image and localize_image requests for the same images from a cache
+          set upload_retries to the number of times a video or detector upload restarts after a connection error (default 3)
+          set heartbeat_interval to the seconds between the heartbeats of watch_monitoring_result streams (default 60)
+          set missed_heartbeats to the number of heartbeats missed before watch_monitoring_result reconnects (default 2)
+          set token_renewal to a fraction of the token lifetime, e.g. 0.8, to renew tokens in a background thread before they expire
         """
 
-        from matroid.src.helpers import get_endpoints
-
-        if not client_id:
-            client_id = os.environ.get("MATROID_CLIENT_ID", None)
-
-        if not client_secret:
-            client_secret = os.environ.get("MATROID_CLIENT_SECRET", None)
-
-        if not client_id or not client_secret:
-            raise error.AuthorizationError(
-                message="Both client_id and client_secret parameters are required"
-            )
-
-        self.client_id = client_id
-        self.client_secret = client_secret
-        self.base_url = base_url
-        self.token = None
-        self.grant_type = DEFAULT_GRANT_TYPE
-        self.json_format = options.get("json_format", True)
-        self.print_output = options.get("print_output", False)
-        self.filereader = self.FileReader()
-
-        token = options.get("access_token")
-
-        if token:
-            token_type = "Bearer"
-            # if the token's lifetime is shorter than this, the client will request a refresh automatically
-            lifetime_in_seconds = 7 * 24 * 60 * 60
-            self.token = self.Token(token_type, token, lifetime_in_seconds)
-
-        self.endpoints = get_endpoints(self.base_url)
+        from matroid.src.session import (
+            PooledSession,
+            DEFAULT_POOL_CONNECTIONS,
+            DEFAULT_POOL_MAXSIZE,
+            DEFAULT_POOL_IDLE_TIMEOUT,
+        )
+
+        configure_client(self, base_url, client_id, client_secret, options)
+
+        self.token_lock = threading.Lock()
+        self.session = PooledSession(
+            pool_connections=options.get("pool_connections", DEFAULT_POOL_CONNECTIONS),
+            pool_maxsize=options.get("pool_maxsize", DEFAULT_POOL_MAXSIZE),
+            pool_block=options.get("pool_block", False),
+            keep_alive=options.get("keep_alive", True),
+            idle_timeout=options.get("pool_idle_timeout", DEFAULT_POOL_IDLE_TIMEOUT),
+        )
+
+        self.token_renewer = None
+        if self.token_renewal:
+            from matroid.src.token_renewal import TokenRenewer
+
+            self.token_renewer = TokenRenewer(self)
+            self.token_renewer.start()
+
+    def close(self):
+        """Closes all pooled connections held by this client and stops token renewal"""
+        if self.token_renewer:
+            self.token_renewer.stop()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def configure_client(self, base_url, client_id, client_secret, options):
+    """Sets up the credentials and options shared by the blocking and the async client"""
+    from matroid.src.helpers import get_endpoints, RAW_BYTES, UPLOAD_RETRIES
+    from matroid.src.streams import HEARTBEAT_INTERVAL_SECS, MISSED_HEARTBEATS
+    from matroid.src.token_store import FileTokenStore, token_store_key
+
+    if not client_id:
+        client_id = os.environ.get("MATROID_CLIENT_ID", None)
+
+    if not client_secret:
+        client_secret = os.environ.get("MATROID_CLIENT_SECRET", None)
+
+    if not client_id or not client_secret:
+        raise error.AuthorizationError(
+            message="Both client_id and client_secret parameters are required"
+        )
+
+    self.client_id = client_id
+    self.client_secret = client_secret
+    self.base_url = base_url
+    self.token = None
+    self.grant_type = DEFAULT_GRANT_TYPE
+    self.json_format = options.get("json_format", True)
+    if self.json_format != RAW_BYTES:
+        self.json_format = bool(self.json_format)
+    self.json_decoder = options.get("json_decoder", json.loads)
+    self.typed_results = options.get("typed_results", False)
+    self.print_output = options.get("print_output", False)
+    self.filereader = self.FileReader()
+
+    token_store = options.get("token_store")
+    if isinstance(token_store, str):
+        token_store = FileTokenStore(token_store)
+    self.token_store = token_store
+    self.token_store_key = token_store_key(client_id, base_url)
+
+    self.retry_policy = options.get("retry_policy")
+    self.retry_overrides = options.get("retry_overrides", {})
+    self.rate_limiter = options.get("rate_limiter")
+    self.image_preprocessor = options.get("image_preprocessor")
+    self.result_cache = options.get("result_cache")
+    self.upload_retries = options.get("upload_retries", UPLOAD_RETRIES)
+    self.heartbeat_interval = options.get("heartbeat_interval", HEARTBEAT_INTERVAL_SECS)
+    self.missed_heartbeats = options.get("missed_heartbeats", MISSED_HEARTBEATS)
+
+    self.token_renewal = options.get("token_renewal")
+    if self.token_renewal is not None and not 0 < self.token_renewal < 1:
+        raise error.InvalidQueryError(
+            message="token_renewal must be a fraction of the token lifetime between 0 and 1"
+        )
+
+    token = options.get("access_token")
+
+    if token:
+        token_type = "Bearer"
+        # if the token's lifetime is shorter than this, the client will request a refresh automatically
+        lifetime_in_seconds = 7 * 24 * 60 * 60
+        self.token = self.Token(token_type, token, lifetime_in_seconds)
+
+    self.endpoints = get_endpoints(self.base_url)
 
 
 Matroid = MatroidAPI
@@ -10,7 +10,8 @@ class APIError(Exception):
             except AttributeError:
                 super(APIError, self).__init__("No response or error message provided")
 
-        if response:
+        # a Response is falsy for error statuses, so compare against None
+        if response is not None:
             self.response = response
 
             try:
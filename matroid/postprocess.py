@@ -0,0 +1,233 @@
+"""
+Vectorized post-processing of detection results: per-label thresholds, label filters,
+class-aware non-maximum suppression, pairwise IoU and box (de)normalization.
+
+Functions take classify_image, get_video_results or get_monitoring_result payloads, or the
+DetectionResults and Detections returned with the `typed_results` option. Boxes are
+(left, top, width, height) rows, normalized to the image size like the API returns them.
+"""
+
+try:
+    import numpy
+except ImportError:
+    raise ImportError(
+        "matroid.postprocess requires NumPy, install it with `pip install matroid[images]`"
+    )
+
+from matroid.src.results import (
+    COLUMNS,
+    DetectionResults,
+    Detections,
+    classification_results,
+    timed_results,
+)
+
+# elements of the padded IoU blocks suppressed at once
+MAX_IOU_BLOCK = 1024 * 1024
+
+
+def as_detections(results):
+    """Detections of an API payload, DetectionResults or Detections"""
+    if isinstance(results, Detections):
+        return results
+    if isinstance(results, DetectionResults):
+        return results.detections
+    if "results" in results:
+        return classification_results(results).detections
+    return timed_results(results).detections
+
+
+def boxes(detections):
+    """(N, 4) array of the left, top, width and height of each detection (NaN without a box)"""
+    detections = as_detections(detections)
+    return numpy.column_stack(
+        [detections.column(name) for name in ("left", "top", "width", "height")]
+    ).astype(numpy.float64)
+
+
+def select(detections, keep):
+    """Detections of the rows picked by `keep`, a boolean mask or an array of indices"""
+    detections = as_detections(detections)
+    selected = Detections(detections.labels)
+    for (name, code) in COLUMNS:
+        values = numpy.ascontiguousarray(detections.column(name)[keep], dtype=code)
+        selected.columns[name].frombytes(values.tobytes())
+    return selected
+
+
+def threshold_mask(detections, thresholds, default=0.0):
+    """
+    Mask of the detections scoring at least the threshold of their label
+
+    thresholds: dict of label to minimum score; labels not in it use `default`
+    """
+    detections = as_detections(detections)
+    minimums = numpy.full(len(detections.labels), default, dtype=numpy.float64)
+    for (label, minimum) in thresholds.items():
+        label_id = detections.label_ids.get(label)
+        if label_id is not None:
+            minimums[label_id] = minimum
+
+    if not len(detections):
+        return numpy.zeros(0, dtype=bool)
+    return detections.column("score") >= minimums[detections.column("label")]
+
+
+def label_mask(detections, labels):
+    """Mask of the detections of one of `labels`"""
+    detections = as_detections(detections)
+    label_ids = [
+        detections.label_ids[label] for label in labels if label in detections.label_ids
+    ]
+    return numpy.isin(detections.column("label"), label_ids)
+
+
+def iou(boxes_a, boxes_b):
+    """(N, M) intersection over union of two arrays of boxes; 0 for boxes without an area"""
+    a = numpy.asarray(boxes_a, dtype=numpy.float64).reshape(-1, 4)
+    b = numpy.asarray(boxes_b, dtype=numpy.float64).reshape(-1, 4)
+    return pairwise_iou(a, b)
+
+
+def pairwise_iou(a, b):
+    """IoU of (..., N, 4) and (..., M, 4) boxes, as (..., N, M)"""
+    a = a[..., :, None, :]
+    b = b[..., None, :, :]
+    (a_right, a_bottom) = (a[..., 0] + a[..., 2], a[..., 1] + a[..., 3])
+    (b_right, b_bottom) = (b[..., 0] + b[..., 2], b[..., 1] + b[..., 3])
+    width = numpy.minimum(a_right, b_right) - numpy.maximum(a[..., 0], b[..., 0])
+    height = numpy.minimum(a_bottom, b_bottom) - numpy.maximum(a[..., 1], b[..., 1])
+    intersection = numpy.clip(width, 0, None) * numpy.clip(height, 0, None)
+    union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - intersection
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        overlap = intersection / union
+    return numpy.where(union > 0, overlap, 0.0)
+
+
+def nms(boxes, scores, labels=None, iou_threshold=0.5):
+    """
+    Greedy non-maximum suppression: indices of the boxes kept, highest score first. With
+    `labels`, only boxes of the same label suppress each other. Boxes without an area (e.g.
+    NaN for predictions without a box) are always kept.
+    """
+    boxes = numpy.asarray(boxes, dtype=numpy.float64).reshape(-1, 4)
+    scores = numpy.asarray(scores, dtype=numpy.float64)
+    if labels is None:
+        labels = numpy.zeros(len(scores), dtype=numpy.intp)
+
+    kept = suppress(boxes, scores, numpy.asarray(labels), iou_threshold)
+    kept = numpy.flatnonzero(kept)
+    return kept[numpy.argsort(-scores[kept], kind="stable")]
+
+
+def suppress(boxes, scores, groups, iou_threshold):
+    """
+    Mask of the boxes kept by greedy NMS within each group. Groups of similar sizes are
+    padded into (groups, size, size) IoU blocks and suppressed together, one box rank at a
+    time, so the Python loop runs once per rank rather than once per box or group.
+    """
+    count = len(scores)
+    keep = numpy.ones(count, dtype=bool)
+    if count < 2:
+        return keep
+
+    order = numpy.lexsort((-scores, groups))
+    sorted_groups = groups[order]
+    starts = numpy.flatnonzero(
+        numpy.concatenate([[True], sorted_groups[1:] != sorted_groups[:-1]])
+    )
+    sizes = numpy.diff(numpy.append(starts, count))
+    by_size = numpy.argsort(sizes, kind="stable")
+
+    first = 0
+    while first < len(by_size):
+        size = sizes[by_size[first]]
+        if size * size > MAX_IOU_BLOCK:
+            # too large to pad, suppress box by box
+            for group in by_size[first:]:
+                rows = order[starts[group] : starts[group] + sizes[group]]
+                keep[rows] = greedy_nms(boxes[rows], iou_threshold)
+            break
+
+        end = first + 1
+        while end < len(by_size):
+            if (end + 1 - first) * sizes[by_size[end]] ** 2 > MAX_IOU_BLOCK:
+                break
+            end += 1
+        chunk = by_size[first:end]
+        first = end
+
+        size = sizes[chunk[-1]]
+        ranks = numpy.arange(size)
+        valid = ranks < sizes[chunk][:, None]
+        rows = order[numpy.where(valid, starts[chunk][:, None] + ranks, 0)]
+
+        overlapping = pairwise_iou(boxes[rows], boxes[rows]) > iou_threshold
+        kept = valid.copy()
+        for rank in range(1, size):
+            suppressed = (overlapping[:, :rank, rank] & kept[:, :rank]).any(axis=1)
+            kept[:, rank] &= ~suppressed
+        keep[rows[valid]] = kept[valid]
+
+    return keep
+
+
+def greedy_nms(boxes, iou_threshold):
+    """Mask of the boxes kept by greedy NMS, for boxes sorted by decreasing score"""
+    keep = numpy.zeros(len(boxes), dtype=bool)
+    remaining = numpy.arange(len(boxes))
+    while remaining.size:
+        best = remaining[0]
+        keep[best] = True
+        remaining = remaining[1:]
+        if remaining.size:
+            overlaps = pairwise_iou(boxes[best : best + 1], boxes[remaining])[0]
+            remaining = remaining[~(overlaps > iou_threshold)]
+    return keep
+
+
+def normalize_boxes(boxes, width, height):
+    """Pixel boxes to boxes normalized to an image of `width` x `height` pixels"""
+    return numpy.asarray(boxes, dtype=numpy.float64) / [width, height, width, height]
+
+
+def denormalize_boxes(boxes, width, height):
+    """Normalized boxes to pixel boxes of an image of `width` x `height` pixels"""
+    return numpy.asarray(boxes, dtype=numpy.float64) * [width, height, width, height]
+
+
+def filter_detections(
+    results, thresholds=None, default=0.0, labels=None, iou_threshold=None
+):
+    """
+    Detections of `results` kept by per-label thresholds, a label filter and class-aware NMS
+    (per image and time for classify_image and video results), in that order
+    """
+    detections = as_detections(results)
+    keep = numpy.ones(len(detections), dtype=bool)
+    if thresholds is not None or default:
+        keep &= threshold_mask(detections, thresholds or {}, default)
+    if labels is not None:
+        keep &= label_mask(detections, labels)
+
+    indices = numpy.flatnonzero(keep)
+    if iou_threshold is not None and indices.size:
+        indices = grouped_nms(detections, indices, iou_threshold)
+
+    return select(detections, indices)
+
+
+def grouped_nms(detections, indices, iou_threshold):
+    """NMS of the rows at `indices`, separately for each (image, time, label)"""
+    keys = numpy.column_stack(
+        [
+            detections.column("image")[indices],
+            numpy.nan_to_num(detections.column("time")[indices], nan=-1.0),
+            detections.column("label")[indices],
+        ]
+    )
+    groups = numpy.unique(keys, axis=0, return_inverse=True)[1].reshape(-1)
+    scores = detections.column("score")[indices]
+    kept = suppress(boxes(detections)[indices], scores, groups, iou_threshold)
+    return indices[kept]
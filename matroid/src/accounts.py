@@ -1,4 +1,3 @@
-import requests
 
 from matroid import error
 from matroid.src.helpers import api_call
@@ -17,23 +16,37 @@ def retrieve_token(self, options={}):
     You can pass the 'refresh': True option to make a request
     to the server for the access token without invalidating it. This is useful if you are running
     multiple clients with the same token so they don't endlessly refresh each others' tokens
+
+    The 'renew': True option replaces the token once the token_renewal fraction of its lifetime
+    has passed; the background renewal uses it to fetch tokens before they expire.
     """
 
-    (endpoint, method) = self.endpoints["token"]
+    if not requires_new_token(self, options):
+        return self.token
 
-    if not options.get("expire_token") and not options.get("refresh"):
-        if self.token and not self.token.expired():
+    # only one thread talks to the token endpoint, the others wait and reuse its token
+    with self.token_lock:
+        if not requires_new_token(self, options):
             return self.token
 
+        if not self.token_store:
+            return request_token(self, options)
+
+        # the store lock makes other processes wait for this refresh as well
+        with self.token_store.lock(self.token_store_key):
+            if load_stored_token(self, options):
+                return self.token
+
+            return request_token(self, options)
+
+
+def request_token(self, options):
+    """Requests a new token from the server and saves it"""
+    (endpoint, method) = self.endpoints["token"]
+
     try:
-        query_data = {
-            "grant_type": self.grant_type,
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-        }
-        if options.get("refresh"):
-            query_data["refresh"] = "true"
-        response = requests.request(method, endpoint, data=query_data)
+        query_data = token_request_data(self, options)
+        response = self.session.request(method, endpoint, data=query_data)
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -44,6 +57,63 @@ def retrieve_token(self, options={}):
     return response.json()
 
 
+def token_request_data(self, options):
+    query_data = {
+        "grant_type": self.grant_type,
+        "client_id": self.client_id,
+        "client_secret": self.client_secret,
+    }
+    if options.get("refresh"):
+        query_data["refresh"] = "true"
+
+    return query_data
+
+
+def requires_new_token(self, options):
+    """
+    Whether retrieve_token has to go to the server.
+
+    'request_from_server' replaces the token that was rejected by the API ('stale_token');
+    if another caller already replaced it, the current token is used instead.
+    """
+    if options.get("expire_token") or options.get("refresh"):
+        return True
+
+    if not self.token or self.token.expired():
+        return True
+
+    if options.get("renew"):
+        return self.token.expired(self.token_renewal)
+
+    if options.get("request_from_server"):
+        return self.token is options.get("stale_token", self.token)
+
+    return False
+
+
+def load_stored_token(self, options):
+    """Adopts the token in the token store if it is still usable; returns whether it did"""
+    if options.get("expire_token") or options.get("refresh"):
+        return False
+
+    token_dict = self.token_store.load(self.token_store_key)
+    if not token_dict:
+        return False
+
+    token = self.Token.from_dict(token_dict)
+    if token.expired(self.token_renewal if options.get("renew") else 1):
+        return False
+
+    stale_token = options.get("stale_token")
+    if options.get("request_from_server") and (
+        not stale_token or stale_token.token_str == token.token_str
+    ):
+        return False
+
+    self.token = token
+    return True
+
+
 # https://staging.app.matroid.com/docs/api/documentation#api-Accounts-GetAccount
 @api_call(error.InvalidQueryError)
 def account_info(self):
@@ -52,7 +122,7 @@ def account_info(self):
 
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -0,0 +1,170 @@
+import asyncio
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from matroid.src.helpers import upload_backoff
+
+try:
+    import aiohttp
+    import yarl
+except ImportError:
+    aiohttp = None
+
+# exceptions raised by the async transport when the connection fails
+TRANSPORT_ERRORS = (asyncio.TimeoutError,)
+if aiohttp is not None:
+    TRANSPORT_ERRORS += (aiohttp.ClientError,)
+
+# keyword arguments of requests.request that describe the request itself
+REQUEST_KWARGS = ("headers", "files", "data", "params", "json")
+
+DEFAULT_ASYNC_POOL_SIZE = 100
+DEFAULT_ASYNC_POOL_MAXSIZE = 100
+DEFAULT_ASYNC_POOL_IDLE_TIMEOUT = 60
+
+
+class RequestRecorder(object):
+    """
+    Stands in for a requests Session on the async client.
+
+    The endpoint functions in matroid/src build their requests through `self.session.request`;
+    the recorder encodes the request exactly like requests would and returns the PreparedRequest
+    instead of sending it, so the async transport can send it without blocking.
+    """
+
+    def request(self, method, url, **kwargs):
+        request_kwargs = {key: kwargs[key] for key in REQUEST_KWARGS if key in kwargs}
+        # file handles are read here, before the endpoint function closes them
+        prepared = requests.Request(method, url, **request_kwargs).prepare()
+
+        # ...except for streamed bodies, which keep their files open until they are sent
+        if hasattr(prepared.body, "detach"):
+            prepared.body = prepared.body.detach()
+
+        return prepared
+
+
+class AsyncSession(object):
+    """Sends PreparedRequests over a pooled, non-blocking aiohttp connector"""
+
+    def __init__(
+        self,
+        pool_size=DEFAULT_ASYNC_POOL_SIZE,
+        pool_maxsize=DEFAULT_ASYNC_POOL_MAXSIZE,
+        keep_alive=True,
+        idle_timeout=DEFAULT_ASYNC_POOL_IDLE_TIMEOUT,
+    ):
+        if aiohttp is None:
+            raise ImportError(
+                "The async client requires aiohttp, install it with `pip install matroid[async]`"
+            )
+
+        self.pool_size = pool_size
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.idle_timeout = idle_timeout
+        self._session = None
+
+    @property
+    def client_session(self):
+        # aiohttp sessions must be created from within the running event loop
+        if self._session is None or self._session.closed:
+            connector_options = {
+                "limit": self.pool_size,
+                "limit_per_host": self.pool_maxsize,
+                "force_close": not self.keep_alive,
+            }
+            if self.keep_alive:
+                connector_options["keepalive_timeout"] = self.idle_timeout
+
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(**connector_options),
+                # like requests, don't time out unless the caller asks for it
+                timeout=aiohttp.ClientTimeout(total=None),
+            )
+
+        return self._session
+
+    def open(self, prepared, timeout=None):
+        """
+        Starts sending `prepared`; returns the aiohttp request context manager
+
+        timeout: total seconds, or a (connect, read) tuple like requests accepts
+        """
+        if hasattr(prepared.body, "read"):
+            # streamed bodies keep their Content-Length, so they aren't sent chunked
+            headers = dict(prepared.headers)
+            data = stream_body(prepared.body)
+        else:
+            headers = {
+                key: value
+                for key, value in prepared.headers.items()
+                if key.lower() != "content-length"
+            }
+            data = prepared.body
+        options = {"headers": headers, "data": data}
+        if isinstance(timeout, tuple):
+            (connect_timeout, read_timeout) = timeout
+            options["timeout"] = aiohttp.ClientTimeout(
+                sock_connect=connect_timeout, sock_read=read_timeout
+            )
+        elif timeout is not None:
+            options["timeout"] = aiohttp.ClientTimeout(total=timeout)
+
+        return self.client_session.request(
+            prepared.method, yarl.URL(prepared.url, encoded=True), **options
+        )
+
+    async def send(self, prepared, timeout=None):
+        """
+        Sends `prepared` and returns the fully read body as a requests Response. A streamed
+        upload whose connection fails is restarted as long as its body can be rewound, like
+        upload_request does on the blocking client
+        """
+        try:
+            while True:
+                try:
+                    async with self.open(prepared, timeout) as res:
+                        content = await res.read()
+                        return to_response(prepared, res, content)
+                except TRANSPORT_ERRORS:
+                    rewind = getattr(prepared.body, "rewind", None)
+                    if rewind is None or not rewind():
+                        raise
+
+                await asyncio.sleep(upload_backoff(prepared.body.attempt))
+        finally:
+            if hasattr(prepared.body, "close"):
+                prepared.body.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+async def stream_body(body, chunk_size=64 * 1024):
+    """
+    Feeds a file-like request body to aiohttp chunk by chunk; the body is read from a
+    thread, so reading files doesn't block the event loop
+    """
+    chunk = await asyncio.to_thread(body.read, chunk_size)
+    while chunk:
+        yield chunk
+        chunk = await asyncio.to_thread(body.read, chunk_size)
+
+
+def to_response(prepared, res, content):
+    """Builds a requests Response out of an aiohttp response so the shared helpers can read it"""
+    response = requests.Response()
+    response.status_code = res.status
+    response.reason = res.reason
+    response.headers = CaseInsensitiveDict(res.headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = str(res.url)
+    response.request = prepared
+    response._content = content
+
+    return response
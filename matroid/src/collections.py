@@ -1,5 +1,4 @@
 import os
-import requests
 import json
 
 from matroid import error
@@ -15,7 +14,9 @@ def create_collection_index(self, collectionId, detectorId, fileTypes):
     try:
         headers = {"Authorization": self.token.authorization_header()}
         data = {"detectorId": detectorId, "fileTypes": fileTypes}
-        return requests.request(method, endpoint, **{"headers": headers, "data": data})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "data": data}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -35,7 +36,9 @@ def create_collection(self, name, url, sourceType, **options):
             "indexWithDefault": "true" if options.get("indexWithDefault") else "false",
         }
 
-        return requests.request(method, endpoint, **{"headers": headers, "data": data})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "data": data}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -49,7 +52,7 @@ def delete_collection_index(self, taskId):
 
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -63,7 +66,7 @@ def delete_collection(self, collectionId):
 
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -77,7 +80,7 @@ def get_collection_task(self, taskId):
 
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -91,7 +94,7 @@ def get_collection(self, collectionId):
 
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -106,7 +109,9 @@ def kill_collection_index(self, taskId, includeCollectionInfo):
     try:
         headers = {"Authorization": self.token.authorization_header()}
         data = {"includeCollectionInfo": "true" if includeCollectionInfo else ""}
-        return requests.request(method, endpoint, **{"headers": headers, "data": data})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "data": data}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -127,7 +132,9 @@ def query_collection_by_scores(self, taskId, thresholds, **options):
             "thresholds": json.dumps(thresholds),
             "numResults": options.get("numResults"),
         }
-        return requests.request(method, endpoint, **{"headers": headers, "data": data})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "data": data}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -156,12 +163,12 @@ def query_collection_by_image(self, taskId, url=None, file=None, **options):
         if file:
             file_to_upload = self.filereader.get_file(file)
             files = {"file": file_to_upload}
-            return requests.request(
+            return self.session.request(
                 method, endpoint, **{"headers": headers, "files": files, "data": data}
             )
         else:
             data["url"] = url
-            return requests.request(
+            return self.session.request(
                 method, endpoint, **{"headers": headers, "data": data}
             )
     except IOError as e:
@@ -185,6 +192,8 @@ def update_collection_index(self, taskId, updateIndex):
     try:
         headers = {"Authorization": self.token.authorization_header()}
         data = {"updateIndex": "true" if updateIndex else "false"}
-        return requests.request(method, endpoint, **{"headers": headers, "data": data})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "data": data}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
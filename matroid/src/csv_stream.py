@@ -0,0 +1,137 @@
+import codecs
+import csv
+import io
+import re
+from collections import namedtuple
+
+from matroid.src.helpers import ParsedStream
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+DEFAULT_CHUNK_ROWS = 10000
+COLUMNAR_FORMATS = (None, "numpy", "arrow")
+
+# plain numeric literals: int() and float() also take "nan", "inf", padding and separators
+INT_PATTERN = re.compile(r"[+-]?[0-9]+")
+FLOAT_PATTERN = re.compile(r"[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?")
+
+
+class CSVParser(object):
+    """
+    Incremental parser of a CSV response with a header row.
+
+    feed() the body chunk by chunk: each call returns the rows it completed as namedtuples
+    named after the header, with numbers converted to int or float and empty values to None.
+    With `columnar`, rows are instead gathered into chunks of `chunk_rows` rows returned as
+    dicts of NumPy arrays ("numpy") or as pyarrow RecordBatches ("arrow").
+    """
+
+    def __init__(self, columnar=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+        if columnar not in COLUMNAR_FORMATS:
+            raise ValueError("columnar must be one of %r" % (COLUMNAR_FORMATS,))
+        if columnar == "numpy" and numpy is None:
+            raise ImportError(
+                "NumPy columns require NumPy, install it with `pip install matroid[images]`"
+            )
+        if columnar == "arrow" and pyarrow is None:
+            raise ImportError(
+                "Arrow columns require pyarrow, install it with `pip install pyarrow`"
+            )
+
+        self.columnar = columnar
+        self.chunk_rows = chunk_rows
+        self.text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.pending = ""
+        self.header = None
+        self.row_type = None
+        self.rows = []
+
+    def feed(self, data, final=False):
+        """Adds the next chunk of the body; returns the rows or column chunks it completed"""
+        text = self.pending + self.text_decoder.decode(data, final)
+        end = len(text) if final else record_end(text)
+        (self.pending, text) = (text[end:], text[:end])
+
+        # blank lines are empty records, not rows of missing values
+        records = (record for record in csv.reader(io.StringIO(text)) if record)
+        if self.header is None:
+            self.header = next(records, None)
+            if self.header is None:
+                return []
+            self.row_type = namedtuple("Row", self.header, rename=True)
+
+        rows = [self.row_type(*typed_values(record, len(self.header))) for record in records]
+        if not self.columnar:
+            return rows
+
+        self.rows += rows
+        chunks = []
+        while len(self.rows) >= self.chunk_rows or (final and self.rows):
+            chunks.append(self.to_columns(self.rows[: self.chunk_rows]))
+            del self.rows[: self.chunk_rows]
+        return chunks
+
+    def close(self):
+        """Ends the body, returning the rows or column chunks left"""
+        return self.feed(b"", final=True)
+
+    def to_columns(self, rows):
+        columns = zip(*rows)
+        if self.columnar == "arrow":
+            return pyarrow.RecordBatch.from_arrays(
+                [pyarrow.array(values) for values in columns], names=self.header
+            )
+        return {name: to_array(values) for (name, values) in zip(self.header, columns)}
+
+
+def record_end(text):
+    """End of the last complete record in text: after a line break outside quotes"""
+    end = text.rfind("\n")
+    # a line break inside a quoted value follows an odd number of quotes
+    while end != -1 and text.count('"', 0, end) % 2:
+        end = text.rfind("\n", 0, end)
+    return end + 1
+
+
+def typed_values(record, width):
+    """The values of a CSV record as int, float, str or None, padded or cut to `width`"""
+    values = [typed_value(value) for value in record[:width]]
+    values += [None] * (width - len(values))
+    return values
+
+
+def typed_value(value):
+    if value == "":
+        return None
+    if INT_PATTERN.fullmatch(value):
+        return int(value)
+    if FLOAT_PATTERN.fullmatch(value):
+        return float(value)
+    return value
+
+
+def to_array(values):
+    """A NumPy array of column values: int64 or float64 (NaN for None) if numeric, else objects"""
+    if all(type(value) is int for value in values):
+        return numpy.array(values, dtype=numpy.int64)
+    if all(value is None or type(value) in (int, float) for value in values):
+        return numpy.array(
+            [numpy.nan if value is None else value for value in values], dtype=numpy.float64
+        )
+    return numpy.array(values, dtype=object)
+
+
+class CSVStream(ParsedStream):
+    """Iterator over the rows or column chunks of a streamed CSV response"""
+
+    @property
+    def header(self):
+        return self.parser.header
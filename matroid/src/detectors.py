@@ -1,10 +1,12 @@
 import io
-import os
-import requests
 import json
 
 from matroid import error
-from matroid.src.helpers import api_call
+from matroid.src.helpers import api_call, parse_formatted, upload_request, MemoryFile
+from matroid.src.multipart import file_length, file_name
+
+# detector states after which its model no longer changes
+DONE_TRAINING_STATES = ("trained", "failed")
 
 
 # https://staging.app.matroid.com/docs/api/documentation#api-Detectors-PostDetectors
@@ -32,6 +34,7 @@ def create_detector(self, file, name, detectorType, **options):
                 top left X coordinate, top left Y coordinate, bottom right X coordinate, bottom right Y coordinate, label, positive or negative example, file name
 
               Max 2 GB zip file upload
+    progress: optional callback, called with (bytes sent, total bytes) while the file uploads
 
       structure example:
         cat/
@@ -47,36 +50,47 @@ def create_detector(self, file, name, detectorType, **options):
 
     (endpoint, method) = self.endpoints["create_detector"]
 
+    progress = options.pop("progress", None)
+
     try:
         headers = {"Authorization": self.token.authorization_header()}
         data = {"name": name, "detectorType": detectorType}
         data.update(options)
         if "options" in options:
-            data.update(options["options"])
+            data.update(data.pop("options"))
 
-        with self.filereader.get_file(file) as file_to_upload:
-            # files = {'file': file_to_upload}
-            files = {"file": (file, file_to_upload, "application/zip")}
+        files = []
+        labelsJSON = data.pop("labelsJSON", None)
+        if labelsJSON:  # Check if labelsJSON is not None or empty
+            with self.filereader.get_file(labelsJSON) as labels_to_upload:
+                labels = MemoryFile(labels_to_upload.read(), name="labelsJSON")
 
-            labels_to_upload = None
-            labelsJSON = data.get("labelsJSON")
-            if labelsJSON:  # Check if labelsJSON is not None or empty
-                with self.filereader.get_file(labelsJSON) as labels_to_upload:
-                    files["labelsJSON"] = labels_to_upload.read()
-                data.pop("labelsJSON")
+        file_to_upload = self.filereader.get_file(file)
+        files.append(("file", file_to_upload))
+        if labelsJSON:
+            files.append(("labelsJSON", labels))
 
-            file_size = os.fstat(file_to_upload.fileno()).st_size
+        file_size = file_length(file_to_upload)
 
-            if file_size > MAX_LOCAL_ZIP_SIZE:
-                raise error.InvalidQueryError(
-                    message=f"File {file_to_upload.name} is larger than the limit of {self.bytes_to_gb(MAX_LOCAL_ZIP_SIZE)} GB"
-                )
-
-            response = requests.request(
-                method, endpoint, headers=headers, files=files, data=data
+        if file_size > MAX_LOCAL_ZIP_SIZE:
+            for (_, file_obj) in files:
+                file_obj.close()
+            raise error.InvalidQueryError(
+                message=f"File {file_name(file_to_upload, 'in memory')} is larger than the limit of {self.bytes_to_gb(MAX_LOCAL_ZIP_SIZE)} GB"
             )
-            return response
 
+        return upload_request(
+            method,
+            endpoint,
+            headers,
+            data,
+            files,
+            session=self.session,
+            progress=progress,
+            retries=self.upload_retries,
+        )
+    except error.InvalidQueryError as e:
+        raise e
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -94,7 +108,7 @@ def delete_detector(self, detectorId):
 
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -107,11 +121,18 @@ def finalize_detector(self, detectorId):
 
     endpoint = endpoint.replace(":key", detectorId)
 
+    if self.result_cache:
+        # results of the detector's current model become stale, and so would the ones of
+        # classifications made while it trains
+        self.result_cache.start_training(detectorId)
+
     try:
         headers = {"Authorization": self.token.authorization_header()}
         data = {}
 
-        return requests.request(method, endpoint, **{"headers": headers, "data": data})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "data": data}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -120,16 +141,35 @@ train_detector = finalize_detector
 
 
 # https://staging.app.matroid.com/docs/api/documentation#api-Detectors-GetDetectorsDetector_id
-@api_call(error.InvalidQueryError)
 def get_detector_info(self, detectorId):
     """Get information about detector"""
+    info = self.request_detector_info(detectorId)
+    if self.result_cache:
+        detector_info_seen(self, detectorId, info)
+    return info
+
+
+def detector_info_seen(self, detectorId, info):
+    """Lets the result cache know when a detector it holds no results for is trained"""
+    info = parse_formatted(self, info)
+    # the detector's fields come nested under "detector" or at the top level
+    detector = info.get("detector") or info
+    if detector.get("state") in DONE_TRAINING_STATES:
+        self.result_cache.training_done(detectorId)
+
+
+@api_call(
+    error.InvalidQueryError, endpoint="get_detector_info", public_name="get_detector_info"
+)
+def request_detector_info(self, detectorId):
+    """Get information about detector, without updating the result cache; see get_detector_info"""
     (endpoint, method) = self.endpoints["get_detector_info"]
 
     endpoint = endpoint.replace(":key", detectorId)
 
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -142,6 +182,7 @@ detector_info = get_detector_info
 def import_detector(self, name, **options):
     """
     Note: certain combination of parameters can be supplied: file_detector, file_proto + file_label (+ file_label_ind), or file_proto + labels (+ label_inds). Parentheses part can be optionally supplied for object detection.
+    progress: optional callback, called with (bytes sent, total bytes) while the files upload
     """
     (endpoint, method) = self.endpoints["import_detector"]
 
@@ -173,15 +214,22 @@ def import_detector(self, name, **options):
     else:
         raise error.InvalidQueryError(message="Invalid parameter combination")
 
-    file_objs = {}
+    file_objs = []
     for file_keyword, file_path in file_paths.items():
-        file_obj = self.filereader.get_file(file_path)
-        file_objs[file_keyword] = file_obj
+        if file_path is not None:
+            file_objs.append((file_keyword, self.filereader.get_file(file_path)))
 
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(
-            method, endpoint, **{"headers": headers, "files": file_objs, "data": data}
+        return upload_request(
+            method,
+            endpoint,
+            headers,
+            data,
+            file_objs,
+            session=self.session,
+            progress=options.get("progress"),
+            retries=self.upload_retries,
         )
     except IOError as e:
         raise e
@@ -189,10 +237,6 @@ def import_detector(self, name, **options):
         raise e
     except Exception as e:
         raise error.APIConnectionError(message=e)
-    finally:
-        for file_keyword, file_obj in file_objs.items():
-            if isinstance(file_obj, io.IOBase):
-                file_obj.close()
 
 
 # https://staging.app.matroid.com/docs/api/documentation#api-Detectors-PostDetectorsDetector_idRedo
@@ -206,16 +250,23 @@ def redo_detector(self, detectorId, **options):
 
     endpoint = endpoint.replace(":key", detectorId)
 
+    if self.result_cache:
+        # results of the detector's current model become stale, and so would the ones of
+        # classifications made while it trains
+        self.result_cache.start_training(detectorId)
+
     try:
         headers = {"Authorization": self.token.authorization_header()}
         data = {"feedbackOnly": "true" if options.get("feedbackOnly") else "false"}
-        return requests.request(method, endpoint, **{"headers": headers, "data": data})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "data": data}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
 
 # https://staging.app.matroid.com/docs/api/documentation#api-Detectors-Search
-@api_call(error.InvalidQueryError)
+@api_call(error.InvalidQueryError, endpoint="detectors")
 def search_detectors(self, **query):
     """Lists the available detectors"""
     (endpoint, method) = self.endpoints["detectors"]
@@ -225,7 +276,7 @@ def search_detectors(self, **query):
         params = {x: str(query[x]).lower() for x in query}
         params["published"] = "true" if query.get("published") else "false"
 
-        return requests.request(
+        return self.session.request(
             method, endpoint, **{"headers": headers, "params": params}
         )
     except Exception as e:
@@ -240,7 +291,7 @@ def list_detectors(self):
 
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -274,7 +325,7 @@ def add_feedback(self, detectorId, feedback, file=None, url=None):
             files = {"file": image_file}
 
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(
+        return self.session.request(
             method, endpoint, **{"headers": headers, "files": files, "data": data}
         )
     except IOError as e:
@@ -297,7 +348,7 @@ def delete_feedback(self, feedbackId, detectorId):
 
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except error.InvalidQueryError as e:
         raise e
     except Exception as e:
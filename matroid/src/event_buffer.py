@@ -0,0 +1,161 @@
+import collections
+import queue
+import threading
+
+from matroid.src.results import DetectionResults
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest", "coalesce")
+
+
+class EventBuffer(object):
+    """
+    Bounded, thread-safe buffer of events between the thread reading a stream and the
+    consumer of its events, so a slow consumer doesn't stall the stream or fall behind
+    without bound.
+
+    When `maxsize` events are buffered (None for no limit), put() applies the `overflow`
+    policy:
+      block: waits for the consumer to make room, which stops the stream from being read
+      drop_oldest: drops the oldest buffered event
+      drop_newest: drops the event being put
+      coalesce: drops the oldest buffered event; in this mode an event always replaces
+        the buffered event with the same `key` (by default, the same labels), so only the
+        latest event of each key waits
+
+    `received` counts the events put and `dropped` the ones dropped or replaced.
+    """
+
+    def __init__(self, maxsize, overflow="block", key=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("overflow must be one of %r" % (OVERFLOW_POLICIES,))
+        if maxsize is not None and maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.key = key or event_labels
+        # sequence number -> (key, event), oldest first
+        self.events = collections.OrderedDict()
+        # key -> sequence number of its buffered event, for coalesce
+        self.latest = {}
+        self.sequence = 0
+        self.received = 0
+        self.dropped = 0
+        self.closed = False
+        self.error = None
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        return len(self.events)
+
+    def put(self, event, block=True, timeout=None):
+        """
+        Buffers an event, applying the overflow policy when full; returns False if it was
+        dropped, or could not be buffered without blocking or within `timeout` seconds
+        """
+        with self.condition:
+            if self.closed:
+                return False
+            key = None
+            if self.overflow == "coalesce":
+                key = self.key(event)
+                if key in self.latest:
+                    del self.events[self.latest.pop(key)]
+                    self.dropped += 1
+
+            if self.full():
+                if self.overflow == "block":
+                    if not block or not self.condition.wait_for(
+                        lambda: not self.full() or self.closed, timeout
+                    ):
+                        return False
+                    if self.closed:
+                        return False
+                elif self.overflow == "drop_newest":
+                    self.received += 1
+                    self.dropped += 1
+                    return False
+                else:
+                    self.drop_oldest()
+
+            self.received += 1
+            self.sequence += 1
+            self.events[self.sequence] = (key, event)
+            if self.overflow == "coalesce":
+                self.latest[key] = self.sequence
+            self.condition.notify_all()
+            return True
+
+    def full(self):
+        return self.maxsize is not None and len(self.events) >= self.maxsize
+
+    def drop_oldest(self):
+        (sequence, (key, _)) = self.events.popitem(last=False)
+        if self.latest.get(key) == sequence:
+            del self.latest[key]
+        self.dropped += 1
+
+    def get(self, block=True, timeout=None):
+        """
+        The oldest buffered event; raises queue.Empty if there is none within `timeout`
+        seconds. Once the buffer is closed and empty, returns None, or raises the error it
+        was closed with.
+        """
+        with self.condition:
+            if not self.condition.wait_for(
+                lambda: self.events or self.closed, timeout if block else 0
+            ):
+                raise queue.Empty()
+            if not self.events:
+                if self.error is not None:
+                    raise self.error
+                return None
+
+            (sequence, (key, event)) = self.events.popitem(last=False)
+            if self.latest.get(key) == sequence:
+                del self.latest[key]
+            self.condition.notify_all()
+            return event
+
+    def close(self, error=None):
+        """
+        Ends the buffer: the events left can still be read, then get() returns None or
+        raises `error`
+        """
+        with self.condition:
+            self.closed = True
+            self.error = error
+            self.condition.notify_all()
+
+    def __iter__(self):
+        while True:
+            event = self.get()
+            if event is None:
+                return
+            yield event
+
+
+def event_labels(event):
+    """The labels of the detections of a watch_monitoring_result event"""
+    if isinstance(event, DetectionResults):
+        return frozenset(event.detections.labels)
+
+    detections = event.get("detections") if isinstance(event, dict) else None
+    if isinstance(detections, dict):
+        predictions = [
+            prediction for timed in detections.values() for prediction in timed
+        ]
+    elif isinstance(detections, list):
+        predictions = detections
+    else:
+        return None
+
+    labels = set()
+    for prediction in predictions:
+        if isinstance(prediction, dict):
+            found = prediction.get("labels") or prediction.get("label")
+            if isinstance(found, dict):
+                labels.update(found)
+            elif found is not None:
+                labels.add(found)
+    return frozenset(labels)
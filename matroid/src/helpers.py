@@ -1,35 +1,180 @@
 import datetime
+import functools
+import io
+import json
 import os
 import requests
+import time
 
 from matroid import error
+from matroid.src.multipart import MultipartEncoder, file_length, file_name
+from matroid.src.results import typed_results
 
 MAX_LOCAL_IMAGE_SIZE = 50 * 1024 * 1024
 MAX_LOCAL_IMAGE_BATCH_SIZE = 50 * 1024 * 1024
 
+# json_format that returns API results as the undecoded bytes of the response
+RAW_BYTES = "bytes"
 
-def api_call(default_error):
-    """setup and teardown decorator for API calls"""
+# videos and detector zips are uploaded in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_RETRIES = 3
+UPLOAD_MAX_BACKOFF = 30
+# bytes read at a time from streamed responses
+STREAM_CHUNK_SIZE = 64 * 1024
 
-    def decorator(func):
-        def setup_and_teardown(self, *original_args, **original_kwargs):
-            self.retrieve_token()
 
-            response = func(self, *original_args, **original_kwargs)
+def api_call(default_error, endpoint=None, public_name=None):
+    """
+    setup and teardown decorator for API calls
 
-            try:
-                self.check_errors(response, default_error)
-            except error.TokenExpirationError:
-                self.retrieve_token(options={"request_from_server": True})
-                return func(self, *original_args, **original_kwargs)
-            else:
-                return self.format_response(response)
+    endpoint: key of the call in the endpoints table, if it differs from the function name
+    public_name: API method the call is made for, if it differs from the function name; its
+      retry_overrides and rate limiter group apply to the call
+    """
+
+    def decorator(func):
+        name = public_name or func.__name__
 
+        @functools.wraps(func)
+        def setup_and_teardown(self, *original_args, **original_kwargs):
+            policy = get_retry_policy(self, func.__name__, name)
+            if not policy:
+                return send_api_call(
+                    self, func, default_error, original_args, original_kwargs, name
+                )
+
+            policy.record_request()
+            (_, method) = self.endpoints[setup_and_teardown.endpoint]
+            started_at = time.monotonic()
+            attempt = 0
+            while True:
+                try:
+                    return send_api_call(
+                        self, func, default_error, original_args, original_kwargs, name
+                    )
+                except error.APIError as e:
+                    elapsed = time.monotonic() - started_at
+                    delay = policy.next_delay(e, attempt, method, elapsed)
+                    if delay is None:
+                        raise
+
+                time.sleep(delay)
+                attempt += 1
+
+        # lets other transports (e.g. the async client) reuse the undecorated request builder
+        setup_and_teardown.default_error = default_error
+        setup_and_teardown.endpoint = endpoint or func.__name__
+        setup_and_teardown.public_name = name
         return setup_and_teardown
 
     return decorator
 
 
+def send_api_call(self, func, default_error, original_args, original_kwargs, name=None):
+    """
+    Makes a single API call, refreshing the token once if the server rejects it; the rate
+    limiter paces it as API method `name` (default: the function name)
+    """
+    name = name or func.__name__
+    self.retrieve_token()
+    token = self.token
+
+    if self.rate_limiter:
+        self.rate_limiter.acquire(name)
+
+    response = func(self, *original_args, **original_kwargs)
+
+    try:
+        check_api_response(self, name, response, default_error)
+    except error.TokenExpirationError:
+        self.retrieve_token(options={"request_from_server": True, "stale_token": token})
+        response = func(self, *original_args, **original_kwargs)
+        check_api_response(self, name, response, default_error)
+
+    return typed_results(self, func.__name__, self.format_response(response))
+
+
+def open_streamed_response(self, name, default_error, request):
+    """
+    Sends request(), which builds a streamed request of API method `name`, refreshing the token
+    once if the server rejects it. Only error responses are read.
+    """
+
+    def send():
+        response = request()
+        if response.status_code >= 400:
+            check_api_response(self, name, response, default_error)
+        return response
+
+    self.retrieve_token()
+    token = self.token
+    if self.rate_limiter:
+        self.rate_limiter.acquire(name)
+
+    try:
+        return send()
+    except error.TokenExpirationError:
+        self.retrieve_token(options={"request_from_server": True, "stale_token": token})
+        return send()
+
+
+class ParsedStream(object):
+    """
+    Iterator over the items an incremental parser (with feed(chunk) and close() returning
+    lists of items) decodes from a streamed response, read `chunk_size` bytes at a time.
+    Close it, or use it as a context manager, to stop before the end.
+    """
+
+    def __init__(self, response, parser, chunk_size):
+        self.response = response
+        self.parser = parser
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        try:
+            for chunk in self.response.iter_content(self.chunk_size):
+                yield from self.parser.feed(chunk)
+            yield from self.parser.close()
+        except requests.RequestException as e:
+            raise error.APIConnectionError(message=e)
+        finally:
+            self.close()
+
+    def close(self):
+        self.response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def check_api_response(self, name, response, default_error):
+    """check_errors for API method `name`, letting the rate limiter adapt to the outcome"""
+    try:
+        self.check_errors(response, default_error)
+    except error.RateLimitError:
+        if self.rate_limiter:
+            self.rate_limiter.on_rate_limited(name)
+        raise
+
+    if self.rate_limiter:
+        self.rate_limiter.on_success(name)
+
+
+def get_retry_policy(self, name, public_name=None):
+    """
+    The RetryPolicy for API method `name`: its override, or that of the public method it is
+    called for, if there is one, else the client's
+    """
+    for key in (name, public_name):
+        if key in self.retry_overrides:
+            return self.retry_overrides[key]
+    return self.retry_policy
+
+
 def bytes_to_mb(self, bytes):
     return bytes / 1024 / 1024
 
@@ -51,7 +196,7 @@ def check_errors(self, response=None, UserErr=None):
         raise error.RateLimitError(response)
     elif status == 402 and code == "payment_err":
         raise error.PaymentError(response)
-    elif status / 100 == 4:
+    elif status // 100 == 4:
         if code == "token_expiration_err":
             raise error.TokenExpirationError(response)
         elif UserErr:
@@ -60,9 +205,9 @@ def check_errors(self, response=None, UserErr=None):
             raise error.APIError(response)
     elif code == "media_err":
         raise error.MediaError(response)
-    elif status / 100 == 5 and code == "server_err":
+    elif status // 100 == 5 and code == "server_err":
         raise error.ServerError(response)
-    elif status / 100 != 2:
+    elif status // 100 != 2:
         raise error.APIError(response)
 
 
@@ -70,12 +215,31 @@ def format_response(self, response):
     """Format the output according to the options (json, print to screen)"""
     if self.print_output:
         print(response.text)
-    if self.json_format:
-        return response.json()
+    if self.json_format == RAW_BYTES:
+        return response.content
+    elif self.json_format:
+        return self.json_decoder(response.content)
     else:
         return response.text
 
 
+def parse_formatted(self, formatted):
+    """The JSON object of a response returned by format_response, whatever the output mode"""
+    if self.json_format is True:
+        return formatted
+
+    return self.json_decoder(formatted)
+
+
+def to_formatted(self, obj):
+    """Formats a JSON object like format_response would have formatted its response"""
+    if self.json_format is True:
+        return obj
+
+    text = json.dumps(obj)
+    return text.encode("utf-8") if self.json_format == RAW_BYTES else text
+
+
 def save_token(self, response):
     """Extracts the access token from the API response"""
     res = response.json()
@@ -93,46 +257,118 @@ def save_token(self, response):
 
     self.token = self.Token(token_type, access_token, expires_in)
 
+    if self.token_store:
+        self.token_store.save(self.token_store_key, self.token.to_dict())
+
 
 def batch_file_request(
-    uploaded_files, method, endpoint, headers, data, file_keyword="file"
+    uploaded_files,
+    method,
+    endpoint,
+    headers,
+    data,
+    file_keyword="file",
+    session=None,
+    preprocessor=None,
 ):
     # pylint: disable = no-value-for-parameter
     filereader = FileReader()
+    files = []
+    encoder = None
 
     try:
-        files = []
-        total_batch_size = 0
         for file in uploaded_files:
-            file_obj = filereader.get_file(file)
-            file_size = check_file_size(file_obj)
+            files.append((file_keyword, filereader.get_file(file)))
 
-            files.append((file_keyword, file_obj))
-            total_batch_size += file_size
+        if preprocessor:
+            processed = preprocessor.process_files([file for (_, file) in files])
+            files = [(file_keyword, file) for file in processed]
+
+        total_batch_size = 0
+        for (_, file_obj) in files:
+            total_batch_size += check_file_size(file_obj)
 
         if total_batch_size > MAX_LOCAL_IMAGE_BATCH_SIZE:
             raise error.InvalidQueryError(
                 message="Max batch upload size is %d megabytes."
-                % (bytes_to_mb(MAX_LOCAL_IMAGE_BATCH_SIZE))
+                % (MAX_LOCAL_IMAGE_BATCH_SIZE / 1024 / 1024)
             )
 
-        return requests.request(
-            method, endpoint, **{"headers": headers, "files": files, "data": data}
+        # stream the body from the files rather than building it in memory
+        encoder = MultipartEncoder(data, files)
+        headers = dict(headers)
+        headers["Content-Type"] = encoder.content_type
+
+        return (session or requests).request(
+            method, endpoint, **{"headers": headers, "data": encoder}
         )
     finally:
-        for file_tuple in files:
-            (key, file) = file_tuple
-            file.close()
+        if encoder is not None:
+            encoder.close()
+        else:
+            for file_tuple in files:
+                (key, file) = file_tuple
+                file.close()
+
+
+def upload_request(
+    method,
+    endpoint,
+    headers,
+    data,
+    files,
+    session=None,
+    progress=None,
+    retries=UPLOAD_RETRIES,
+):
+    """
+    Streams large files (a list of (field name, open file) tuples) to the API in chunks,
+    closing them when done.
+
+    progress: optional callback, called with (bytes sent, total bytes) as the upload proceeds
+    retries: times the upload is restarted when the connection fails before the whole body is
+      sent; the API has no way to resume an upload, so each attempt starts over from the
+      beginning of the files (and progress starts over from 0). The async client restarts
+      its uploads the same way, see AsyncSession.send
+    """
+    files = [(name, file) for (name, file) in files if file is not None]
+    headers = dict(headers)
+    encoder = None
+
+    try:
+        encoder = MultipartEncoder(data, files, UPLOAD_CHUNK_SIZE, progress, retries)
+        headers["Content-Type"] = encoder.content_type
+        while True:
+            try:
+                return (session or requests).request(
+                    method, endpoint, **{"headers": headers, "data": encoder}
+                )
+            except requests.ConnectionError:
+                if not encoder.rewind():
+                    raise
+
+            time.sleep(upload_backoff(encoder.attempt))
+    finally:
+        if encoder is not None:
+            encoder.close()
+        else:
+            for (_, file) in files:
+                file.close()
+
+
+def upload_backoff(attempt):
+    """Seconds to wait before restarting an upload for the `attempt`th time"""
+    return min(2 ** (attempt - 1), UPLOAD_MAX_BACKOFF)
 
 
 def check_file_size(file):
     # pylint: disable = no-value-for-parameter
-    file_size = os.fstat(file.fileno()).st_size
+    file_size = file_length(file)
 
     if file_size > MAX_LOCAL_IMAGE_SIZE:
         raise error.InvalidQueryError(
             message="File %s is larger than the limit of %d megabytes"
-            % (file.name, bytes_to_mb(MAX_LOCAL_IMAGE_SIZE))
+            % (file_name(file, "in memory"), MAX_LOCAL_IMAGE_SIZE / 1024 / 1024)
         )
 
     return file_size
@@ -150,11 +386,30 @@ class Token(object):
     def authorization_header(self):
         return self.token_type + " " + self.token_str
 
-    def expired(self):
-        return (
-            self.born + datetime.timedelta(0, int(self.lifetime))
-            < datetime.datetime.now()
+    def expired(self, fraction=1):
+        """Whether `fraction` of the token's lifetime has passed (by default, all of it)"""
+        return self.expires_at(fraction) < datetime.datetime.now()
+
+    def expires_at(self, fraction=1):
+        return self.born + datetime.timedelta(0, int(self.lifetime) * fraction)
+
+    def to_dict(self):
+        return {
+            "token_type": self.token_type,
+            "access_token": self.token_str,
+            "born": self.born.timestamp(),
+            "expires_in": self.lifetime,
+        }
+
+    @classmethod
+    def from_dict(cls, token_dict):
+        token = cls(
+            token_dict["token_type"],
+            token_dict["access_token"],
+            token_dict["expires_in"],
         )
+        token.born = datetime.datetime.fromtimestamp(token_dict["born"])
+        return token
 
 
 class FileReader(object):
@@ -164,14 +419,128 @@ class FileReader(object):
         pass
 
     def get_file(self, file_input):
-        """Extracts file from file path or returns the file if file is passed in"""
+        """
+        Extracts file from file path or returns the file if file is passed in.
+        In-memory images (bytes, bytearray, memoryview) are wrapped without copying them,
+        and NumPy arrays are encoded to JPEG.
+        """
         local_file = file_input
         if isinstance(file_input, str):
             local_file = open(file_input, "rb")
+        elif isinstance(file_input, (bytes, bytearray, memoryview)):
+            local_file = MemoryFile(file_input)
+        elif isinstance(file_input, io.BytesIO) and not hasattr(file_input, "name"):
+            local_file = MemoryFile(file_input.getbuffer()[file_input.tell() :])
+        elif is_array(file_input):
+            local_file = MemoryFile(encode_array(file_input))
 
         return local_file
 
 
+# image file extensions by leading bytes, so in-memory images are uploaded with a file name
+# (and content type) the server recognizes
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF8", "gif"),
+    (b"BM", "bmp"),
+    (b"RIFF", "webp"),
+)
+
+ARRAY_JPEG_QUALITY = 95
+
+
+class MemoryFile(io.RawIOBase):
+    """A read-only file over an in-memory buffer that hands out chunks without copying the whole buffer"""
+
+    def __init__(self, buffer, name=None):
+        super(MemoryFile, self).__init__()
+        self.buffer = memoryview(buffer).cast("B")
+        self.position = 0
+        self.name = name or "image." + image_extension(self.buffer)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        end = len(self.buffer) if size is None or size < 0 else self.position + size
+        chunk = bytes(self.buffer[self.position : end])
+        self.position += len(chunk)
+        return chunk
+
+    def readinto(self, target):
+        chunk = self.read(len(target))
+        target[: len(chunk)] = chunk
+        return len(chunk)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += len(self.buffer)
+        self.position = max(offset, 0)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        super(MemoryFile, self).close()
+        self.buffer.release()
+
+
+def image_extension(buffer):
+    header = bytes(buffer[:8])
+    for (signature, extension) in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+
+    return "jpg"
+
+
+def is_array(file_input):
+    # checked without importing numpy, which is optional
+    return type(file_input).__module__ == "numpy" and hasattr(file_input, "shape")
+
+
+def encode_array(array):
+    """JPEG-encodes an RGB (or grayscale) uint8 NumPy image with Pillow, or OpenCV if Pillow is missing"""
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+
+    if Image is not None:
+        output = io.BytesIO()
+        image = Image.fromarray(array)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(output, format="JPEG", quality=ARRAY_JPEG_QUALITY)
+        return output.getbuffer()
+
+    try:
+        import cv2
+    except ImportError:
+        raise error.InvalidQueryError(
+            message="Uploading NumPy arrays requires Pillow or OpenCV (pip install matroid[images])"
+        )
+
+    # OpenCV expects BGR
+    if array.ndim == 3 and array.shape[2] == 3:
+        array = cv2.cvtColor(array, cv2.COLOR_RGB2BGR)
+    elif array.ndim == 3 and array.shape[2] == 4:
+        array = cv2.cvtColor(array, cv2.COLOR_RGBA2BGR)
+    (ok, encoded) = cv2.imencode(
+        ".jpg", array, [cv2.IMWRITE_JPEG_QUALITY, ARRAY_JPEG_QUALITY]
+    )
+    if not ok:
+        raise error.InvalidQueryError(message="Could not encode the image as JPEG")
+    return encoded
+
+
 def get_endpoints(base_url):
     end_points = {
         # accounts
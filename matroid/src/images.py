@@ -1,23 +1,329 @@
+import collections
+import io
 import os
-import requests
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 from matroid import error
-from matroid.src.helpers import api_call, batch_file_request
+from matroid.src.helpers import (
+    api_call,
+    batch_file_request,
+    image_extension,
+    is_array,
+    parse_formatted,
+    to_formatted,
+    MAX_LOCAL_IMAGE_BATCH_SIZE,
+)
+from matroid.src.multipart import file_length, file_name
+from matroid.src.result_cache import image_digest, request_digest
+from matroid.src.results import typed_results
+
+# outcome of one image of classify_images: `result` is its entry of the response's "results",
+# or None if classifying it failed with `error`
+ClassificationResult = collections.namedtuple(
+    "ClassificationResult", ["input", "result", "error"]
+)
+
 
 # https://staging.app.matroid.com/docs/api/documentation#api-Images-Classify
-@api_call(error.InvalidQueryError)
 def classify_image(self, detectorId, file=None, url=None, **options):
     """
     Classify an image with a detector
 
     detectorId: a unique id for the detector
-    file: path to local image file to classify
+    file: path to local image file to classify, or a list of them; lists larger than the
+      batch upload limit are split into batches that are classified concurrently
+    url: internet URL for the image to classify
+
+    With a result_cache, only the images that are not in the cache are sent to the API.
+    """
+    results = cached_classification(self, detectorId, file, url, options)
+    return typed_results(self, "classify_image", results)
+
+
+def cached_classification(self, detectorId, file=None, url=None, options={}):
+    if not self.result_cache or (file is None) == (url is None):
+        return classify_in_batches(self, detectorId, file, url, options)
+
+    if url is None:
+        cached = CachedResults(self, detectorId, file, False, options)
+    else:
+        cached = CachedResults(self, detectorId, url, True, options)
+    response = None
+    if cached.missing:
+        response = classify_in_batches(self, detectorId, options=options, **cached.request())
+
+    return cached.complete(response)
+
+
+def classify_in_batches(self, detectorId, file=None, url=None, options={}):
+    batches = file_batches(file) if not url else None
+    if not batches or len(batches) == 1:
+        return self.classify_image_batch(detectorId, file=file, url=url, **options)
+
+    def classify_batch(batch):
+        files = [file[index] for index in batch]
+        return self.classify_image_batch(detectorId, file=files, **options)
+
+    # the pool bounds how many batches are uploaded at once
+    workers = min(len(batches), getattr(self.session, "pool_maxsize", 1))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        responses = list(executor.map(classify_batch, batches))
+
+    return merge_batch_results(self, batches, responses)
+
+
+class CachedResults(object):
+    """
+    The per-image results of a classify_image call found in the result cache, and the other
+    fields of its response, cached per detector and options
+    """
+
+    def __init__(self, api, detectorId, images, is_url, options):
+        self.api = api
+        self.detectorId = detectorId
+        self.is_list = isinstance(images, list)
+        self.images = images if self.is_list else [images]
+        self.is_url = is_url
+
+        # URLs are downloaded by the API, only uploaded files are preprocessed
+        preprocessing = None if is_url else preprocessor_settings(api)
+        self.keys = [
+            request_digest(
+                "classify_image",
+                detectorId,
+                options,
+                image if is_url else image_digest(image),
+                preprocessing,
+            )
+            for image in self.images
+        ]
+        self.results = [api.result_cache.get(detectorId, key) for key in self.keys]
+        if not is_url:
+            # cached results describe the file they were first requested for
+            self.results = [
+                result if result is None else with_file_name(result, image)
+                for (result, image) in zip(self.results, self.images)
+            ]
+        self.missing = [
+            index for (index, result) in enumerate(self.results) if result is None
+        ]
+
+        self.info_key = request_digest("classify_image", detectorId, options)
+        self.info = api.result_cache.get(detectorId, self.info_key)
+        if self.info is None and not self.missing:
+            # the rest of the response isn't cached, request one image to get it
+            self.missing = [0]
+
+    def request(self):
+        """Arguments of classify_image for the images that were not in the cache"""
+        images = [self.images[index] for index in self.missing]
+        if not self.is_list:
+            images = images[0]
+
+        return {"url": images} if self.is_url else {"file": images}
+
+    def complete(self, response):
+        """Caches the results of `response` for the missing images, returns the results of all"""
+        if response is not None:
+            merged = parse_formatted(self.api, response)
+            for (index, result) in zip(self.missing, merged["results"]):
+                self.api.result_cache.put(self.detectorId, self.keys[index], result)
+                self.results[index] = result
+
+            self.info = {
+                name: value for (name, value) in merged.items() if name != "results"
+            }
+            self.api.result_cache.put(self.detectorId, self.info_key, self.info)
+
+        merged = dict(self.info or {})
+        merged["results"] = self.results
+
+        return to_formatted(self.api, merged)
+
+
+def file_batches(files, max_batch_size=MAX_LOCAL_IMAGE_BATCH_SIZE):
+    """
+    Packs a list of files (paths or open files) into as few batches as possible whose
+    total size is within max_batch_size. Returns the batches as lists of indices into
+    `files`, or None if `files` is not a list.
+    """
+    if not isinstance(files, list):
+        return None
+
+    sizes = [local_file_size(file) for file in files]
+    batches = []
+    batch_sizes = []
+    # first fit decreasing: place the largest files first, each in the first batch it fits in
+    for index in sorted(range(len(files)), key=lambda index: -sizes[index]):
+        for (number, batch_size) in enumerate(batch_sizes):
+            if batch_size + sizes[index] <= max_batch_size:
+                batches[number].append(index)
+                batch_sizes[number] += sizes[index]
+                break
+        else:
+            # files over the limit get a batch of their own, which reports the error
+            batches.append([index])
+            batch_sizes.append(sizes[index])
+
+    return [sorted(batch) for batch in batches]
+
+
+def local_file_size(file):
+    if isinstance(file, str):
+        return os.path.getsize(file)
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        return memoryview(file).nbytes
+    if is_array(file):
+        # an upper bound, arrays are only JPEG-encoded when they are uploaded
+        return file.nbytes
+
+    return file_length(file)
+
+
+def merge_batch_results(self, batches, responses):
+    """Combines the classifications of each batch into one response, in the order of the input files"""
+    responses = [parse_formatted(self, response) for response in responses]
+
+    results = [None] * sum(len(batch) for batch in batches)
+    for (batch, response) in zip(batches, responses):
+        for (index, result) in zip(batch, response["results"]):
+            results[index] = result
+
+    merged = dict(responses[0])
+    merged["results"] = results
+
+    return to_formatted(self, merged)
+
+
+def classify_images(
+    self, detectorId, inputs, concurrency=8, ordered=False, batch_size=10, **options
+):
+    """
+    Classify a large number of images with a detector, yielding a ClassificationResult for
+    each image as soon as its batch is classified
+
+    detectorId: a unique id for the detector
+    inputs: iterable of local image paths, open image files and image URLs; it is read lazily
+    concurrency: maximum number of requests in flight
+    ordered: yield results in the order of `inputs` instead of as they complete
+    batch_size: maximum number of images sent in one request
+
+    Failures are yielded in the `error` of the images they concern rather than raised; when a
+    batch is rejected, its images are retried one by one to single out the bad ones.
+    """
+    pending = collections.deque()
+
+    def take_completed():
+        if ordered:
+            return pending.popleft().result()
+
+        (done, _) = wait(pending, return_when=FIRST_COMPLETED)
+        completed = []
+        for future in done:
+            pending.remove(future)
+            completed.extend(future.result())
+        return completed
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            for batch in image_batches(inputs, batch_size):
+                pending.append(
+                    executor.submit(classify_items, self, detectorId, batch, options)
+                )
+                # only read ahead a bit, so the inputs can be a generator of millions of images
+                while len(pending) >= 2 * concurrency:
+                    yield from take_completed()
+
+            while pending:
+                yield from take_completed()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def image_batches(inputs, batch_size, max_batch_size=MAX_LOCAL_IMAGE_BATCH_SIZE):
+    """Groups consecutive URLs or files into (is_url, items) batches within the upload limits"""
+    batch = []
+    batch_is_url = None
+    batch_bytes = 0
+
+    for item in inputs:
+        is_url = isinstance(item, str) and item.startswith(("http://", "https://"))
+        size = 0
+        if not is_url:
+            try:
+                size = local_file_size(item)
+            except (OSError, ValueError):
+                # let the request report it as the error of this image
+                pass
+
+        if batch and (
+            is_url != batch_is_url
+            or len(batch) >= batch_size
+            or batch_bytes + size > max_batch_size
+        ):
+            yield (batch_is_url, batch)
+            batch = []
+            batch_bytes = 0
+
+        batch.append(item)
+        batch_is_url = is_url
+        batch_bytes += size
+
+    if batch:
+        yield (batch_is_url, batch)
+
+
+def classify_items(self, detectorId, batch, options):
+    """Classifies a batch of classify_images, returning a ClassificationResult per image"""
+    (is_url, items) = batch
+    try:
+        if is_url:
+            response = cached_classification(self, detectorId, url=items, options=options)
+        else:
+            response = cached_classification(self, detectorId, file=items, options=options)
+
+        results = parse_formatted(self, response)["results"]
+        if len(results) != len(items):
+            raise error.APIError(
+                message="Expected %d results, got %d" % (len(items), len(results))
+            )
+    except Exception as e:
+        # a bad image fails its whole batch, but rate limits or outages would fail each image too
+        retry_one_by_one = (
+            len(items) > 1
+            and isinstance(e, (error.InvalidQueryError, error.MediaError))
+            and not any(getattr(item, "closed", False) for item in items)
+        )
+        if not retry_one_by_one:
+            return [ClassificationResult(item, None, e) for item in items]
+
+        return [
+            result
+            for item in items
+            for result in classify_items(self, detectorId, (is_url, [item]), options)
+        ]
+
+    return [
+        ClassificationResult(item, to_formatted(self, result), None)
+        for (item, result) in zip(items, results)
+    ]
+
+
+# https://staging.app.matroid.com/docs/api/documentation#api-Images-Classify
+@api_call(error.InvalidQueryError, endpoint="classify_image", public_name="classify_image")
+def classify_image_batch(self, detectorId, file=None, url=None, **options):
+    """
+    Classify images with a detector in a single request; see classify_image
+
+    detectorId: a unique id for the detector
+    file: path to local image file to classify, or a list of them within the batch upload limit
     url: internet URL for the image to classify
     """
 
     (endpoint, method) = self.endpoints["classify_image"]
 
-    if not url and not file:
+    if not url and no_files(file):
         raise error.InvalidQueryError(message="Missing required parameter: file or url")
 
     endpoint = endpoint.replace(":key", detectorId)
@@ -29,13 +335,21 @@ def classify_image(self, detectorId, file=None, url=None, **options):
 
         if url:
             data["url"] = url
-        if file:
+        if file is not None:
             if not isinstance(file, list):
                 file = [file]
 
-            return batch_file_request(file, method, endpoint, headers, data)
+            return batch_file_request(
+                file,
+                method,
+                endpoint,
+                headers,
+                data,
+                session=self.session,
+                preprocessor=self.image_preprocessor,
+            )
         else:
-            return requests.request(
+            return self.session.request(
                 method, endpoint, **{"headers": headers, "data": data}
             )
     except IOError as e:
@@ -46,8 +360,12 @@ def classify_image(self, detectorId, file=None, url=None, **options):
         raise error.APIConnectionError(message=e)
 
 
+def no_files(files):
+    """Whether no file was given: None or an empty list (a NumPy array has no truth value)"""
+    return files is None or (isinstance(files, list) and not files)
+
+
 # https://staging.app.matroid.com/docs/api/documentation#api-Images-PostLocalize
-@api_call(error.InvalidQueryError)
 def localize_image(self, localizer, localizerLabel, **options):
     """
     Note: this API is very similar to Images/Classify;
@@ -55,7 +373,92 @@ def localize_image(self, localizer, localizerLabel, **options):
     by supplying update=true, labelId, and one of imageId or imageIds, and it has
     access to the internal face localizer
     (localizer="DEFAULT_FACE" and localizerLabel="face").
+
+    With a result_cache, localizing the same images again is answered from the cache.
+    """
+    if not self.result_cache or options.get("update"):
+        return self.localize_image_batch(localizer, localizerLabel, **options)
+
+    key = localization_key(self, localizer, localizerLabel, options)
+    result = self.result_cache.get(localizer, key)
+    if result is None:
+        response = self.localize_image_batch(localizer, localizerLabel, **options)
+        result = parse_formatted(self, response)
+        self.result_cache.put(localizer, key, result)
+    else:
+        result = cached_localization(result, options)
+
+    return to_formatted(self, result)
+
+
+def localization_key(self, localizer, localizerLabel, options):
+    files = options.get("file")
+    if files is not None and not isinstance(files, list):
+        files = [files]
+
+    return request_digest(
+        "localize_image",
+        localizer,
+        localizerLabel,
+        {name: value for (name, value) in options.items() if name != "file"},
+        [image_digest(file) for file in files or []],
+        preprocessor_settings(self) if files else None,
+    )
+
+
+def cached_localization(result, options):
+    """A cached localize_image result, with the file names of the files of this call"""
+    files = options.get("file")
+    if files is None or not isinstance(result.get("results"), list):
+        return result
+
+    if not isinstance(files, list):
+        files = [files]
+    result = dict(result)
+    result["results"] = [
+        with_file_name(image_result, file)
+        for (image_result, file) in zip(result["results"], files)
+    ]
+    return result
+
+
+def preprocessor_settings(self):
+    """The settings of the client's image preprocessor, which change the uploaded images"""
+    preprocessor = getattr(self, "image_preprocessor", None)
+    return preprocessor.settings() if preprocessor is not None else None
+
+
+def with_file_name(result, file):
+    """
+    A copy of a cached result of one image whose "file" has the name `file` is uploaded with,
+    leaving the cached result as it is
     """
+    name = upload_name(file)
+    if name is None or not isinstance(result.get("file"), dict):
+        return result
+
+    result = dict(result)
+    result["file"] = dict(result["file"], name=name)
+    return result
+
+
+def upload_name(file):
+    """The file name an image input is uploaded with, None if it has none of its own"""
+    if isinstance(file, str):
+        return os.path.basename(file)
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        return "image." + image_extension(file)
+    if is_array(file):
+        return "image.jpg"
+    if isinstance(file, io.BytesIO) and not hasattr(file, "name"):
+        return "image." + image_extension(file.getbuffer()[file.tell() :])
+    return file_name(file, None)
+
+
+# https://staging.app.matroid.com/docs/api/documentation#api-Images-PostLocalize
+@api_call(error.InvalidQueryError, endpoint="localize_image", public_name="localize_image")
+def localize_image_batch(self, localizer, localizerLabel, **options):
+    """Localize images in a single request, without the result cache; see localize_image"""
     (endpoint, method) = self.endpoints["localize_image"]
 
     data = {
@@ -82,7 +485,7 @@ def localize_image(self, localizer, localizerLabel, **options):
         files = options.get("file")
         urls = options.get("url")
 
-        if not files and not urls:
+        if no_files(files) and not urls:
             raise error.InvalidQueryError(
                 message="Missing required parameter: files or urls"
             )
@@ -107,20 +510,28 @@ def localize_image(self, localizer, localizerLabel, **options):
         )
 
         if update:
-            return requests.request(
+            return self.session.request(
                 method, endpoint, **{"headers": headers, "data": data}
             )
 
-        if files:
+        if not no_files(files):
             if not isinstance(files, list):
                 files = [files]
-            return batch_file_request(files, method, endpoint, headers, data)
+            return batch_file_request(
+                files,
+                method,
+                endpoint,
+                headers,
+                data,
+                session=self.session,
+                preprocessor=self.image_preprocessor,
+            )
         else:
             if isinstance(urls, list):
                 data["urls"] = urls
             else:
                 data["url"] = urls
-            return requests.request(
+            return self.session.request(
                 method, endpoint, **{"headers": headers, "data": data}
             )
     except IOError as e:
@@ -0,0 +1,174 @@
+import codecs
+import json
+
+DECODER = json.JSONDecoder()
+WHITESPACE = " \t\r\n"
+NUMBER_START = "-0123456789"
+NUMBER_PART = ("", ".", "e", "E", "+", "-") + tuple("0123456789")
+
+# parser states
+(
+    START,
+    MEMBER,
+    MEMBER_VALUE,
+    STREAMED,
+    STREAMED_MEMBER,
+    STREAMED_VALUE,
+    STREAMED_ITEM,
+    DONE,
+) = range(8)
+
+
+class IncompleteInput(Exception):
+    """More input is needed to parse the next token"""
+
+
+class StreamedObjectParser(object):
+    """
+    Incremental parser of a JSON object one of whose members is too large to decode at once,
+    e.g. the detections of get_video_results.
+
+    feed() the response body chunk by chunk: each entry of the streamed member (a key and
+    value of an object, or an item of a list) is decoded as soon as it is complete and
+    returned as a (key, value) pair, key being None for list items. The other members of
+    the object are decoded into `info`. Only the entry being received is buffered.
+
+    streamed_key: name of the member to stream
+    """
+
+    def __init__(self, streamed_key):
+        self.streamed_key = streamed_key
+        self.info = {}
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.state = START
+        self.key = None
+        self.entry_key = None
+        # length of text after the position needed before an incomplete value is decoded again
+        self.retry_length = 0
+
+    def feed(self, data, final=False):
+        """Adds the next chunk of the body; returns the streamed entries it completed"""
+        self.buffer = self.buffer[self.pos :] + self.text_decoder.decode(data, final)
+        self.pos = 0
+
+        entries = []
+        try:
+            while self.state != DONE:
+                self.step(entries)
+        except IncompleteInput:
+            pass
+        return entries
+
+    def close(self):
+        """
+        Ends the body, returning the streamed entries left; raises ValueError if the body was
+        not a complete object
+        """
+        self.retry_length = 0
+        entries = self.feed(b"", final=True)
+        if self.state != DONE:
+            raise ValueError("Incomplete or invalid JSON object in the response")
+        return entries
+
+    @property
+    def done(self):
+        return self.state == DONE
+
+    def step(self, entries):
+        state = self.state
+        if state == START:
+            self.expect("{")
+            self.state = MEMBER
+        elif state == MEMBER:
+            if self.next_char(skip=",") == "}":
+                self.pos += 1
+                self.state = DONE
+                return
+            self.key = self.read_key()
+            self.state = STREAMED if self.key == self.streamed_key else MEMBER_VALUE
+        elif state == MEMBER_VALUE:
+            self.info[self.key] = self.read_value()
+            self.state = MEMBER
+        elif state == STREAMED:
+            char = self.next_char()
+            if char == "{":
+                self.pos += 1
+                self.state = STREAMED_MEMBER
+            elif char == "[":
+                self.pos += 1
+                self.state = STREAMED_ITEM
+            else:
+                self.state = MEMBER_VALUE
+        elif state == STREAMED_MEMBER:
+            if self.next_char(skip=",") == "}":
+                self.pos += 1
+                self.state = MEMBER
+                return
+            self.entry_key = self.read_key()
+            self.state = STREAMED_VALUE
+        elif state == STREAMED_VALUE:
+            entries.append((self.entry_key, self.read_value()))
+            self.state = STREAMED_MEMBER
+        elif state == STREAMED_ITEM:
+            if self.next_char(skip=",") == "]":
+                self.pos += 1
+                self.state = MEMBER
+                return
+            entries.append((None, self.read_value()))
+
+    def next_char(self, skip=""):
+        """The next significant character, skipping whitespace and `skip` characters"""
+        buffer = self.buffer
+        pos = self.pos
+        while pos < len(buffer) and (buffer[pos] in WHITESPACE or buffer[pos] in skip):
+            pos += 1
+        self.pos = pos
+        if pos == len(buffer):
+            raise IncompleteInput()
+        return buffer[pos]
+
+    def expect(self, char):
+        found = self.next_char()
+        if found != char:
+            raise ValueError("Expected %r in the JSON response, found %r" % (char, found))
+        self.pos += 1
+
+    def read_key(self):
+        """Reads `"key":`, leaving the position unchanged if it is not complete yet"""
+        start = self.pos
+        if self.next_char() != '"':
+            raise ValueError("Expected a key in the JSON response")
+        try:
+            key = self.read_value()
+            self.expect(":")
+        except IncompleteInput:
+            self.pos = start
+            raise
+        return key
+
+    def read_value(self):
+        """Decodes the next JSON value if it is complete"""
+        self.next_char()
+        buffer = self.buffer
+        pos = self.pos
+        if len(buffer) - pos < self.retry_length:
+            raise IncompleteInput()
+
+        try:
+            (value, end) = DECODER.raw_decode(buffer, pos)
+        except ValueError:
+            # incomplete, or invalid, which shows when the body ends: wait for the value to
+            # double before decoding it again, so a large value is decoded a few times at most
+            self.retry_length = 2 * (len(buffer) - pos)
+            raise IncompleteInput()
+
+        if buffer[pos] in NUMBER_START and buffer[end : end + 1] in NUMBER_PART:
+            # the number may go on in the next chunk, e.g. "1." or "1e" were only decoded as 1
+            self.retry_length = len(buffer) - pos + 1
+            raise IncompleteInput()
+
+        self.pos = end
+        self.retry_length = 0
+        return value
@@ -1,4 +1,3 @@
-import requests
 import json
 
 from matroid import error
@@ -25,7 +24,13 @@ def create_label_with_images(self, detectorId, name, imageFiles, **options):
             imageFiles = [imageFiles]
 
         return batch_file_request(
-            imageFiles, method, endpoint, headers, data, "imageFiles"
+            imageFiles,
+            method,
+            endpoint,
+            headers,
+            data,
+            "imageFiles",
+            session=self.session,
         )
     except IOError as e:
         raise e
@@ -45,7 +50,7 @@ def delete_label(self, detectorId, labelId):
 
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -72,7 +77,7 @@ def get_annotations(self, **options):
             "labelIds": label_ids,
             "imageId": image_id,
         }
-        return requests.request(
+        return self.session.request(
             method, endpoint, **{"headers": headers, "params": params}
         )
     except Exception as e:
@@ -88,7 +93,7 @@ def get_label_images(self, detectorId, labelId):
 
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -107,7 +112,9 @@ def update_annotations(self, detectorId, labelId, images, **options):
         }
         data.update(options)
 
-        return requests.request(method, endpoint, **{"headers": headers, "data": data})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "data": data}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -129,7 +136,13 @@ def update_label_with_images(self, detectorId, labelId, imageFiles, **options):
             imageFiles = [imageFiles]
 
         return batch_file_request(
-            imageFiles, method, endpoint, headers, data, "imageFiles"
+            imageFiles,
+            method,
+            endpoint,
+            headers,
+            data,
+            "imageFiles",
+            session=self.session,
         )
     except IOError as e:
         raise e
@@ -0,0 +1,158 @@
+import mimetypes
+import os
+import uuid
+
+CHUNK_SIZE = 64 * 1024
+
+
+def file_length(file):
+    """Number of bytes left to read in `file`"""
+    position = file.tell()
+    try:
+        return os.fstat(file.fileno()).st_size - position
+    except (AttributeError, OSError, ValueError):
+        # in-memory and other unsized files: measure by seeking to the end
+        end = file.seek(0, os.SEEK_END)
+        file.seek(position)
+        return end - position
+
+
+def file_name(file, default):
+    name = getattr(file, "name", None)
+    if isinstance(name, str) and name:
+        return os.path.basename(name)
+    return default
+
+
+class MultipartEncoder(object):
+    """
+    A multipart/form-data body that is read from the files chunk by chunk while it is sent,
+    instead of being assembled in memory first like requests' `files=` does.
+
+    fields: form fields, as a dict; None values are skipped and lists become repeated fields
+    files: list of (field name, open binary file) tuples, which the encoder closes with close()
+    progress: optional callback, called with (bytes read, total bytes) as the body is read
+    restarts: times the body may be rewound to send it again after a failed attempt
+
+    Pass it as `data=` with `headers={"Content-Type": encoder.content_type}`; its length is
+    known up front, so it is sent with a Content-Length rather than chunked.
+    """
+
+    def __init__(self, fields, files, chunk_size=CHUNK_SIZE, progress=None, restarts=0):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = "multipart/form-data; boundary=" + self.boundary
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.restarts = restarts
+        self.attempt = 0
+        self.sent = 0
+        self.files = [file for (_, file) in files]
+        self.positions = [file.tell() for file in self.files]
+        self.parts = []
+
+        for (name, value) in (fields or {}).items():
+            values = value if isinstance(value, (list, tuple)) else [value]
+            for value in values:
+                if value is None:
+                    continue
+                if not isinstance(value, bytes):
+                    value = str(value).encode("utf-8")
+                self.parts.append((self.part_header(name), value, len(value)))
+
+        for (name, file) in files:
+            filename = file_name(file, name)
+            content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            header = self.part_header(name, filename, content_type)
+            self.parts.append((header, file, file_length(file)))
+
+        self.closing = ("--%s--\r\n" % self.boundary).encode("utf-8")
+        self.len = len(self.closing) + sum(
+            len(header) + length + 2 for (header, _, length) in self.parts
+        )
+        self.chunks = self.iter_chunks()
+        # the chunk being read, and how much of it was read
+        self.chunk = b""
+        self.offset = 0
+
+    def part_header(self, name, filename=None, content_type=None):
+        disposition = 'form-data; name="%s"' % name
+        if filename is not None:
+            disposition += '; filename="%s"' % filename.replace('"', "%22")
+
+        header = "--%s\r\nContent-Disposition: %s\r\n" % (self.boundary, disposition)
+        if content_type:
+            header += "Content-Type: %s\r\n" % content_type
+
+        return (header + "\r\n").encode("utf-8")
+
+    def iter_chunks(self):
+        for (header, body, _) in self.parts:
+            yield header
+            if isinstance(body, bytes):
+                yield body
+            else:
+                chunk = body.read(self.chunk_size)
+                while chunk:
+                    yield chunk
+                    chunk = body.read(self.chunk_size)
+            yield b"\r\n"
+
+        yield self.closing
+
+    def __len__(self):
+        return self.len
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self.chunk[self.offset :] + b"".join(self.chunks)
+            (self.chunk, self.offset) = (b"", 0)
+        else:
+            # slices only the bytes returned, reads smaller than the chunks don't copy them
+            pieces = []
+            left = size
+            while left > 0:
+                if self.offset == len(self.chunk):
+                    chunk = next(self.chunks, None)
+                    if chunk is None:
+                        break
+                    (self.chunk, self.offset) = (chunk, 0)
+                    continue
+                piece = self.chunk[self.offset : self.offset + left]
+                self.offset += len(piece)
+                left -= len(piece)
+                pieces.append(piece)
+            data = pieces[0] if len(pieces) == 1 else b"".join(pieces)
+
+        self.sent += len(data)
+        if self.progress and data:
+            self.progress(self.sent, self.len)
+
+        return data
+
+    def rewind(self):
+        """
+        Starts the body over, from where the files were when the encoder was created, to
+        send it again after a failed attempt; returns False if it may not be restarted
+        """
+        # once the whole body went out the server may have acted on it, don't send it twice
+        if self.attempt >= self.restarts or self.sent >= self.len:
+            return False
+
+        for (file, position) in zip(self.files, self.positions):
+            file.seek(position)
+        self.chunks = self.iter_chunks()
+        (self.chunk, self.offset) = (b"", 0)
+        self.sent = 0
+        self.attempt += 1
+        return True
+
+    def detach(self):
+        """Returns an encoder taking over the files of this one, whose close() becomes a no-op"""
+        detached = object.__new__(MultipartEncoder)
+        detached.__dict__.update(self.__dict__)
+        self.files = []
+        return detached
+
+    def close(self):
+        for file in self.files:
+            file.close()
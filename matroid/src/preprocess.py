@@ -0,0 +1,164 @@
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from matroid.src.helpers import MemoryFile
+
+DEFAULT_MAX_SIDE = 1024
+DEFAULT_QUALITY = 85
+# EXIF tag of the orientation the image should be displayed in
+ORIENTATION = 0x0112
+
+
+class ImagePreprocessor(object):
+    """
+    Downsizes and re-encodes images before classify_image and localize_image upload them,
+    in a pool of worker processes so encoding doesn't hold the GIL. Images keep their pixel
+    orientation and EXIF orientation tag, and returned bounding boxes are normalized to the
+    image size, so they apply to the original images unchanged.
+
+    max_side: longest side, in pixels, images are scaled down to (smaller images keep their size)
+    quality: JPEG quality of the re-encoded images
+    strip_metadata: drop EXIF (except the orientation), ICC profiles and comments
+    workers: number of worker processes (defaults to the number of CPUs)
+
+    Share one preprocessor between clients to share its pool, and close() it when done.
+    Workers are spawned, so scripts using it need an `if __name__ == "__main__":` guard.
+    """
+
+    def __init__(
+        self,
+        max_side=DEFAULT_MAX_SIDE,
+        quality=DEFAULT_QUALITY,
+        strip_metadata=True,
+        workers=None,
+    ):
+        if Image is None:
+            raise ImportError(
+                "Image preprocessing requires Pillow, install it with `pip install matroid[images]`"
+            )
+
+        self.max_side = max_side
+        self.quality = quality
+        self.strip_metadata = strip_metadata
+        self.workers = workers
+        self.executor = None
+        # guards creating and shutting down the executor, which clients' threads share
+        self.executor_lock = threading.Lock()
+
+    def settings(self):
+        """The settings that change the preprocessed images, as a dict"""
+        return {
+            "max_side": self.max_side,
+            "quality": self.quality,
+            "strip_metadata": self.strip_metadata,
+        }
+
+    def process_files(self, files):
+        """
+        Returns the preprocessed versions of a list of open image files, closing the files that
+        were replaced. Files that cannot be decoded as images are returned as they are.
+        """
+        if not files:
+            return files
+
+        executor = self.get_executor()
+        sources = [image_source(file) for file in files]
+        outputs = executor.map(
+            preprocess_image,
+            sources,
+            [self.max_side] * len(files),
+            [self.quality] * len(files),
+            [self.strip_metadata] * len(files),
+        )
+
+        processed = []
+        for (file, source, output) in zip(files, sources, outputs):
+            if output is None:
+                if isinstance(source, bytes):
+                    # the file was read to send it to the worker, upload that copy instead
+                    name = getattr(file, "name", None)
+                    file.close()
+                    name = name if isinstance(name, str) else None
+                    file = MemoryFile(source, name=name)
+                processed.append(file)
+                continue
+
+            file.close()
+            processed.append(MemoryFile(output, name="image.jpg"))
+
+        return processed
+
+    def get_executor(self):
+        """The pool of worker processes, started by the first call"""
+        with self.executor_lock:
+            if self.executor is None:
+                # forked workers could inherit locks held by the client's other threads
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self.executor
+
+    def close(self):
+        with self.executor_lock:
+            (executor, self.executor) = (self.executor, None)
+
+        # waits for the images being preprocessed, without blocking a new pool from starting
+        if executor is not None:
+            executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def image_source(file):
+    """What to send a worker for `file`: its path if it is a file on disk, else its content"""
+    try:
+        os.fstat(file.fileno())
+        if file.tell() == 0 and os.path.isfile(file.name):
+            return file.name
+    except (AttributeError, OSError, ValueError, TypeError):
+        pass
+
+    return file.read()
+
+
+def preprocess_image(source, max_side, quality, strip_metadata):
+    """Runs in a worker process; returns the re-encoded JPEG, or None if `source` isn't an image"""
+    try:
+        image = Image.open(source if isinstance(source, str) else io.BytesIO(source))
+        # lets the JPEG decoder scale down while decoding, which is much faster than resizing after
+        image.draft("RGB", (max_side, max_side))
+        orientation = image.getexif().get(ORIENTATION)
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    image.thumbnail((max_side, max_side), Image.LANCZOS, reducing_gap=3.0)
+
+    metadata = {}
+    if not strip_metadata:
+        for key in ("exif", "icc_profile"):
+            if image.info.get(key):
+                metadata[key] = image.info[key]
+    elif orientation not in (None, 1):
+        # the pixels aren't rotated, so the API must still see how to orient them
+        exif = Image.Exif()
+        exif[ORIENTATION] = orientation
+        metadata["exif"] = exif.tobytes()
+
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality, **metadata)
+    return output.getvalue()
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+
+# requests of these API methods are paced by the bucket of their group, the rest are "metadata"
+DEFAULT_ENDPOINT_GROUPS = {
+    "classify_image": "classify",
+    "classify_image_batch": "classify",
+    "localize_image": "classify",
+    "localize_image_batch": "classify",
+    "classify_video": "classify",
+    "push_image": "push_image",
+}
+DEFAULT_GROUP = "metadata"
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket. Callers reserve a token and wait for the returned delay;
+    the balance can go negative, which queues callers in order instead of waking them
+    all at once when tokens come back.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self, now):
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def reserve(self):
+        """Takes a token; returns the number of seconds to wait before using it"""
+        with self.lock:
+            self.refill(time.monotonic())
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+
+            return -self.tokens / self.rate
+
+    def set_rate(self, rate, drain=False):
+        with self.lock:
+            self.refill(time.monotonic())
+            self.rate = float(rate)
+            if drain:
+                self.tokens = min(self.tokens, 0)
+
+
+class RateLimiter(object):
+    """
+    Paces API calls per endpoint group with token buckets shared by every thread and
+    coroutine using the client (or several clients, if they are given the same limiter).
+
+    rates: requests per second for each group ("classify", "metadata", "push_image");
+      groups without a rate are not limited
+    burst: requests a group may send at once after being idle (defaults to one second's worth)
+    groups: overrides of DEFAULT_ENDPOINT_GROUPS, API method name to group
+    adaptive: when the API answers with a RateLimitError the group's rate is multiplied by
+      decrease_factor, then grows back by increase_step requests per second every second
+      without rate limiting, up to its configured rate. Throughput then settles just below
+      the account's limit instead of bursting and backing off together.
+    min_rate: lowest rate an adaptive group is slowed down to
+    """
+
+    def __init__(
+        self,
+        rates,
+        burst=None,
+        groups=None,
+        adaptive=True,
+        decrease_factor=0.5,
+        increase_step=0.5,
+        min_rate=0.1,
+    ):
+        self.max_rates = dict(rates)
+        self.groups = dict(DEFAULT_ENDPOINT_GROUPS)
+        self.groups.update(groups or {})
+        self.adaptive = adaptive
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.min_rate = min_rate
+        self.buckets = {
+            group: TokenBucket(rate, burst) for (group, rate) in rates.items()
+        }
+        self.last_decrease = {group: 0 for group in rates}
+        self.lock = threading.Lock()
+
+    def bucket(self, name):
+        return self.buckets.get(self.groups.get(name, DEFAULT_GROUP))
+
+    def acquire(self, name):
+        """Blocks until API method `name` may send a request"""
+        bucket = self.bucket(name)
+        if bucket:
+            time.sleep(bucket.reserve())
+
+    async def acquire_async(self, name):
+        bucket = self.bucket(name)
+        if bucket:
+            await asyncio.sleep(bucket.reserve())
+
+    def on_rate_limited(self, name):
+        group = self.groups.get(name, DEFAULT_GROUP)
+        bucket = self.buckets.get(group)
+        if not bucket or not self.adaptive:
+            return
+
+        with self.lock:
+            # the 429s of requests that were already in flight don't count as a new signal
+            now = time.monotonic()
+            if now - self.last_decrease[group] < 1 / bucket.rate + 1:
+                return
+
+            self.last_decrease[group] = now
+            rate = max(self.min_rate, bucket.rate * self.decrease_factor)
+            bucket.set_rate(rate, drain=True)
+
+    def on_success(self, name):
+        group = self.groups.get(name, DEFAULT_GROUP)
+        bucket = self.buckets.get(group)
+        if not bucket or not self.adaptive or bucket.rate >= self.max_rates[group]:
+            return
+
+        with self.lock:
+            # one step per second at the current rate, i.e. additive increase
+            rate = bucket.rate + self.increase_step / bucket.rate
+            bucket.set_rate(min(self.max_rates[group], rate))
@@ -0,0 +1,256 @@
+import collections
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+DEFAULT_RESULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".matroid", "results")
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_MAX_DISK_BYTES = 1024 * 1024 * 1024
+DEFAULT_TTL = 7 * 24 * 60 * 60
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ResultCache(object):
+    """
+    Caches classification results by the content of the image (or its URL), the detector and
+    the request options, so identical requests don't cost credits twice.
+
+    max_entries: results kept in the in-memory LRU tier
+    directory: where the on-disk tier keeps results, shared by processes using the same
+      directory (None for memory only)
+    max_disk_bytes: size the on-disk tier is trimmed to, least recently used results first
+    ttl: seconds a result stays valid in both tiers (None to keep it until it is evicted)
+
+    Results of a detector are dropped when it is finalized or redone through a client using
+    the cache, and none are cached while it trains: until get_detector_info reports it
+    trained (or failed), when they are dropped again. Other processes sharing the directory
+    keep the results in their memory tier until those expire.
+    """
+
+    def __init__(
+        self,
+        max_entries=DEFAULT_MAX_ENTRIES,
+        directory=None,
+        max_disk_bytes=DEFAULT_MAX_DISK_BYTES,
+        ttl=DEFAULT_TTL,
+    ):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.group_keys = collections.defaultdict(set)
+        # groups (detectors) being trained, whose results aren't cached
+        self.training = set()
+        self.disk_bytes = None
+        self.lock = threading.Lock()
+        # guards disk_bytes and trimming, apart from the memory tier
+        self.disk_lock = threading.Lock()
+
+        if self.directory:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+    def get(self, group, key):
+        """Returns the cached result for key, or None"""
+        now = time.time()
+        with self.lock:
+            if group in self.training:
+                return None
+            entry = self.entries.get(key)
+            if entry is not None:
+                (expires_at, _, result) = entry
+                if expires_at is None or expires_at > now:
+                    self.entries.move_to_end(key)
+                    return result
+                self.forget(key)
+
+        if not self.directory:
+            return None
+
+        path = self.path(group, key)
+        try:
+            with open(path, "r") as result_file:
+                entry = json.load(result_file)
+        except (IOError, ValueError):
+            return None
+
+        if entry["expires_at"] is not None and entry["expires_at"] <= now:
+            remove_file(path)
+            return None
+
+        # the modification time orders results for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.remember(group, key, entry["expires_at"], entry["result"])
+        return entry["result"]
+
+    def put(self, group, key, result):
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        if not self.remember(group, key, expires_at, result):
+            return
+
+        if self.directory:
+            self.write(group, key, {"expires_at": expires_at, "result": result})
+
+    def invalidate(self, group):
+        """Drops the results of a group, i.e. of one detector"""
+        with self.lock:
+            for key in self.group_keys.pop(group, ()):
+                self.entries.pop(key, None)
+
+        if self.directory:
+            with self.disk_lock:
+                shutil.rmtree(self.group_directory(group), ignore_errors=True)
+                self.disk_bytes = None
+
+    def start_training(self, group):
+        """Drops the results of a detector about to be trained, and caches none until it is"""
+        with self.lock:
+            self.training.add(group)
+        self.invalidate(group)
+
+    def training_done(self, group):
+        """Drops the results cached while a detector was trained, e.g. by other processes"""
+        with self.lock:
+            if group not in self.training:
+                return
+            self.training.discard(group)
+        self.invalidate(group)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.group_keys.clear()
+
+        if self.directory:
+            with self.disk_lock:
+                for name in os.listdir(self.directory):
+                    shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+                self.disk_bytes = None
+
+    def remember(self, group, key, expires_at, result):
+        """Keeps a result in the memory tier; returns False if its detector is being trained"""
+        with self.lock:
+            if group in self.training:
+                return False
+            self.entries[key] = (expires_at, group, result)
+            self.entries.move_to_end(key)
+            self.group_keys[group].add(key)
+            while len(self.entries) > self.max_entries:
+                self.forget(next(iter(self.entries)))
+        return True
+
+    def forget(self, key):
+        (_, group, _) = self.entries.pop(key)
+        keys = self.group_keys[group]
+        keys.discard(key)
+        if not keys:
+            del self.group_keys[group]
+
+    def group_directory(self, group):
+        return os.path.join(self.directory, digest_of(group.encode("utf-8")))
+
+    def path(self, group, key):
+        return os.path.join(self.group_directory(group), key + ".json")
+
+    def write(self, group, key, entry):
+        directory = self.group_directory(group)
+        os.makedirs(directory, exist_ok=True)
+
+        # write then rename so readers never see a partially written file
+        (fd, tmp_path) = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(entry, tmp_file)
+                size = tmp_file.tell()
+            os.replace(tmp_path, self.path(group, key))
+        except Exception:
+            remove_file(tmp_path)
+            raise
+
+        with self.disk_lock:
+            if self.disk_bytes is None:
+                self.disk_bytes = sum(size for (_, size, _) in self.disk_files())
+            else:
+                self.disk_bytes += size
+
+            if self.disk_bytes > self.max_disk_bytes:
+                self.trim()
+
+    def disk_files(self):
+        for (directory, _, names) in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield (stat.st_mtime, stat.st_size, path)
+
+    def trim(self):
+        """
+        Removes the least recently used results until the on-disk tier is 10% under its
+        limit; called with disk_lock held
+        """
+        files = sorted(self.disk_files())
+        self.disk_bytes = sum(size for (_, size, _) in files)
+        for (_, size, path) in files:
+            if self.disk_bytes <= self.max_disk_bytes * 0.9:
+                break
+            remove_file(path)
+            self.disk_bytes -= size
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def digest_of(data):
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def request_digest(*parts):
+    """Digest of the JSON-serializable parts of a request, e.g. the API method, detector and options"""
+    encoded = json.dumps(parts, sort_keys=True, default=str)
+    return digest_of(encoded.encode("utf-8"))
+
+
+def image_digest(image):
+    """
+    Digest of the content of an image input: a local path, an open file, a bytes-like object
+    or a NumPy array. Open files are rewound to where they were.
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+
+    if isinstance(image, str):
+        with open(image, "rb") as image_file:
+            hash_file(hasher, image_file)
+    elif isinstance(image, (bytes, bytearray, memoryview)):
+        hasher.update(image)
+    elif hasattr(image, "read"):
+        position = image.tell()
+        hash_file(hasher, image)
+        image.seek(position)
+    else:
+        # NumPy array
+        hasher.update(("%s%s" % (image.dtype, image.shape)).encode("utf-8"))
+        hasher.update(image.tobytes() if not image.flags.c_contiguous else image)
+
+    return hasher.hexdigest()
+
+
+def hash_file(hasher, image_file):
+    chunk = image_file.read(HASH_CHUNK_SIZE)
+    while chunk:
+        hasher.update(chunk)
+        chunk = image_file.read(HASH_CHUNK_SIZE)
@@ -0,0 +1,252 @@
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# one row per (box, label) score; typecodes keep each row at 40 bytes
+COLUMNS = (
+    ("time", "d"),
+    ("image", "I"),
+    ("box", "I"),
+    ("label", "I"),
+    ("score", "f"),
+    ("left", "f"),
+    ("top", "f"),
+    ("width", "f"),
+    ("height", "f"),
+)
+BBOX_FIELDS = ("left", "top", "width", "height")
+NAN = float("nan")
+
+
+class Detection(object):
+    """One label score of one box, as yielded by iterating over Detections"""
+
+    __slots__ = tuple(name for (name, _) in COLUMNS) + ("label_name",)
+
+    def __init__(self, *values):
+        for (name, value) in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return "Detection(%s)" % ", ".join(
+            "%s=%r" % (name, getattr(self, name)) for name in self.__slots__
+        )
+
+
+class Detections(object):
+    """
+    Compact, columnar detections: one row per label score of each box, stored in typed arrays
+    instead of nested dicts.
+
+    time: video timestamp or frame of the detection (NaN for images)
+    image: index of the image in a classify_image request (0 for videos and streams)
+    box: index of the box (or of the whole image prediction) the score belongs to
+    label: index into `labels`
+    left, top, width, height: normalized bounding box, NaN when the prediction has none
+    """
+
+    __slots__ = ("labels", "label_ids", "columns")
+
+    def __init__(self, labels=None):
+        self.labels = []
+        self.label_ids = {}
+        self.columns = {name: array.array(code) for (name, code) in COLUMNS}
+        for label in labels or []:
+            self.label_id(label)
+
+    def label_id(self, label):
+        label_id = self.label_ids.get(label)
+        if label_id is None:
+            label_id = self.label_ids[label] = len(self.labels)
+            self.labels.append(label)
+        return label_id
+
+    def add(self, prediction, time=NAN, image=0, box=0, label_names=None):
+        """Adds the label scores of a prediction dict ({"labels": ..., "bbox": ...})"""
+        bbox = prediction.get("bbox") or {}
+        bounds = [float(bbox.get(field, NAN)) for field in BBOX_FIELDS]
+        columns = self.columns
+        for (label, score) in (prediction.get("labels") or {}).items():
+            if label_names:
+                label = label_names.get(label, label)
+            row = (time, image, box, self.label_id(label), score)
+            for ((name, _), value) in zip(COLUMNS, row + tuple(bounds)):
+                columns[name].append(value)
+
+    def rename(self, label_names):
+        """Replaces the labels found in `label_names` (e.g. label ids) with their names"""
+        self.labels = [label_names.get(label, label) for label in self.labels]
+        self.label_ids = {}
+        for (label_id, label) in reversed(list(enumerate(self.labels))):
+            self.label_ids[label] = label_id
+
+    def __len__(self):
+        return len(self.columns["score"])
+
+    def __getitem__(self, index):
+        values = [self.columns[name][index] for (name, _) in COLUMNS]
+        return Detection(*(values + [self.labels[values[3]]]))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def column(self, name):
+        """A column as a NumPy array sharing the memory of the detections if NumPy is installed, else as an array.array"""
+        values = self.columns[name]
+        if numpy is None:
+            return values
+        if not len(values):
+            return numpy.array([], dtype=values.typecode)
+        return numpy.frombuffer(values, dtype=values.typecode)
+
+    def to_numpy(self):
+        """All the columns as a NumPy structured array"""
+        records = numpy.empty(
+            len(self), dtype=[(name, code) for (name, code) in COLUMNS]
+        )
+        for (name, _) in COLUMNS:
+            records[name] = self.column(name)
+        return records
+
+    def filter(self, min_score=None, labels=None):
+        """The detections with at least `min_score`, and of `labels` if given"""
+        label_ids = None
+        if labels is not None:
+            label_ids = {self.label_ids[label] for label in labels if label in self.label_ids}
+
+        filtered = Detections(self.labels)
+        if numpy is None:
+            self.filter_rows(filtered, min_score, label_ids)
+            return filtered
+
+        mask = numpy.ones(len(self), dtype=bool)
+        if min_score is not None:
+            # compared as doubles, like the rows are without NumPy, and keeping NaN scores
+            mask &= ~(self.column("score") < numpy.float64(min_score))
+        if label_ids is not None:
+            mask &= numpy.isin(self.column("label"), list(label_ids))
+        for (name, code) in COLUMNS:
+            filtered.columns[name] = array.array(code, self.column(name)[mask].tobytes())
+        return filtered
+
+    def filter_rows(self, filtered, min_score, label_ids):
+        """Adds the rows that pass the filters to `filtered`, one by one"""
+        scores = self.columns["score"]
+        label_column = self.columns["label"]
+        for index in range(len(self)):
+            if min_score is not None and scores[index] < min_score:
+                continue
+            if label_ids is not None and label_column[index] not in label_ids:
+                continue
+            for (name, _) in COLUMNS:
+                filtered.columns[name].append(self.columns[name][index])
+
+    def nbytes(self):
+        return sum(len(values) * values.itemsize for values in self.columns.values())
+
+
+class DetectionResults(object):
+    """
+    Results of classify_image, get_video_results, get_monitoring_result and
+    watch_monitoring_result with the `typed_results` option: the detections as Detections,
+    plus the rest of the response (status, progress, file information, ...) as `info`.
+    """
+
+    __slots__ = ("info", "detections")
+
+    def __init__(self, info, detections):
+        self.info = info
+        self.detections = detections
+
+    def __getitem__(self, key):
+        return self.info[key]
+
+    def __repr__(self):
+        return "DetectionResults(%d detections, labels=%r)" % (
+            len(self.detections),
+            self.detections.labels,
+        )
+
+
+def classification_results(response):
+    """DetectionResults of a classify_image response"""
+    detections = Detections()
+    files = []
+    for (image, result) in enumerate(response.get("results") or []):
+        files.append(result.get("file"))
+        for (box, prediction) in enumerate(result.get("predictions") or []):
+            detections.add(prediction, image=image, box=box)
+
+    info = {key: value for (key, value) in response.items() if key != "results"}
+    info["files"] = files
+    return DetectionResults(info, detections)
+
+
+def timed_results(response):
+    """
+    DetectionResults of a get_video_results, get_monitoring_result or watch_monitoring_result
+    response, whose detections are either keyed by time or a list of predictions
+    """
+    label_names = response.get("label_dict")
+    detections = Detections()
+    found = response.get("detections") or {}
+
+    if isinstance(found, dict):
+        timed = found.items()
+    else:
+        timed = [(prediction_time(prediction), [prediction]) for prediction in found]
+
+    box = 0
+    for (time, predictions) in timed:
+        time = to_time(time)
+        for prediction in predictions:
+            detections.add(prediction, time=time, box=box, label_names=label_names)
+            box += 1
+
+    info = {key: value for (key, value) in response.items() if key != "detections"}
+    return DetectionResults(info, detections)
+
+
+def prediction_time(prediction):
+    for key in ("time", "timestamp", "frame"):
+        if key in prediction:
+            return prediction[key]
+    return NAN
+
+
+def to_time(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+# API methods whose results are returned as DetectionResults with the `typed_results` option
+TYPED_RESULTS = {
+    "classify_image": classification_results,
+    "get_video_results": timed_results,
+    "get_monitoring_result": timed_results,
+    "watch_monitoring_result": timed_results,
+}
+
+
+def typed_results(self, name, formatted):
+    """Converts the formatted result of API method `name` to DetectionResults if the client asks for it"""
+    from matroid.src.helpers import parse_formatted
+
+    if not self.typed_results or name not in TYPED_RESULTS:
+        return formatted
+
+    try:
+        response = parse_formatted(self, formatted)
+    except ValueError:
+        # e.g. results requested as CSV
+        return formatted
+    if not isinstance(response, dict):
+        return formatted
+
+    return TYPED_RESULTS[name](response)
@@ -0,0 +1,152 @@
+import datetime
+import email.utils
+import random
+import threading
+
+from matroid import error
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class RetryPolicy(object):
+    """
+    Decides whether and when api_call retries a failed request.
+
+    max_retries: retries after the first attempt
+    backoff_factor: the n-th retry waits up to backoff_factor * 2^n seconds
+    max_backoff: upper bound of a single wait
+    jitter: randomize waits between 0 and the backoff ("full jitter") so clients don't retry in lockstep
+    deadline: seconds after the first attempt past which no retry is started (None for no limit)
+    respect_retry_after: wait as long as the Retry-After header of a 429/503 asks
+    idempotent_only: only retry methods that are safe to repeat (GET, HEAD, OPTIONS, PUT, DELETE),
+      and requests the server turned away unprocessed: a 429, or a 503 with Retry-After
+    retry_on: error classes that are retried, plus any error with a status in retry_statuses
+    budget: an optional RetryBudget shared between calls to cap retries under sustained failure
+    """
+
+    def __init__(
+        self,
+        max_retries=3,
+        backoff_factor=0.5,
+        max_backoff=30,
+        jitter=True,
+        deadline=None,
+        respect_retry_after=True,
+        idempotent_only=True,
+        retry_on=(error.RateLimitError, error.ServerError, error.APIConnectionError),
+        retry_statuses=RETRY_STATUSES,
+        budget=None,
+    ):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.deadline = deadline
+        self.respect_retry_after = respect_retry_after
+        self.idempotent_only = idempotent_only
+        self.retry_on = retry_on
+        self.retry_statuses = retry_statuses
+        self.budget = budget
+
+    def is_retryable(self, e, method):
+        if (
+            self.idempotent_only
+            and method not in IDEMPOTENT_METHODS
+            and not was_rejected(e)
+        ):
+            return False
+
+        if isinstance(e, self.retry_on):
+            return True
+
+        return getattr(e, "res_status", None) in self.retry_statuses
+
+    def next_delay(self, e, attempt, method, elapsed):
+        """
+        Seconds to wait before retrying after the attempt-th retry (0 for the first
+        attempt) failed with `e`, or None to give up and raise `e`.
+        """
+        if attempt >= self.max_retries or not self.is_retryable(e, method):
+            return None
+
+        delay = min(self.max_backoff, self.backoff_factor * (2**attempt))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+
+        if self.respect_retry_after:
+            retry_after = get_retry_after(e)
+            if retry_after is not None:
+                delay = retry_after
+
+        if self.deadline is not None and elapsed + delay > self.deadline:
+            return None
+
+        if self.budget and not self.budget.withdraw():
+            return None
+
+        return delay
+
+    def record_request(self):
+        if self.budget:
+            self.budget.deposit()
+
+
+class RetryBudget(object):
+    """
+    Caps retries at a fraction of the requests made, so a struggling API isn't hit with
+    max_retries times its normal load. Share one budget between the policies of a client.
+
+    ratio: retries allowed per request
+    min_retries: retries always available, so low-traffic clients can still retry
+    """
+
+    def __init__(self, ratio=0.2, min_retries=10):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.balance = float(min_retries)
+        self.max_balance = float(min_retries) * 10
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        with self.lock:
+            self.balance = min(self.max_balance, self.balance + self.ratio)
+
+    def withdraw(self):
+        with self.lock:
+            if self.balance < 1:
+                return False
+
+            self.balance -= 1
+            return True
+
+
+def was_rejected(e):
+    """Whether the server turned the request away without processing it, so it can be repeated"""
+    if isinstance(e, error.RateLimitError):
+        return True
+    return getattr(e, "res_status", None) == 503 and get_retry_after(e) is not None
+
+
+def get_retry_after(e):
+    """Seconds the server asked us to wait in the Retry-After header, if any"""
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    now = datetime.datetime.now(retry_at.tzinfo)
+    return max((retry_at - now).total_seconds(), 0)
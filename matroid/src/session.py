@@ -0,0 +1,71 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+# idle keep-alive connections are dropped after this long; the API load balancer
+# closes idle connections on its side after a few minutes anyway
+DEFAULT_POOL_IDLE_TIMEOUT = 60
+
+
+class PooledSession(requests.Session):
+    """
+    A requests Session backed by a bounded, keep-alive connection pool.
+
+    pool_connections: number of per-host connection pools to keep around
+    pool_maxsize: maximum number of connections kept open to a single host
+    pool_block: wait for a free connection instead of opening a throwaway one when a host's pool is exhausted
+    keep_alive: set to False to send `Connection: close` and disable connection reuse
+    idle_timeout: seconds without any traffic after which pooled connections are closed (None to keep them forever)
+    """
+
+    def __init__(
+        self,
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        pool_block=False,
+        keep_alive=True,
+        idle_timeout=DEFAULT_POOL_IDLE_TIMEOUT,
+    ):
+        super(PooledSession, self).__init__()
+
+        self.pool_maxsize = pool_maxsize
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._last_used = time.monotonic()
+
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+        if not keep_alive:
+            self.headers["Connection"] = "close"
+
+    def request(self, method, url, *args, **kwargs):
+        with self._lock:
+            self._reap_idle_connections()
+            self._in_flight += 1
+
+        try:
+            return super(PooledSession, self).request(method, url, *args, **kwargs)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._last_used = time.monotonic()
+
+    def _reap_idle_connections(self):
+        """Drops pooled connections if nothing has used them for idle_timeout seconds"""
+        if self.idle_timeout is None or self._in_flight:
+            return
+
+        if time.monotonic() - self._last_used > self.idle_timeout:
+            for adapter in self.adapters.values():
+                adapter.poolmanager.clear()
@@ -1,40 +1,220 @@
 import json
+import re
+import time
+from collections import namedtuple
+
+# an event ends with a blank line; lines end with \r\n, \n or \r
+EVENT_END = re.compile(rb"(?:\r\n|\r(?!\n)|\n)(?:\r\n|\r(?!\n)|\n)")
+# bytes kept before the end of the buffer when scanning resumes, so an event end split
+# across chunks is still found
+EVENT_END_LENGTH = 4
 
 DATA_FIELD = b"data:"
+DATA_LENGTH = len(DATA_FIELD)
+
+JSON_DECODER = json.JSONDecoder()
+
+
+def decode_json(text):
+    """
+    Decodes the JSON data of an event, like json.loads but quicker on the usual single
+    space after the field name; SSE streams are always UTF-8, so its encoding isn't detected
+    """
+    try:
+        (value, end) = JSON_DECODER.raw_decode(text, 1 if text[:1] == " " else 0)
+        if end == len(text):
+            return value
+    except ValueError:
+        pass
+    # other whitespace, or invalid data to raise about
+    return JSON_DECODER.decode(text)
+
+SSEEvent = namedtuple("SSEEvent", ["event", "data", "id", "retry"])
 
 
 def _parse_sse_event(text):
-    """Parses an SSE event."""
-    if text.startswith(b":"):
-        # SSE comment, discard.
-        return None
+    """Parses an SSE event: its event type, JSON data, id and retry fields.
 
-    if not text.startswith(DATA_FIELD):
-        # We only handle data: elements.
-        return None
+    Returns None for events without any field, such as comments (heartbeats).
+    """
+    if b"\n" not in text and b"\r" not in text:
+        # single line, the common case of data-only events and heartbeats
+        if text.startswith(DATA_FIELD):
+            try:
+                data = decode_json(text[len(DATA_FIELD) :].decode("utf-8"))
+            except Exception as e:
+                return None
+            return SSEEvent(None, data, None, None)
+        if text.startswith(b":"):
+            # SSE comment, discard.
+            return None
 
-    try:
-        return json.loads(text[len(DATA_FIELD) :])
-    except Exception as e:
+    event = None
+    data = []
+    event_id = None
+    retry = None
+    for line in text.splitlines():
+        if not line or line.startswith(b":"):
+            # SSE comment, discard.
+            continue
+
+        (field, _, value) = line.partition(b":")
+        if value.startswith(b" "):
+            value = value[1:]
+
+        if field == b"data":
+            data.append(value)
+        elif field == b"id":
+            if b"\0" not in value:
+                event_id = value.decode("utf-8", "replace")
+        elif field == b"retry":
+            if value.isdigit():
+                retry = int(value)
+        elif field == b"event":
+            event = value.decode("utf-8", "replace")
+
+    if not data and event_id is None and retry is None:
         return None
 
+    decoded = None
+    if data:
+        try:
+            decoded = decode_json(b"\n".join(data).decode("utf-8"))
+        except Exception as e:
+            pass
 
-def stream_sse_events(source):
-    """Parses SSE events out of `source`.
+    return SSEEvent(event, decoded, event_id, retry)
 
-    `source` should be an incoming stream of byte chunks.
 
-    NOTE: This only handles the subset of SSE used by the matroid API, it is not
-    a general purpose parser.
+class SSEParser(object):
+    """Incremental SSE parser.
+
+    feed() takes the stream chunk by chunk and returns the events it completed. Only the
+    bytes received since the last call are scanned for the end of an event, and each event
+    is parsed once, however many chunks it arrives in. Events of a single data line, the
+    bulk of a busy stream, are decoded straight out of the buffer.
+
+    last_event_id and retry keep the last id and retry fields seen, to resume the stream
+    after a reconnection. last_byte_at (time.monotonic) and heartbeats, the number of
+    comments received, tell whether the stream is alive on a quiet feed.
     """
-    buffer = b""
-    for chunk in source:
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.scan_pos = 0
+        # whether the stream uses carriage returns, see feed_line_breaks
+        self.carriage_returns = False
+        self.last_event_id = None
+        self.retry = None
+        self.last_byte_at = None
+        self.heartbeats = 0
+
+    def idle_seconds(self):
+        """Seconds since the last byte received, or None before the first one"""
+        if self.last_byte_at is None:
+            return None
+        return time.monotonic() - self.last_byte_at
+
+    def reset(self):
+        """Drops the partial event of a closed connection, keeping last_event_id and retry"""
+        self.buffer = bytearray()
+        self.scan_pos = 0
+        self.carriage_returns = False
+
+    def feed(self, chunk):
+        if chunk:
+            self.last_byte_at = time.monotonic()
+            if b"\r" in chunk:
+                self.carriage_returns = True
+        buffer = self.buffer
         buffer += chunk
-        parts = buffer.split(b"\n\n")
-        for part in parts[:-1]:
-            event = _parse_sse_event(part)
-            if event is None:
-                continue
-            yield event
-
-        buffer = parts[-1]
+        if self.carriage_returns:
+            return self.feed_line_breaks()
+
+        events = []
+        (find, startswith) = (buffer.find, buffer.startswith)
+        start = 0
+        end = find(b"\n\n", self.scan_pos)
+        while end != -1:
+            if startswith(DATA_FIELD, start) and find(b"\n", start, end) == -1:
+                # a single data line, decoded without splitting the event into fields
+                try:
+                    data = decode_json(buffer[start + DATA_LENGTH : end].decode("utf-8"))
+                    events.append(SSEEvent(None, data, None, None))
+                except ValueError:
+                    pass
+            else:
+                self.add_event(events, bytes(buffer[start:end]))
+            start = end + 2
+            end = find(b"\n\n", start)
+
+        if start:
+            del buffer[:start]
+        # an event end split across chunks starts with the last byte
+        self.scan_pos = max(len(buffer) - 1, 0)
+        return events
+
+    def feed_line_breaks(self):
+        """feed() for streams using carriage returns, which need the slower, general scan"""
+        buffer = self.buffer
+        end = self.events_end()
+        self.scan_pos = max(end, len(buffer) - EVENT_END_LENGTH)
+        if not end:
+            return []
+
+        complete = bytes(buffer[:end])
+        del buffer[:end]
+        self.scan_pos -= end
+
+        events = []
+        # the last block is the empty remainder after the last event
+        for block in EVENT_END.split(complete)[:-1]:
+            self.add_event(events, block)
+        return events
+
+    def add_event(self, events, block):
+        event = _parse_sse_event(block)
+        if event is None:
+            if block.startswith(b":"):
+                self.heartbeats += 1
+            return
+        if event.id is not None:
+            self.last_event_id = event.id
+        if event.retry is not None:
+            self.retry = event.retry
+        if event.data is not None:
+            events.append(event)
+
+    def events_end(self):
+        """Position after the last complete event in the buffer, scanning only new bytes"""
+        buffer = self.buffer
+        end = 0
+        for match in EVENT_END.finditer(buffer, self.scan_pos):
+            if match.end() == len(buffer) and buffer.endswith(b"\r"):
+                # a trailing \r may be the start of a \r\n
+                break
+            end = match.end()
+        return end
+
+
+def stream_sse_events(source, parser=None):
+    """Parses SSE events out of `source`, yielding the JSON data of each.
+
+    `source` should be an incoming stream of byte chunks. Pass a `parser` to read the last
+    event id and retry fields as the events are consumed.
+
+    NOTE: This only handles the subset of SSE used by the matroid API (JSON data), it is
+    not a general purpose parser.
+    """
+    parser = parser or SSEParser()
+    for chunk in source:
+        for event in parser.feed(chunk):
+            yield event.data
+
+
+async def astream_sse_events(source, parser=None):
+    """Async counterpart of `stream_sse_events` for an async iterator of byte chunks."""
+    parser = parser or SSEParser()
+    async for chunk in source:
+        for event in parser.feed(chunk):
+            yield event.data
@@ -2,18 +2,33 @@ import requests
 import json
 
 from matroid import error
-from matroid.src.helpers import api_call
-from matroid.src.sse import stream_sse_events
-from threading import Lock
+from matroid.src.csv_stream import DEFAULT_CHUNK_ROWS, CSVParser, CSVStream
+from matroid.src.event_buffer import EventBuffer
+from matroid.src.helpers import STREAM_CHUNK_SIZE, api_call, open_streamed_response
+from matroid.src.results import timed_results
+from matroid.src.sse import SSEParser
+from threading import Lock, Thread
+import collections
+import datetime
 import time
 import socket
-from urllib3.exceptions import ProtocolError
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
 
 INITIAL_BACKOFF_SECS = 1
 MAX_BACKOFF_SECS = 60
 CONNECT_TIMEOUT = 60
-# Heartbeats are sent every minute, if we don't see anything for 5 then something is wrong.
-READ_TIMEOUT = 5 * 60
+# The server sends a heartbeat every minute, so a connection that hasn't received a byte for
+# a few of them is dead
+HEARTBEAT_INTERVAL_SECS = 60
+MISSED_HEARTBEATS = 2
+# a heartbeat is only missed half an interval after it was due, so late ones don't count
+HEARTBEAT_TOLERANCE = 0.5
+# backfills start this long before the last delivered event, duplicates are filtered out
+BACKFILL_OVERLAP_SECS = 30
+# fields of an event or a detection holding its server timestamp
+TIMESTAMP_FIELDS = ("timestamp", "time")
+# detections remembered to filter out the ones delivered twice around a reconnection
+RESUME_REMEMBERED = 10000
 
 
 # https://staging.app.matroid.com/docs/api/documentation#api-Streams-PostStreams
@@ -26,7 +41,9 @@ def create_stream(self, url, name, **options):
         data = {"name": name, "url": url}
         data.update(options)
 
-        return requests.request(method, endpoint, **{"headers": headers, "json": data})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "json": data}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -45,7 +62,9 @@ def update_stream(self, streamId, **options):
         data = {}
         data.update(options)
 
-        return requests.request(method, endpoint, **{"headers": headers, "json": data})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "json": data}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -58,7 +77,7 @@ def delete_monitoring(self, monitoringId):
 
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -71,37 +90,243 @@ def delete_stream(self, streamId):
 
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
 
-def watch_monitoring_result(self, monitoringId, **options):
+class MonitoringResume(object):
+    """
+    Tracks what a watch of a monitoring delivered, so a reconnection neither loses nor
+    repeats detections.
+
+    The server is asked to resume after the last event id it sent, if it sent any. Otherwise,
+    with `backfill`, the detections since the server timestamp of the last delivered event,
+    or since the watch started if none had one (minus an overlap), are fetched from
+    get_monitoring_result. Detections already delivered are filtered out of both the
+    backfill and the resumed stream; they are told apart by their timestamp, or the id of
+    their event, so identical detections of different events are all delivered, and so are
+    detections with neither. Events without a list of detections, e.g. status events, are
+    always delivered.
+
+    It also keeps the state of the connection: whether it is `connected`, how many times it
+    was interrupted (`reconnections`) and the `last_error` that interrupted it. With
+    `verbose`, interruptions are printed.
+    """
+
+    def __init__(
+        self, monitoringId, backfill=True, remembered=RESUME_REMEMBERED, verbose=True
+    ):
+        self.monitoringId = monitoringId
+        self.backfill = backfill
+        self.verbose = verbose
+        # one parser for all the connections keeps the last event id and retry fields
+        self.parser = SSEParser()
+        self.connected = False
+        self.reconnections = 0
+        self.last_error = None
+        self.last_event_id = None
+        self.started_at = time.time()
+        # server timestamp of the last delivered event
+        self.last_event_at = None
+        self.reconnecting = False
+        self.seen = collections.OrderedDict()
+        self.remembered = remembered
+
+    def headers(self):
+        if self.reconnecting and self.last_event_id is not None:
+            return {"Last-Event-ID": self.last_event_id}
+        return {}
+
+    def backfill_params(self):
+        """get_monitoring_result options covering the gap of a reconnection, or None"""
+        if not self.backfill or not self.reconnecting or self.last_event_id is not None:
+            return None
+
+        if self.last_event_at is not None:
+            since = self.last_event_at - BACKFILL_OVERLAP_SECS
+        else:
+            since = self.started_at - BACKFILL_OVERLAP_SECS
+        return {
+            "format": "json",
+            "startTime": datetime.datetime.fromtimestamp(
+                since, datetime.timezone.utc
+            ).isoformat(),
+        }
+
+    def backfilled(self, result):
+        """The events to deliver out of a get_monitoring_result backfill"""
+        self.reconnecting = False
+        if not isinstance(result, dict) or not isinstance(result.get("detections"), list):
+            return []
+        event = dict(result, monitoringId=self.monitoringId)
+        event = self.deliver(event)
+        return [event] if event is not None else []
+
+    def deliver(self, event, event_id=None):
+        """Returns the event without its already delivered detections, or None if none are left"""
+        self.reconnecting = False
+        if event_id is not None:
+            self.last_event_id = event_id
+
+        detections = event.get("detections") if isinstance(event, dict) else None
+        if not isinstance(detections, list):
+            return event
+
+        event_time = server_time(event)
+        unseen = [
+            detection
+            for detection in detections
+            if self.first_time(detection, event_id if event_time is None else event_time)
+        ]
+        if not unseen and detections:
+            return None
+        if len(unseen) != len(detections):
+            event = dict(event, detections=unseen)
+
+        times = [event_time] + [server_time(detection) for detection in unseen]
+        times = [timestamp for timestamp in times if timestamp is not None]
+        if times:
+            self.last_event_at = max(times)
+        return event
+
+    def first_time(self, detection, event_key):
+        """
+        Whether a detection wasn't delivered yet; `event_key` tells its event apart. Without
+        a timestamp or an event id, repeated detections can't be told from new ones, so they
+        are all delivered.
+        """
+        detection_time = server_time(detection)
+        if detection_time is not None:
+            event_key = detection_time
+        if event_key is None:
+            return True
+        key = json.dumps([event_key, detection], sort_keys=True, default=str)
+        if key in self.seen:
+            return False
+        self.seen[key] = None
+        if len(self.seen) > self.remembered:
+            self.seen.popitem(last=False)
+        return True
+
+    def opened(self):
+        self.connected = True
+
+    def idle_seconds(self):
+        """Seconds since the stream last received a byte, heartbeats included"""
+        return self.parser.idle_seconds()
+
+    def disconnected(self, e=None):
+        if e is not None:
+            self.last_error = e
+            if self.verbose:
+                print("Detections connection interrupted, will retry", e)
+        self.connected = False
+        self.reconnecting = True
+        self.reconnections += 1
+
+
+def server_time(value):
+    """
+    Epoch seconds of the server timestamp of an event or detection (a number or an ISO 8601
+    string), or None if it has none
+    """
+    if not isinstance(value, dict):
+        return None
+    timestamp = next((value[field] for field in TIMESTAMP_FIELDS if field in value), None)
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        return float(timestamp)
+    if not isinstance(timestamp, str):
+        return None
+    try:
+        return float(timestamp)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def read_timeout(self):
+    """Seconds without receiving a byte, not even a heartbeat, after which a watch reconnects"""
+    return self.heartbeat_interval * (self.missed_heartbeats + HEARTBEAT_TOLERANCE)
+
+
+def raw_chunks(response, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    The decoded body of a streamed response chunk by chunk, each as soon as it is received
+    rather than once chunk_size bytes are, so heartbeats and events aren't held back
+    """
+    raw = response.raw
+    try:
+        chunk = raw.read1(chunk_size, decode_content=True)
+    except (AttributeError, TypeError):
+        # urllib3 < 2 has no read1, or without decode_content; its chunks come as received
+        yield from response.iter_content(chunk_size=None)
+        return
+    while chunk:
+        yield chunk
+        chunk = raw.read1(chunk_size, decode_content=True)
+
+
+def reconnect_delay(parser):
+    """Initial reconnection delay, which the server can set with the retry field"""
+    if parser.retry is not None:
+        return parser.retry / 1000
+    return INITIAL_BACKOFF_SECS
+
+
+def watch_monitoring_result(
+    self, monitoringId, backfill=True, buffer_size=None, overflow="block", **options
+):
+    """
+    Watch the detections of a monitoring as they happen; returns an iterator of detection
+    events, which reconnects when the connection drops. Close it to stop watching.
+
+    backfill: after a reconnection, fetch the detections of the gap from get_monitoring_result
+      when the server can't resume the stream itself; detections are delivered once either way
+    buffer_size: read the stream from a background thread into an EventBuffer of this many
+      events, so a slow consumer doesn't stall it; the iterator's `buffer` counts the events
+      dropped
+    overflow: what to do when the buffer is full, see EventBuffer
+    """
     self.retrieve_token()
     (endpoint, method) = self.endpoints["watch_monitoring_result"]
     endpoint = endpoint.replace(":key", monitoringId)
 
     try:
-        headers = {"Authorization": self.token.authorization_header()}
         params = {}
+        resume = MonitoringResume(monitoringId, backfill)
 
         current_req = None
         stop = False
         lock = Lock()
+        buffer = None
+        if buffer_size is not None:
+            buffer = EventBuffer(buffer_size, overflow)
 
         def generate_results():
             nonlocal current_req
             nonlocal stop
             backoff = INITIAL_BACKOFF_SECS
+            parser = resume.parser
             while not stop:
+                parser.reset()
                 try:
-                    with requests.request(
+                    token = self.token
+                    headers = {"Authorization": token.authorization_header()}
+                    headers.update(resume.headers())
+                    with self.session.request(
                         method,
                         endpoint,
                         headers=headers,
                         params=params,
                         stream=True,
-                        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                        timeout=(CONNECT_TIMEOUT, read_timeout(self)),
                     ) as req:
                         with lock:
                             if stop:
@@ -109,13 +334,45 @@ def watch_monitoring_result(self, monitoringId, **options):
                             current_req = req
                         if req.status_code >= 400 and req.status_code < 500:
                             self.check_errors(req, error.InvalidQueryError)
-                        backoff = INITIAL_BACKOFF_SECS
-                        yield from stream_sse_events(req.raw)
+                        # server errors are retried like dropped connections
+                        req.raise_for_status()
+                        resume.opened()
+                        backoff = reconnect_delay(parser)
+
+                        backfill_params = resume.backfill_params()
+                        if backfill_params is not None:
+                            backfill_response = request_monitoring_result(
+                                self, monitoringId, backfill_params
+                            )
+                            self.check_errors(backfill_response, error.InvalidQueryError)
+                            for event in resume.backfilled(
+                                self.json_decoder(backfill_response.content)
+                            ):
+                                yield timed_results(event) if self.typed_results else event
+
+                        for chunk in raw_chunks(req):
+                            # each event is delivered with its own id, if it has one
+                            for message in parser.feed(chunk):
+                                event = resume.deliver(message.data, message.id)
+                                if event is not None:
+                                    yield (
+                                        timed_results(event)
+                                        if self.typed_results
+                                        else event
+                                    )
+                        resume.disconnected()
                 except error.TokenExpirationError:
-                    self.retrieve_token(options={"request_from_server": True})
-                except (requests.RequestException, ProtocolError) as e:
+                    self.retrieve_token(
+                        options={"request_from_server": True, "stale_token": token}
+                    )
+                except (
+                    requests.RequestException,
+                    ProtocolError,
+                    ReadTimeoutError,
+                    error.APIConnectionError,
+                ) as e:
                     if not stop:
-                        print("Detections connection interrupted, will retry", e)
+                        resume.disconnected(e)
                         time.sleep(backoff)
                     backoff = min(MAX_BACKOFF_SECS, backoff * 2)
                 except Exception:
@@ -125,13 +382,37 @@ def watch_monitoring_result(self, monitoringId, **options):
                     else:
                         raise
 
+        def read_into_buffer():
+            try:
+                for event in generate_results():
+                    buffer.put(event)
+                    if buffer.closed:
+                        return
+            except BaseException as e:
+                buffer.close(e)
+            else:
+                buffer.close()
+
         class ResultsIterator:
+            def __init__(self):
+                self.buffer = buffer
+                self.reader = None
+
             def __iter__(self):
-                yield from generate_results()
+                if buffer is None:
+                    yield from generate_results()
+                    return
+
+                if self.reader is None:
+                    self.reader = Thread(target=read_into_buffer, daemon=True)
+                    self.reader.start()
+                yield from buffer
 
             def close(self):
                 nonlocal stop
                 nonlocal current_req
+                if buffer is not None:
+                    buffer.close()
                 with lock:
                     stop = True
                     if current_req:
@@ -156,16 +437,49 @@ def watch_monitoring_result(self, monitoringId, **options):
 # https://staging.app.matroid.com/docs/api/documentation#api-Streams-GetMonitoringsMonitoring_idQuery
 @api_call(error.InvalidQueryError)
 def get_monitoring_result(self, monitoringId, **options):
-    (endpoint, method) = self.endpoints["get_monitoring_result"]
-    endpoint = endpoint.replace(":key", monitoringId)
-
-    if options.get("format") == "csv" and self.json_format:
+    if options.get("format") == "csv" and self.json_format is True:
         print(
             "cannot return csv format when json_format True is specified upon API object initialization"
         )
         print("requesting JSON format...")
         options["format"] = "json"
 
+    return request_monitoring_result(self, monitoringId, options)
+
+
+def stream_monitoring_result(
+    self,
+    monitoringId,
+    columnar=None,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+    chunk_size=STREAM_CHUNK_SIZE,
+    **options
+):
+    """
+    Get the detections of a monitoring as CSV, parsed as the response downloads so large
+    histories use bounded memory, whatever json_format is
+
+    startTime, endTime: optional range of the detections
+    columnar: None to yield typed rows (namedtuples named after the CSV header), "numpy" to
+      yield chunks of `chunk_rows` rows as dicts of NumPy arrays, or "arrow" for pyarrow
+      RecordBatches
+    chunk_size: bytes read from the connection at a time
+    """
+    parser = CSVParser(columnar, chunk_rows)
+    options["format"] = "csv"
+    response = open_streamed_response(
+        self,
+        "get_monitoring_result",
+        error.InvalidQueryError,
+        lambda: request_monitoring_result(self, monitoringId, options, stream=True),
+    )
+    return CSVStream(response, parser, chunk_size)
+
+
+def request_monitoring_result(self, monitoringId, options, stream=False):
+    (endpoint, method) = self.endpoints["get_monitoring_result"]
+    endpoint = endpoint.replace(":key", monitoringId)
+
     try:
         headers = {"Authorization": self.token.authorization_header()}
         params = {
@@ -175,8 +489,10 @@ def get_monitoring_result(self, monitoringId, **options):
             "endTime": options.get("endTime"),
         }
 
-        return requests.request(
-            method, endpoint, **{"headers": headers, "params": params}
+        return self.session.request(
+            method,
+            endpoint,
+            **{"headers": headers, "params": params, "stream": stream}
         )
     except Exception as e:
         raise error.APIConnectionError(message=e)
@@ -190,7 +506,7 @@ def kill_monitoring(self, monitoringId):
 
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -220,7 +536,9 @@ def monitor_stream(self, streamId, detectorId, thresholds, **options):
 
         data.update(options)
 
-        return requests.request(method, endpoint, **{"headers": headers, "data": data})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "data": data}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -244,7 +562,9 @@ def update_monitoring(self, monitoringId, **options):
         }
 
         data.update(options)
-        return requests.request(method, endpoint, **{"headers": headers, "json": data})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "json": data}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -259,7 +579,9 @@ def bulk_update_monitorings(self, monitoring_ids, task_update):
             "monitoringIds": monitoring_ids,
             "taskUpdate": task_update,
         }
-        return requests.request(method, endpoint, **{"headers": headers, "json": data})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "json": data}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -274,7 +596,7 @@ def search_monitorings(self, **options):
         params = {}
         params.update(options)
 
-        return requests.request(
+        return self.session.request(
             method, endpoint, **{"headers": headers, "params": params}
         )
     except Exception as e:
@@ -293,7 +615,7 @@ def search_streams(self, **options):
             "name": options.get("name"),
             "permission": options.get("permission"),
         }
-        return requests.request(
+        return self.session.request(
             method, endpoint, **{"headers": headers, "params": params}
         )
     except Exception as e:
@@ -310,7 +632,7 @@ def push_image(self, streamId, **options):
         image_file = None
         files = None
         file = options.get("file")
-        if file:
+        if file is not None:
             image_file = self.filereader.get_file(file)
             files = {"file": image_file}
 
@@ -321,7 +643,7 @@ def push_image(self, streamId, **options):
             "metadata": options.get("metadata"),
         }
 
-        return requests.request(
+        return self.session.request(
             method, endpoint, **{"headers": headers, "data": data, "files": files}
         )
     except Exception as e:
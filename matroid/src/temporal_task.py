@@ -1,4 +1,3 @@
-import requests
 
 from matroid import error
 from matroid.src.helpers import api_call
@@ -40,7 +39,7 @@ def localize_video_actions(
             file_to_upload = self.filereader.get_file(file)
             files = {"file": file_to_upload}
 
-            return requests.request(
+            return self.session.request(
                 method, endpoint, **{"headers": headers, "files": files, "data": data}
             )
         else:
@@ -48,7 +47,7 @@ def localize_video_actions(
             if videoId:
                 data["videoId"] = videoId
 
-            return requests.request(
+            return self.session.request(
                 method, endpoint, **{"headers": headers, "data": data}
             )
     except IOError as e:
@@ -89,7 +88,9 @@ def localize_stream_actions(
             "detectionThresholds": thresholds,
         }
 
-        return requests.request(method, endpoint, **{"headers": headers, "data": data})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "data": data}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -104,7 +105,7 @@ def delete_temporal_task(self, taskId):
     try:
         headers = {"Authorization": self.token.authorization_header()}
 
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -116,7 +117,7 @@ def get_existing_temporal_tasks(self):
     (endpoint, method) = self.endpoints["get_existing_temporal_tasks"]
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -131,7 +132,7 @@ def get_temporal_task(self, taskId):
     try:
         headers = {"Authorization": self.token.authorization_header()}
 
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -146,7 +147,7 @@ def get_stream_temporal_tasks(self, streamId):
     try:
         headers = {"Authorization": self.token.authorization_header()}
 
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -161,7 +162,7 @@ def get_temporal_task_preds(self, taskId):
     try:
         headers = {"Authorization": self.token.authorization_header()}
 
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -191,6 +192,8 @@ def sample_stream(
             "fps": fps,
         }
 
-        return requests.request(method, endpoint, **{"headers": headers, "data": data})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "data": data}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
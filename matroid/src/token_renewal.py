@@ -0,0 +1,72 @@
+import asyncio
+import datetime
+import threading
+import weakref
+
+# wait this long before trying again when a renewal fails (capped by the token's remaining lifetime)
+RENEWAL_RETRY_SECS = 30
+
+
+def seconds_until_renewal(api):
+    """Seconds until the client's token should be renewed, 0 if it already should"""
+    if not api.token:
+        return 0
+
+    renew_at = api.token.expires_at(api.token_renewal)
+    return max((renew_at - datetime.datetime.now()).total_seconds(), 0)
+
+
+def seconds_until_retry(api):
+    if not api.token:
+        return RENEWAL_RETRY_SECS
+
+    expires_at = api.token.expires_at()
+    remaining = (expires_at - datetime.datetime.now()).total_seconds()
+    return min(RENEWAL_RETRY_SECS, max(remaining / 2, 1))
+
+
+class TokenRenewer(threading.Thread):
+    """
+    Renews a MatroidAPI token in the background once `token_renewal` of its lifetime has
+    passed, so API calls never wait for /oauth/token. Stops when the client is closed or
+    garbage collected.
+    """
+
+    def __init__(self, api):
+        super(TokenRenewer, self).__init__(name="matroid-token-renewer", daemon=True)
+        self.api_ref = weakref.ref(api)
+        self.stopped = threading.Event()
+
+    def run(self):
+        delay = 0
+        while not self.stopped.wait(delay):
+            api = self.api_ref()
+            if api is None:
+                return
+
+            try:
+                api.retrieve_token(options={"renew": True})
+                delay = seconds_until_renewal(api)
+            except Exception as e:
+                # the token is still valid for a while, API calls fall back to refreshing it themselves
+                print("Warning: background token renewal failed, will retry", e)
+                delay = seconds_until_retry(api)
+            del api
+
+    def stop(self):
+        self.stopped.set()
+
+
+async def renew_token_forever(api):
+    """asyncio counterpart of TokenRenewer for AsyncMatroid; cancel the task to stop it"""
+    delay = 0
+    while True:
+        await asyncio.sleep(delay)
+        try:
+            await api.retrieve_token(options={"renew": True})
+            delay = seconds_until_renewal(api)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print("Warning: background token renewal failed, will retry", e)
+            delay = seconds_until_retry(api)
@@ -0,0 +1,81 @@
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, the file store then works without locking
+    fcntl = None
+
+DEFAULT_TOKEN_STORE_DIR = os.path.join(os.path.expanduser("~"), ".matroid", "tokens")
+
+
+def token_store_key(client_id, base_url):
+    """Tokens are only valid for one client on one deployment, the key covers both"""
+    return hashlib.sha256((base_url + "\n" + client_id).encode("utf-8")).hexdigest()
+
+
+class TokenStore(object):
+    """
+    Shares access tokens between clients, e.g. across the processes of a worker fleet.
+
+    Tokens are stored as dicts (see Token.to_dict). Subclass this to keep them in another
+    backend (redis, memcached, ...). The default lock is a no-op; override it so that only
+    one process refreshes an expired token.
+    """
+
+    def load(self, key):
+        """Returns the stored token dict for key, or None"""
+        raise NotImplementedError
+
+    def save(self, key, token_dict):
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        """Held while a client checks the store and, if needed, requests a new token"""
+        yield
+
+
+class FileTokenStore(TokenStore):
+    """Keeps one JSON file per key in `directory`, with advisory locks so one process refreshes at a time"""
+
+    def __init__(self, directory=DEFAULT_TOKEN_STORE_DIR):
+        self.directory = directory
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def load(self, key):
+        try:
+            with open(self.path(key), "r") as token_file:
+                return json.load(token_file)
+        except (IOError, ValueError):
+            return None
+
+    def save(self, key, token_dict):
+        # write then rename so readers never see a partially written file
+        (fd, tmp_path) = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(token_dict, tmp_file)
+            os.replace(tmp_path, self.path(key))
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        if fcntl is None:
+            yield
+            return
+
+        with open(self.path(key) + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
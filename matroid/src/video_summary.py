@@ -1,7 +1,12 @@
-import requests
 
 from matroid import error
-from matroid.src.helpers import api_call
+from matroid.src.csv_stream import DEFAULT_CHUNK_ROWS, CSVParser, CSVStream
+from matroid.src.helpers import (
+    STREAM_CHUNK_SIZE,
+    api_call,
+    open_streamed_response,
+    upload_request,
+)
 
 # https://staging.app.matroid.com/docs/api/documentation#api-Video_Summary-PostSummarize
 @api_call(error.InvalidQueryError)
@@ -21,8 +26,13 @@ def create_video_summary(
     max_iou_dist=None,
     max_age=None,
     detection_threshold=None,
+    progress=None,
 ):
-    """Create a video summary with provided url or file"""
+    """
+    Create a video summary with provided url or file
+
+    progress: optional callback, called with (bytes sent, total bytes) while the file uploads
+    """
     (endpoint, method) = self.endpoints["create_video_summary"]
 
     if not detectorId:
@@ -36,7 +46,6 @@ def create_video_summary(
             message="You may only specify a file or a URL, not both"
         )
     try:
-        file_to_upload = None
         headers = {"Authorization": self.token.authorization_header()}
         data = {
             "name": name,
@@ -52,18 +61,22 @@ def create_video_summary(
             "detectionThreshold": detection_threshold,
         }
         if file:
-            file_to_upload = self.filereader.get_file(file)
-            files = {"file": file_to_upload}
-
-            return requests.request(
-                method, endpoint, **{"headers": headers, "files": files, "data": data}
+            return upload_request(
+                method,
+                endpoint,
+                headers,
+                data,
+                [("file", self.filereader.get_file(file))],
+                session=self.session,
+                progress=progress,
+                retries=self.upload_retries,
             )
         else:
             data["url"] = url
             if videoId:
                 data["videoId"] = videoId
 
-            return requests.request(
+            return self.session.request(
                 method, endpoint, **{"headers": headers, "data": data}
             )
     except IOError as e:
@@ -72,9 +85,6 @@ def create_video_summary(
         raise e
     except Exception as e:
         raise error.APIConnectionError(message=e)
-    finally:
-        if file_to_upload:
-            file_to_upload.close()
 
 
 # https://staging.app.matroid.com/docs/api/documentation#api-Video_Summary-GetSummariesSummaryid
@@ -87,7 +97,7 @@ def get_video_summary(self, summaryId):
     try:
         headers = {"Authorization": self.token.authorization_header()}
 
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -96,13 +106,44 @@ def get_video_summary(self, summaryId):
 @api_call(error.InvalidQueryError)
 def get_video_summary_tracks(self, summaryId):
     """Fetch a video summary track CSV"""
+    return request_video_summary_tracks(self, summaryId)
+
+
+def stream_video_summary_tracks(
+    self,
+    summaryId,
+    columnar=None,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+    chunk_size=STREAM_CHUNK_SIZE,
+):
+    """
+    Fetch a video summary track CSV, parsed as the response downloads
+
+    columnar: None to yield typed rows (namedtuples named after the CSV header), "numpy" to
+      yield chunks of `chunk_rows` rows as dicts of NumPy arrays, or "arrow" for pyarrow
+      RecordBatches
+    chunk_size: bytes read from the connection at a time
+    """
+    parser = CSVParser(columnar, chunk_rows)
+    response = open_streamed_response(
+        self,
+        "get_video_summary_tracks",
+        error.InvalidQueryError,
+        lambda: request_video_summary_tracks(self, summaryId, stream=True),
+    )
+    return CSVStream(response, parser, chunk_size)
+
+
+def request_video_summary_tracks(self, summaryId, stream=False):
     (endpoint, method) = self.endpoints["get_video_summary_tracks"]
     endpoint = endpoint.replace(":summaryId", summaryId)
 
     try:
         headers = {"Authorization": self.token.authorization_header()}
 
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "stream": stream}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -117,7 +158,7 @@ def get_video_summary_file(self, summaryId):
     try:
         headers = {"Authorization": self.token.authorization_header()}
 
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -132,7 +173,7 @@ def delete_video_summary(self, summaryId):
     try:
         headers = {"Authorization": self.token.authorization_header()}
 
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -147,7 +188,7 @@ def get_stream_summaries(self, streamId):
     try:
         headers = {"Authorization": self.token.authorization_header()}
 
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -193,7 +234,9 @@ def create_stream_summary(
             "detectionThreshold": detection_threshold,
         }
 
-        return requests.request(method, endpoint, **{"headers": headers, "data": data})
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "data": data}
+        )
     except Exception as e:
         raise error.APIConnectionError(message=e)
 
@@ -204,6 +247,6 @@ def get_existing_summaries(self):
     (endpoint, method) = self.endpoints["get_existing_summaries"]
     try:
         headers = {"Authorization": self.token.authorization_header()}
-        return requests.request(method, endpoint, **{"headers": headers})
+        return self.session.request(method, endpoint, **{"headers": headers})
     except Exception as e:
         raise error.APIConnectionError(message=e)
@@ -1,8 +1,18 @@
-import os
-import requests
+from collections import namedtuple
 
 from matroid import error
-from matroid.src.helpers import api_call
+from matroid.src.helpers import (
+    STREAM_CHUNK_SIZE,
+    ParsedStream,
+    api_call,
+    open_streamed_response,
+    upload_request,
+)
+from matroid.src.json_stream import StreamedObjectParser
+from matroid.src.multipart import file_length, file_name
+from matroid.src.results import Detections, prediction_time, to_time
+
+VideoFrame = namedtuple("VideoFrame", ["time", "detections"])
 
 # https://staging.app.matroid.com/docs/api/documentation#api-Videos-PostDetectorsDetector_idClassify_video
 @api_call(error.InvalidQueryError)
@@ -12,6 +22,8 @@ def classify_video(self, detectorId, url=None, file=None, **options):
 
     detectorId: a unique id for the detector
     url: internet URL for the video to classify
+    file: path to a local video file to upload instead
+    progress: optional callback, called with (bytes sent, total bytes) while the file uploads
     """
 
     MAX_LOCAL_VIDEO_SIZE = 300 * 1024 * 1024
@@ -33,6 +45,8 @@ def classify_video(self, detectorId, url=None, file=None, **options):
 
     endpoint = endpoint.replace(":key", detectorId)
 
+    progress = options.pop("progress", None)
+
     try:
         headers = {"Authorization": self.token.authorization_header()}
         data = {"detectorId": detectorId}
@@ -40,25 +54,33 @@ def classify_video(self, detectorId, url=None, file=None, **options):
 
         if url:
             data["url"] = url
-            return requests.request(
+            return self.session.request(
                 method, endpoint, **{"headers": headers, "data": data}
             )
         elif file:
-            with self.filereader.get_file(file) as file_to_upload:
-                files = {"file": file_to_upload}
-                file_size = os.fstat(file_to_upload.fileno()).st_size
-
-                if file_size > MAX_LOCAL_VIDEO_SIZE:
-                    raise error.InvalidQueryError(
-                        message="File %s is larger than the limit of %d megabytes"
-                        % (file_to_upload.name, self.bytes_to_mb(MAX_LOCAL_VIDEO_SIZE))
+            file_to_upload = self.filereader.get_file(file)
+            file_size = file_length(file_to_upload)
+
+            if file_size > MAX_LOCAL_VIDEO_SIZE:
+                file_to_upload.close()
+                raise error.InvalidQueryError(
+                    message="File %s is larger than the limit of %d megabytes"
+                    % (
+                        file_name(file_to_upload, "in memory"),
+                        self.bytes_to_mb(MAX_LOCAL_VIDEO_SIZE),
                     )
-
-                return requests.request(
-                    method,
-                    endpoint,
-                    **{"headers": headers, "files": files, "data": data},
                 )
+
+            return upload_request(
+                method,
+                endpoint,
+                headers,
+                data,
+                [("file", file_to_upload)],
+                session=self.session,
+                progress=progress,
+                retries=self.upload_retries,
+            )
     except error.InvalidQueryError as e:
         raise e
     except Exception as e:
@@ -75,15 +97,43 @@ def get_video_results(self, videoId, **options):
     threshold: the cutoff for confidence level in the detection at each timestamp
     format: 'csv' or 'json' for the response format
     """
-    (endpoint, method) = self.endpoints["get_video_results"]
-
-    if options.get("format") == "csv" and self.json_format:
+    if options.get("format") == "csv" and self.json_format is True:
         print(
             "cannot return csv format when json_format True is specified upon API object initialization"
         )
         print("requesting JSON format...")
-        format = "json"
+        options["format"] = "json"
 
+    return request_video_results(self, videoId, options)
+
+
+def stream_video_results(self, videoId, chunk_size=STREAM_CHUNK_SIZE, **options):
+    """
+    Get the classifications of a video frame by frame as the response downloads, instead of
+    decoding it whole like get_video_results: memory stays flat on long videos and the first
+    frames are available right away
+
+    videoId: a unique id for the classified video
+    threshold: the cutoff for confidence level in the detection at each timestamp
+    chunk_size: bytes read from the connection at a time
+
+    Returns an iterator of VideoFrame(time, detections), detections being the list of
+    predictions at that time (or Detections with the typed_results option). The other fields
+    of the response, e.g. download_progress and label_dict, are in its `info` once read.
+    Close it, or use it as a context manager, to stop before the end.
+    """
+    options["format"] = "json"
+    response = open_streamed_response(
+        self,
+        "get_video_results",
+        error.InvalidQueryError,
+        lambda: request_video_results(self, videoId, options, stream=True),
+    )
+    return VideoResultsStream(response, VideoResultsParser(self), chunk_size)
+
+
+def request_video_results(self, videoId, options, stream=False):
+    (endpoint, method) = self.endpoints["get_video_results"]
     endpoint = endpoint.replace(":key", videoId)
 
     try:
@@ -93,8 +143,73 @@ def get_video_results(self, videoId, **options):
         }
         params.update(options)
 
-        return requests.request(
-            method, endpoint, **{"headers": headers, "params": params}
+        return self.session.request(
+            method, endpoint, **{"headers": headers, "params": params, "stream": stream}
         )
     except Exception as e:
         raise error.APIConnectionError(message=e)
+
+
+class VideoResultsParser(object):
+    """
+    Decodes the frames of a get_video_results response from its chunks.
+
+    With typed results, the labels of the frames parsed before the response's label_dict
+    are renamed in place once it arrives; their detections are held until then.
+    """
+
+    def __init__(self, api):
+        self.typed = api.typed_results
+        self.parser = StreamedObjectParser("detections")
+        # detections parsed before label_dict, to rename when it arrives
+        self.unnamed = []
+
+    @property
+    def info(self):
+        return self.parser.info
+
+    def feed(self, chunk):
+        return self.frames(self.parser.feed, chunk)
+
+    def close(self):
+        frames = self.frames(self.parser.close)
+        self.unnamed = []
+        return frames
+
+    def frames(self, parse, *args):
+        try:
+            frames = [self.frame(*entry) for entry in parse(*args)]
+        except ValueError as e:
+            raise error.APIConnectionError(message=e)
+
+        label_names = self.info.get("label_dict")
+        if self.unnamed and label_names:
+            for detections in self.unnamed:
+                detections.rename(label_names)
+            self.unnamed = []
+        return frames
+
+    def frame(self, time, predictions):
+        if time is None:
+            # detections listed rather than keyed by time
+            (time, predictions) = (prediction_time(predictions), [predictions])
+        time = to_time(time)
+
+        if not self.typed:
+            return VideoFrame(time, predictions)
+
+        detections = Detections()
+        label_names = self.info.get("label_dict")
+        if not label_names:
+            self.unnamed.append(detections)
+        for (box, prediction) in enumerate(predictions):
+            detections.add(prediction, time=time, box=box, label_names=label_names)
+        return VideoFrame(time, detections)
+
+
+class VideoResultsStream(ParsedStream):
+    """Iterator over the frames of a streamed get_video_results response"""
+
+    @property
+    def info(self):
+        return self.parser.info
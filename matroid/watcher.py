@@ -0,0 +1,209 @@
+import asyncio
+import threading
+from collections import namedtuple
+
+from matroid.async_client import AsyncMatroid
+from matroid.client import BASE_URL
+from matroid.src.event_buffer import EventBuffer, event_labels
+from matroid.src.streams import MonitoringResume
+
+# an event of a watched monitoring; error is set instead of event when its watch fails
+WatchedEvent = namedtuple("WatchedEvent", ["monitoringId", "event", "error"])
+
+
+class MonitoringWatcher(object):
+    """
+    Watches many monitorings from one thread: a single event loop drives all their SSE
+    connections through one AsyncMatroid client, and their events are put into one queue,
+    tagged with their monitoring id.
+
+    with MonitoringWatcher(ids, client_id=..., client_secret=...) as watcher:
+        watcher.add(another_id)
+        for (monitoringId, event, error) in watcher:
+            ...
+
+    Each feed reconnects and resumes like watch_monitoring_result, on its own; `feeds` maps
+    the monitoring ids watched to their MonitoringResume, whose `connected`, `reconnections`,
+    `last_error` and idle_seconds() tell the state of the connection. Interruptions are not
+    printed. A feed that fails for good (e.g. the monitoring was deleted) puts a WatchedEvent
+    with its error and stops.
+
+    `events` is the EventBuffer of the events not consumed yet; with a `buffer_size`, its
+    `dropped` counts the events dropped by the `overflow` policy.
+    """
+
+    def __init__(
+        self,
+        monitoring_ids=(),
+        base_url=BASE_URL,
+        client_id=None,
+        client_secret=None,
+        options={},
+        backfill=True,
+        buffer_size=None,
+        overflow="block",
+    ):
+        """
+        Takes the arguments and options of AsyncMatroid; the connection pool is unlimited
+        unless pool_size and pool_maxsize are set, since every feed holds a connection.
+
+        backfill: see watch_monitoring_result
+        buffer_size: maximum number of events waiting to be consumed (default: no limit)
+        overflow: what to do when they are that many, see EventBuffer; a feed blocked by a
+          full buffer stops being read, the other feeds go on until they have an event to put.
+          coalesce keeps the latest event of each monitoring and labels
+        """
+        options = dict(options)
+        options.setdefault("pool_size", 0)
+        options.setdefault("pool_maxsize", 0)
+
+        self.backfill = backfill
+        self.events = EventBuffer(buffer_size, overflow, key=watched_labels)
+        self.feeds = {}
+        self.tasks = {}
+        self.closed = False
+
+        self.loop = asyncio.new_event_loop()
+        self.api = None
+        # set by get() when it makes room in a full buffer, for the feeds blocked in put()
+        self.room = None
+        self.error = None
+        started = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run,
+            args=(started, base_url, client_id, client_secret, options),
+            name="MonitoringWatcher",
+            daemon=True,
+        )
+        self.thread.start()
+        started.wait()
+        if self.error is not None:
+            self.thread.join()
+            self.closed = True
+            raise self.error
+
+        for monitoringId in monitoring_ids:
+            self.add(monitoringId)
+
+    def run(self, started, base_url, client_id, client_secret, options):
+        try:
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.api = AsyncMatroid(base_url, client_id, client_secret, options)
+                self.room = asyncio.Event()
+            except Exception as e:
+                # raised by __init__ once the thread is done
+                self.error = e
+                return
+            finally:
+                started.set()
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def call(self, coroutine):
+        """Runs a coroutine on the watcher's event loop and waits for its result"""
+        if self.closed:
+            raise RuntimeError("The MonitoringWatcher is closed")
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def add(self, monitoringId):
+        """Starts watching a monitoring, if it isn't watched yet; returns its MonitoringResume"""
+        return self.call(self.start_feed(monitoringId))
+
+    def remove(self, monitoringId):
+        """Stops watching a monitoring and closes its connection"""
+        self.call(self.stop_feed(monitoringId))
+
+    @property
+    def monitoring_ids(self):
+        return set(self.feeds)
+
+    async def start_feed(self, monitoringId):
+        if monitoringId not in self.feeds:
+            resume = MonitoringResume(monitoringId, self.backfill, verbose=False)
+            self.feeds[monitoringId] = resume
+            self.tasks[monitoringId] = asyncio.get_running_loop().create_task(
+                self.watch(resume)
+            )
+        return self.feeds[monitoringId]
+
+    async def stop_feed(self, monitoringId):
+        task = self.tasks.pop(monitoringId, None)
+        self.feeds.pop(monitoringId, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def watch(self, resume):
+        events = self.api.watch_resumed(resume)
+        try:
+            async for event in events:
+                await self.put(WatchedEvent(resume.monitoringId, event, None))
+        except Exception as e:
+            resume.last_error = e
+            await self.put(WatchedEvent(resume.monitoringId, None, e))
+        finally:
+            resume.connected = False
+            await events.aclose()
+
+    async def put(self, watched):
+        # waiting in the event loop rather than in put() lets the other feeds go on
+        while not self.events.put(watched, block=False):
+            if self.events.closed or self.events.overflow != "block":
+                return
+            self.room.clear()
+            # room made before the clear wouldn't be signalled again
+            if not self.events.full():
+                continue
+            await self.room.wait()
+
+    def get(self, block=True, timeout=None):
+        """
+        The next WatchedEvent of any monitoring; raises queue.Empty if there is none within
+        `timeout` seconds, and returns None once the watcher is closed
+        """
+        watched = self.events.get(block, timeout)
+        # only a bounded, blocking buffer has feeds waiting for room
+        blocking = self.events.maxsize is not None and self.events.overflow == "block"
+        if watched is not None and blocking and not self.closed:
+            try:
+                self.loop.call_soon_threadsafe(self.room.set)
+            except RuntimeError:
+                # the loop was closed meanwhile, no feed is waiting anymore
+                pass
+        return watched
+
+    def __iter__(self):
+        while True:
+            watched = self.get()
+            if watched is None:
+                return
+            yield watched
+
+    def close(self):
+        """Stops watching all the monitorings and closes their connections"""
+        if self.closed:
+            return
+        self.call(self.stop())
+        self.closed = True
+        self.thread.join()
+        self.events.close()
+
+    async def stop(self):
+        await asyncio.gather(
+            *[self.stop_feed(monitoringId) for monitoringId in list(self.tasks)]
+        )
+        await self.api.close()
+        self.loop.call_soon(self.loop.stop)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def watched_labels(watched):
+    """Coalescing key of a WatchedEvent: its monitoring and labels"""
+    return (watched.monitoringId, event_labels(watched.event))
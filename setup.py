@@ -15,5 +15,6 @@ setup(
     author_email="support@matroid.com",
     url="https://github.com/matroid/matroid-python",
     install_requires=["requests"],
+    extras_require={"async": ["aiohttp"], "images": ["numpy", "Pillow"]},
     packages=find_packages(),
 )
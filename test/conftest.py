@@ -1,6 +1,7 @@
 import pytest
 
 from matroid.client import Matroid
+from matroid.async_client import AsyncMatroid
 
 
 def pytest_addoption(parser):
@@ -29,3 +30,12 @@ def set_up_wrong_permission_client(request):
     return Matroid(
         base_url=base_url, client_id="invalid-id", client_secret="invalid-secret"
     )
+
+
+@pytest.fixture(scope="module")
+def set_up_async_client(request):
+    base_url = request.config.getoption("--base_url")
+    client_id = request.config.getoption("--client_id")
+    client_secret = request.config.getoption("--client_secret")
+
+    return AsyncMatroid(base_url, client_id, client_secret)
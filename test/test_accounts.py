@@ -1,6 +1,7 @@
 import pytest
 import inspect
 
+from matroid.client import Matroid
 from matroid.error import APIError
 from test.helper import print_test_pass
 
@@ -38,6 +39,18 @@ class TestAccounts(object):
         assert res.token_str != None
         print_test_pass()
 
+    def test_token_store(self, set_up_client, tmp_path):
+        api = set_up_client
+        options = {"token_store": str(tmp_path)}
+        first = Matroid(api.base_url, api.client_id, api.client_secret, options)
+        second = Matroid(api.base_url, api.client_id, api.client_secret, options)
+
+        first.retrieve_token()
+        # the second client adopts the stored token instead of requesting its own
+        res = second.retrieve_token()
+        assert res.token_str == first.token.token_str
+        print_test_pass()
+
     def test_with_wrong_permission(self, set_up_wrong_permission_client):
         with pytest.raises(APIError) as e:
             api = set_up_wrong_permission_client
@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+
+from test.data import EVERYDAY_OBJECT_DETECTOR_ID, TEST_IMAGE_URL, TEST_IMAGE_FILE
+from matroid.error import APIError
+from test.helper import print_test_pass
+
+
+class TestAsyncClient(object):
+    def test_async_client(self, set_up_async_client):
+        # set up client
+        self.api = set_up_async_client
+
+        # start testing
+        asyncio.run(self.run_tests())
+
+    async def run_tests(self):
+        async with self.api:
+            await self.get_account_info_test()
+            await self.concurrent_requests_test(detector_id=EVERYDAY_OBJECT_DETECTOR_ID)
+            await self.classify_image_test(
+                detector_id=EVERYDAY_OBJECT_DETECTOR_ID,
+                url=TEST_IMAGE_URL,
+                file=TEST_IMAGE_FILE,
+            )
+
+    # test cases
+    async def get_account_info_test(self):
+        res = await self.api.get_account_info()
+        assert res["account"] != None
+        assert res["account"]["name"] != None
+        print_test_pass()
+
+    async def concurrent_requests_test(self, detector_id):
+        results = await asyncio.gather(
+            *[self.api.get_detector_info(detectorId=detector_id) for _ in range(5)]
+        )
+        assert len(results) == 5
+        for res in results:
+            assert res["id"] == detector_id
+        print_test_pass()
+
+    async def classify_image_test(self, detector_id, url, file):
+        with pytest.raises(APIError) as e:
+            await self.api.classify_image(detectorId=detector_id)
+        assert "invalid_query_err" in str(e)
+
+        res = await self.api.classify_image(detectorId=detector_id, url=url)
+        assert res["results"][0]["predictions"] != None
+
+        res = await self.api.classify_image(detectorId=detector_id, file=file)
+        assert res["results"][0]["predictions"] != None
+        print_test_pass()
@@ -0,0 +1,51 @@
+import io
+
+from matroid.src.images import file_batches, image_batches, merge_batch_results
+from test.helper import print_test_pass
+
+
+class TestBatching(object):
+    def test_batching(self):
+        self.file_batches_test()
+        self.merge_batch_results_test()
+        self.image_batches_test()
+
+    # test cases
+    def file_batches_test(self):
+        files = [io.BytesIO(b"x" * size) for size in (6, 3, 5, 2, 4, 12)]
+
+        batches = file_batches(files, max_batch_size=10)
+
+        # the 12 byte file goes alone, the rest fill up two batches of 10 bytes
+        assert batches == [[5], [0, 4], [1, 2, 3]]
+        assert file_batches(files[0]) is None
+        print_test_pass()
+
+    def merge_batch_results_test(self):
+        class Client(object):
+            json_format = True
+
+        batches = [[0, 2], [1]]
+        responses = [
+            {"results": [{"file": "a"}, {"file": "c"}]},
+            {"results": [{"file": "b"}]},
+        ]
+
+        merged = merge_batch_results(Client(), batches, responses)
+
+        assert [result["file"] for result in merged["results"]] == ["a", "b", "c"]
+        print_test_pass()
+
+    def image_batches_test(self):
+        files = [io.BytesIO(b"x" * size) for size in (4, 4, 4, 1)]
+        inputs = ["https://a.jpg", "https://b.jpg"] + files + ["https://c.jpg"]
+
+        batches = list(image_batches(iter(inputs), batch_size=3, max_batch_size=10))
+
+        assert batches == [
+            (True, ["https://a.jpg", "https://b.jpg"]),
+            (False, files[:2]),
+            (False, files[2:]),
+            (True, ["https://c.jpg"]),
+        ]
+        print_test_pass()
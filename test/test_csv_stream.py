@@ -0,0 +1,63 @@
+import pytest
+
+from matroid.src.csv_stream import CSVParser
+from test.helper import print_test_pass
+
+BODY = (
+    b"\xef\xbb\xbftime,label,score,note\r\n"
+    b'1,cat,0.5,"two\nlines, ""quoted"""\r\n'
+    b"2,dog,,\r\n"
+    b"3,cat,0.25,x\r\n"
+)
+
+
+def parse(parser, body, chunk_size):
+    items = []
+    for start in range(0, len(body), chunk_size):
+        items += parser.feed(body[start : start + chunk_size])
+    return items + parser.close()
+
+
+class TestCSVParser(object):
+    def test_typed_rows(self):
+        for chunk_size in (1, 7, len(BODY)):
+            parser = CSVParser()
+            rows = parse(parser, BODY, chunk_size)
+
+            assert parser.header == ["time", "label", "score", "note"]
+            assert [tuple(row) for row in rows] == [
+                (1, "cat", 0.5, 'two\nlines, "quoted"'),
+                (2, "dog", None, None),
+                (3, "cat", 0.25, "x"),
+            ]
+            assert rows[0].label == "cat"
+        print_test_pass()
+
+    def test_numpy_columns(self):
+        numpy = pytest.importorskip("numpy")
+        chunks = parse(CSVParser(columnar="numpy", chunk_rows=2), BODY, 5)
+
+        assert [len(chunk["time"]) for chunk in chunks] == [2, 1]
+        assert chunks[0]["time"].dtype == numpy.int64
+        assert list(chunks[0]["label"]) == ["cat", "dog"]
+        assert chunks[0]["score"][0] == 0.5
+        assert numpy.isnan(chunks[0]["score"][1])
+        print_test_pass()
+
+    def test_no_body(self):
+        parser = CSVParser()
+        assert parse(parser, b"", 1) == []
+        assert parser.header is None
+        print_test_pass()
+
+    def test_blank_lines_and_literals(self):
+        body = b"a,b\n1,x\n\n2,nan\n\n3, 4\n-.5e3,inf\n"
+        rows = parse(CSVParser(), body, 3)
+
+        assert [tuple(row) for row in rows] == [
+            (1, "x"),
+            (2, "nan"),
+            (3, " 4"),
+            (-500.0, "inf"),
+        ]
+        print_test_pass()
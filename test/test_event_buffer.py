@@ -0,0 +1,79 @@
+import queue
+import threading
+
+import pytest
+
+from matroid.src.event_buffer import EventBuffer, event_labels
+from test.helper import print_test_pass
+
+
+def event(*labels):
+    return {"detections": [{"labels": {label: 0.9}} for label in labels]}
+
+
+class TestEventBuffer(object):
+    def test_drop_oldest(self):
+        buffer = EventBuffer(2, "drop_oldest")
+        for number in range(5):
+            assert buffer.put(number)
+        assert (buffer.get(), buffer.get()) == (3, 4)
+        assert (buffer.received, buffer.dropped) == (5, 3)
+        print_test_pass()
+
+    def test_drop_newest(self):
+        buffer = EventBuffer(2, "drop_newest")
+        assert [buffer.put(number) for number in range(4)] == [True, True, False, False]
+        assert (buffer.get(), buffer.get()) == (0, 1)
+        assert buffer.dropped == 2
+        with pytest.raises(queue.Empty):
+            buffer.get(block=False)
+        print_test_pass()
+
+    def test_coalesce_per_label(self):
+        buffer = EventBuffer(3, "coalesce")
+        (cat, dog, cat_again, bird) = (event("cat"), event("dog"), event("cat"), event("bird"))
+        for found in (cat, dog, cat_again):
+            buffer.put(found)
+        assert len(buffer) == 2
+        assert buffer.get() is dog
+        assert buffer.get() is cat_again
+
+        for found in (cat, dog, bird, event("fish")):
+            buffer.put(found)
+        assert (buffer.get(), buffer.get(), buffer.get()) == (dog, bird, event("fish"))
+        assert buffer.dropped == 2
+        print_test_pass()
+
+    def test_block(self):
+        buffer = EventBuffer(1, "block")
+        buffer.put(0)
+        assert not buffer.put(1, block=False)
+        assert not buffer.put(1, timeout=0.01)
+
+        putter = threading.Thread(target=buffer.put, args=(1,))
+        putter.start()
+        assert buffer.get() == 0
+        putter.join()
+        assert buffer.get() == 1
+        assert (buffer.received, buffer.dropped) == (2, 0)
+        print_test_pass()
+
+    def test_close(self):
+        buffer = EventBuffer(None)
+        buffer.put(0)
+        buffer.close()
+        assert not buffer.put(1)
+        assert list(buffer) == [0]
+
+        buffer = EventBuffer(1)
+        buffer.close(ValueError("stream failed"))
+        with pytest.raises(ValueError):
+            buffer.get()
+        print_test_pass()
+
+    def test_event_labels(self):
+        timed = {"detections": {"1.5": [{"labels": {"cat": 0.9, "dog": 0.2}}]}}
+        assert event_labels(timed) == frozenset(["cat", "dog"])
+        assert event_labels(event("cat", "cat")) == frozenset(["cat"])
+        assert event_labels({"status": "ok"}) is None
+        print_test_pass()
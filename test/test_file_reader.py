@@ -0,0 +1,20 @@
+import io
+
+from matroid.src.helpers import FileReader, check_file_size
+from test.data import TEST_IMAGE_FILE
+from test.helper import print_test_pass
+
+
+class TestFileReader(object):
+    def test_in_memory_inputs(self):
+        with open(TEST_IMAGE_FILE, "rb") as image:
+            png = image.read()
+
+        for file_input in (png, bytearray(png), memoryview(png), io.BytesIO(png)):
+            file = FileReader().get_file(file_input)
+
+            assert file.name == "image.png"
+            assert check_file_size(file) == len(png)
+            assert file.read(8) + file.read() == png
+            file.close()
+        print_test_pass()
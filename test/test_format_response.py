@@ -0,0 +1,37 @@
+import requests
+
+from matroid.client import Matroid
+from matroid.src.helpers import parse_formatted, to_formatted
+from test.helper import print_test_pass
+
+
+def make_response(content):
+    response = requests.Response()
+    response.status_code = 200
+    response.encoding = "utf-8"
+    response._content = content
+    return response
+
+
+class TestFormatResponse(object):
+    def test_output_modes(self):
+        response = make_response(b'{"results": [1, 2]}')
+        decoded = []
+
+        def decoder(content):
+            decoded.append(content)
+            return {"decoded": True}
+
+        for (options, expected) in (
+            ({}, {"results": [1, 2]}),
+            ({"json_format": False}, '{"results": [1, 2]}'),
+            ({"json_format": "bytes"}, b'{"results": [1, 2]}'),
+            ({"json_decoder": decoder}, {"decoded": True}),
+        ):
+            api = Matroid("https://example.com", "id", "secret", options=options)
+            formatted = api.format_response(response)
+
+            assert formatted == expected
+            assert to_formatted(api, parse_formatted(api, formatted)) == formatted
+        assert decoded == [b'{"results": [1, 2]}']
+        print_test_pass()
@@ -28,6 +28,7 @@ class TestImages(object):
             localizer=EVERYDAY_OBJECT_DETECTOR_ID,
             localizer_label=localizer_label,
             url=TEST_IMAGE_URL,
+            file=TEST_IMAGE_FILE,
         )
 
         self.segment_image_test(
@@ -51,6 +52,10 @@ class TestImages(object):
         assert res["results"][0]["predictions"] != None
         print("Classify one file test passed")
 
+        res = self.api.classify_image(detectorId=detector_id, file=image_array(file))
+        assert res["results"][0]["predictions"] != None
+        print("Classify one array test passed")
+
         res = self.api.classify_image(detectorId=detector_id, file=files)
         assert len(res["results"]) == 2
         assert res["results"][0]["predictions"] != None
@@ -63,12 +68,17 @@ class TestImages(object):
 
         print_test_pass()
 
-    def localize_image_test(self, localizer, localizer_label, url):
+    def localize_image_test(self, localizer, localizer_label, url, file):
         res = self.api.localize_image(
             localizer=localizer, localizerLabel=localizer_label, url=url
         )
         assert res["results"][0]["predictions"] != None
 
+        res = self.api.localize_image(
+            localizer=localizer, localizerLabel=localizer_label, file=image_array(file)
+        )
+        assert res["results"][0]["predictions"] != None
+
         print_test_pass()
 
     def segment_image_test(self, detector_id, url, expected_label):
@@ -83,3 +93,11 @@ class TestImages(object):
         assert len(preds[idx]["segments"][0]["extPoints"]) > 500
 
         print_test_pass()
+
+
+def image_array(path):
+    """An image file decoded to a NumPy array, as a single in-memory input"""
+    numpy = pytest.importorskip("numpy")
+    Image = pytest.importorskip("PIL.Image")
+    with Image.open(path) as image:
+        return numpy.asarray(image.convert("RGB"))
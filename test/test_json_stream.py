@@ -0,0 +1,85 @@
+import json
+import random
+
+import pytest
+
+from matroid import error
+from matroid.client import Matroid
+from matroid.src.json_stream import StreamedObjectParser
+from matroid.src.videos import VideoResultsParser
+from test.helper import print_test_pass
+
+RESPONSE = {
+    "download_progress": 100,
+    "detections": {
+        "0.5": [{"labels": {"0": 0.75}, "bbox": {"left": 0.1, "top": 0.2}}],
+        "1": [],
+        "1.5": [{"labels": {"1": 1e-3}, "note": 'a "quoted" \\ {[value]} é'}],
+    },
+    "label_dict": {"0": "cat", "1": "dog"},
+    "classification_progress": -12.5e1,
+    "done": True,
+    "error": None,
+}
+
+
+def parse(body, chunk_sizes):
+    parser = StreamedObjectParser("detections")
+    entries = []
+    position = 0
+    while position < len(body):
+        size = next(chunk_sizes)
+        entries += parser.feed(body[position : position + size])
+        position += size
+    entries += parser.close()
+    return (entries, parser.info)
+
+
+class TestStreamedObjectParser(object):
+    def test_any_chunking(self):
+        info = {key: value for (key, value) in RESPONSE.items() if key != "detections"}
+        rng = random.Random(0)
+        for indent in (None, 2):
+            body = json.dumps(RESPONSE, indent=indent, ensure_ascii=False).encode("utf-8")
+            for chunk_sizes in (iter(lambda: 1, 0), iter(lambda: rng.randint(1, 20), 0)):
+                (entries, parsed_info) = parse(body, chunk_sizes)
+
+                assert entries == list(RESPONSE["detections"].items())
+                assert parsed_info == info
+        print_test_pass()
+
+    def test_listed_entries(self):
+        body = b'{"detections": [{"time": 1}, {"time": 2}], "total": 2}'
+        (entries, info) = parse(body, iter(lambda: 3, 0))
+
+        assert entries == [(None, {"time": 1}), (None, {"time": 2})]
+        assert info == {"total": 2}
+        print_test_pass()
+
+    def test_incomplete(self):
+        parser = StreamedObjectParser("detections")
+        assert parser.feed(b'{"detections": {"0": [1], "1": [2') == [("0", [1])]
+
+        with pytest.raises(ValueError):
+            parser.close()
+        print_test_pass()
+
+    def test_video_results_parser(self):
+        api = Matroid("https://example.com", "id", "secret", options={"typed_results": True})
+        # label_dict after the detections, as the typed frames are already parsed
+        body = json.dumps(RESPONSE).encode("utf-8")
+        parser = VideoResultsParser(api)
+        frames = [
+            frame
+            for byte in range(len(body))
+            for frame in parser.feed(body[byte : byte + 1])
+        ]
+        frames += parser.close()
+
+        assert [frame.time for frame in frames] == [0.5, 1, 1.5]
+        assert [detection.label_name for detection in frames[0].detections] == ["cat"]
+        assert frames[2].detections.label_ids == {"dog": 0}
+
+        with pytest.raises(error.APIConnectionError):
+            VideoResultsParser(api).feed(b'{"detections": {"0": [1]] }')
+        print_test_pass()
@@ -0,0 +1,101 @@
+import datetime
+
+from matroid.src.streams import BACKFILL_OVERLAP_SECS, MonitoringResume
+from test.helper import print_test_pass
+
+
+def event(*numbers):
+    return {"monitoringId": "m1", "detections": [{"n": n} for n in numbers]}
+
+
+def timed(*numbers):
+    """An event whose detections have server timestamps, n seconds after 2024-05-01"""
+    detections = [{"n": n, "timestamp": 1714521600 + n} for n in numbers]
+    return {"monitoringId": "m1", "detections": detections}
+
+
+class TestMonitoringResume(object):
+    def test_resume_from_event_id(self):
+        resume = MonitoringResume("m1")
+        assert resume.deliver(event(1), "1") == event(1)
+        assert resume.headers() == {}
+
+        resume.disconnected()
+        assert resume.headers() == {"Last-Event-ID": "1"}
+        assert resume.backfill_params() is None
+        print_test_pass()
+
+    def test_backfill_and_deduplicate(self):
+        resume = MonitoringResume("m1")
+        assert resume.backfill_params() is None
+        resume.deliver(timed(1, 2))
+
+        resume.disconnected()
+        assert resume.headers() == {}
+        params = resume.backfill_params()
+        assert params["format"] == "json"
+        since = datetime.datetime.fromisoformat(params["startTime"]).timestamp()
+        assert since == 1714521600 + 2 - BACKFILL_OVERLAP_SECS
+
+        backfill = {"detections": timed(2, 3)["detections"]}
+        assert resume.backfilled(backfill) == [timed(3)]
+        assert resume.deliver(timed(3)) is None
+        assert resume.deliver(timed(3, 4)) == timed(4)
+        assert resume.backfill_params() is None
+        print_test_pass()
+
+    def test_backfill_before_first_event(self):
+        resume = MonitoringResume("m1")
+        resume.disconnected()
+        since = datetime.datetime.fromisoformat(resume.backfill_params()["startTime"])
+        assert abs(since.timestamp() - (resume.started_at - BACKFILL_OVERLAP_SECS)) < 1e-3
+        print_test_pass()
+
+    def test_distinct_events(self):
+        resume = MonitoringResume("m1")
+        status = {"monitoringId": "m1", "status": "running"}
+        assert resume.deliver(status) == status
+        assert resume.deliver(status) == status
+
+        # the same detection in two events is delivered twice, but once per event
+        assert resume.deliver(dict(event(1), timestamp=10)) == dict(event(1), timestamp=10)
+        assert resume.deliver(dict(event(1), timestamp=20)) == dict(event(1), timestamp=20)
+        assert resume.deliver(dict(event(1), timestamp="1970-01-01T00:00:20Z")) is None
+        assert resume.deliver(event(1), "7") == event(1)
+        assert resume.last_event_at == 20
+        print_test_pass()
+
+    def test_events_of_one_chunk(self):
+        resume = MonitoringResume("m1")
+        body = 'id: 1\ndata: {"detections": [{"n": 1}]}\n\n'
+        body += 'id: 2\ndata: {"detections": [{"n": 1}]}\n\n'
+        delivered = [
+            resume.deliver(message.data, message.id)
+            for message in resume.parser.feed(body.encode())
+        ]
+        assert delivered == [{"detections": [{"n": 1}]}] * 2
+
+        # with neither ids nor timestamps, repeats can't be told apart from new detections
+        assert resume.deliver(event(1)) == event(1)
+        assert resume.deliver(event(1)) == event(1)
+        print_test_pass()
+
+    def test_no_backfill(self):
+        resume = MonitoringResume("m1", backfill=False)
+        resume.deliver(event(1))
+        resume.disconnected()
+        assert resume.backfill_params() is None
+        print_test_pass()
+
+    def test_connection_state(self):
+        resume = MonitoringResume("m1", verbose=False)
+        assert not resume.connected
+        resume.opened()
+        assert resume.connected
+
+        interruption = ConnectionError("reset")
+        resume.disconnected(interruption)
+        assert not resume.connected
+        assert resume.reconnections == 1
+        assert resume.last_error is interruption
+        print_test_pass()
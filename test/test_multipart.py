@@ -0,0 +1,100 @@
+import email.parser
+
+import requests
+
+from test.data import TEST_IMAGE_FILE, TEST_IMAGE_FILE_DOG
+from matroid.src import helpers
+from matroid.src.helpers import upload_request
+from matroid.src.multipart import MultipartEncoder
+from test.helper import print_test_pass
+
+
+class TestMultipart(object):
+    def test_multipart_encoder(self):
+        files = [
+            ("file", open(TEST_IMAGE_FILE, "rb")),
+            ("file", open(TEST_IMAGE_FILE_DOG, "rb")),
+        ]
+        fields = {"detectorId": "abc", "labels": ["cat", "dog"], "skipped": None}
+        encoder = MultipartEncoder(fields, files, chunk_size=1024)
+
+        body = b""
+        chunk = encoder.read(1000)
+        while chunk:
+            body += chunk
+            chunk = encoder.read(1000)
+        encoder.close()
+        assert len(body) == len(encoder)
+
+        message = email.parser.BytesParser().parsebytes(
+            b"Content-Type: " + encoder.content_type.encode() + b"\r\n\r\n" + body
+        )
+        parts = [
+            (part.get_param("name", header="content-disposition"), part.get_filename())
+            for part in message.get_payload()
+        ]
+        assert parts == [
+            ("detectorId", None),
+            ("labels", None),
+            ("labels", None),
+            ("file", "cat.png"),
+            ("file", "dog.png"),
+        ]
+        with open(TEST_IMAGE_FILE, "rb") as image:
+            assert message.get_payload()[3].get_payload(decode=True) == image.read()
+        assert all(file.closed for (_, file) in files)
+        print_test_pass()
+
+    def test_upload_request_restarts(self, monkeypatch):
+        monkeypatch.setattr(helpers.time, "sleep", lambda seconds: None)
+
+        class FlakySession(object):
+            """Drops the connection halfway through the first upload"""
+
+            def __init__(self):
+                self.bodies = []
+
+            def request(self, method, endpoint, headers, data):
+                if not self.bodies:
+                    self.bodies.append(data.read(len(data) // 2))
+                    raise requests.ConnectionError("connection reset")
+                self.bodies.append(data.read())
+                return self.bodies[-1]
+
+        session = FlakySession()
+        progress = []
+        image = open(TEST_IMAGE_FILE, "rb")
+
+        body = upload_request(
+            "POST",
+            "https://example.com",
+            {},
+            {"name": "cat"},
+            [("file", image)],
+            session=session,
+            progress=lambda sent, total: progress.append(sent),
+        )
+
+        with open(TEST_IMAGE_FILE, "rb") as original:
+            assert original.read() in body
+        assert len(session.bodies) == 2
+        assert progress[-1] == len(body)
+        assert image.closed
+        print_test_pass()
+
+    def test_multipart_encoder_rewind(self):
+        image = open(TEST_IMAGE_FILE, "rb")
+        encoder = MultipartEncoder(
+            {"note": ""}, [("file", image)], chunk_size=1024, restarts=1
+        )
+
+        first = encoder.read(3000)
+        assert encoder.rewind()
+        # a read ending right before the empty field value doesn't end the body there
+        body = encoder.read(len(encoder.parts[0][0]))
+        body += b"".join(iter(lambda: encoder.read(7), b""))
+        assert body.startswith(first) and len(body) == len(encoder)
+        # the restarts are used up, and the whole body was sent anyway
+        assert not encoder.rewind()
+        encoder.close()
+        print_test_pass()
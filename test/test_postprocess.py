@@ -0,0 +1,85 @@
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from matroid import postprocess
+from test.helper import print_test_pass
+
+
+def prediction(labels, left, top, width=0.2, height=0.2):
+    return {
+        "labels": labels,
+        "bbox": {"left": left, "top": top, "width": width, "height": height},
+    }
+
+
+RESULTS = {
+    "results": [
+        {
+            "file": {"name": "a.jpg"},
+            "predictions": [
+                prediction({"cat": 0.9, "dog": 0.2}, 0.1, 0.1),
+                prediction({"cat": 0.8, "dog": 0.6}, 0.11, 0.11),
+                prediction({"cat": 0.7}, 0.6, 0.6),
+            ],
+        },
+        {
+            "file": {"name": "b.jpg"},
+            "predictions": [prediction({"cat": 0.5}, 0.1, 0.1)],
+        },
+    ]
+}
+
+
+class TestPostprocess(object):
+    def test_iou(self):
+        overlaps = postprocess.iou(
+            [[0, 0, 2, 2], [0, 0, 1, 1]], [[1, 1, 2, 2], [0, 0, 2, 2], [5, 5, 0, 0]]
+        )
+        assert overlaps == pytest.approx(
+            numpy.array([[1 / 7, 1, 0], [0, 0.25, 0]])
+        )
+        print_test_pass()
+
+    def test_nms(self, monkeypatch):
+        boxes = [[0, 0, 1, 1], [0.05, 0.05, 1, 1], [0, 0, 1, 1], [2, 2, 1, 1]]
+        scores = [0.6, 0.9, 0.8, 0.5]
+
+        assert list(postprocess.nms(boxes, scores)) == [1, 3]
+        assert list(postprocess.nms(boxes, scores, labels=[0, 0, 1, 0])) == [1, 2, 3]
+
+        # groups too large to pad are suppressed box by box, with the same result
+        monkeypatch.setattr(postprocess, "MAX_IOU_BLOCK", 1)
+        assert list(postprocess.nms(boxes, scores, labels=[0, 0, 1, 0])) == [1, 2, 3]
+        print_test_pass()
+
+    def test_thresholds_and_labels(self):
+        detections = postprocess.as_detections(RESULTS)
+        mask = postprocess.threshold_mask(detections, {"cat": 0.75}, default=0.5)
+        assert list(mask) == [True, False, True, True, False, False]
+
+        kept = postprocess.select(detections, postprocess.label_mask(detections, ["dog"]))
+        assert [d.score for d in kept] == pytest.approx([0.2, 0.6])
+        print_test_pass()
+
+    def test_filter_detections(self):
+        filtered = postprocess.filter_detections(
+            RESULTS, thresholds={"dog": 0.5}, iou_threshold=0.5
+        )
+
+        # the second cat box overlaps the first; the cat on b.jpg is on another image
+        assert [(d.image, d.label_name, d.score) for d in filtered] == [
+            (0, "cat", pytest.approx(0.9)),
+            (0, "dog", pytest.approx(0.6)),
+            (0, "cat", pytest.approx(0.7)),
+            (1, "cat", pytest.approx(0.5)),
+        ]
+        print_test_pass()
+
+    def test_box_conversion(self):
+        pixels = postprocess.denormalize_boxes([[0.5, 0.25, 0.5, 0.5]], 640, 480)
+        assert pixels == pytest.approx(numpy.array([[320, 120, 320, 240]]))
+        assert postprocess.normalize_boxes(pixels, 640, 480) == pytest.approx(
+            numpy.array([[0.5, 0.25, 0.5, 0.5]])
+        )
+        print_test_pass()
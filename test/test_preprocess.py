@@ -0,0 +1,72 @@
+import io
+import threading
+import time
+
+import pytest
+
+from matroid.src.helpers import FileReader
+from test.data import TEST_IMAGE_FILE
+from test.helper import print_test_pass
+
+Image = pytest.importorskip("PIL.Image")
+
+
+class TestPreprocess(object):
+    def test_image_preprocessor(self):
+        from matroid.src.preprocess import ImagePreprocessor
+
+        with ImagePreprocessor(max_side=64, quality=80, workers=1) as preprocessor:
+            files = [open(TEST_IMAGE_FILE, "rb"), FileReader().get_file(b"not an image")]
+
+            (image, other) = preprocessor.process_files(files)
+
+            assert all(file.closed for file in files)
+            assert max(Image.open(io.BytesIO(image.read())).size) == 64
+            assert image.name == "image.jpg"
+            assert other.read() == b"not an image"
+
+            # rotated images keep their pixels and orientation tag, so boxes still apply
+            rotated = io.BytesIO()
+            exif = Image.Exif()
+            exif[0x0112] = 6
+            Image.new("RGB", (200, 100)).save(rotated, format="JPEG", exif=exif.tobytes())
+            rotated.seek(0)
+
+            (image,) = preprocessor.process_files([rotated])
+            image = Image.open(io.BytesIO(image.read()))
+            assert image.size == (64, 32)
+            assert image.getexif()[0x0112] == 6
+        print_test_pass()
+
+    def test_shared_executor(self, monkeypatch):
+        from matroid.src import preprocess
+
+        started = []
+        shut_down = []
+
+        class Executor(object):
+            def __init__(self, **kwargs):
+                # slow to start, like a process pool, so that threads race to create one
+                time.sleep(0.05)
+                started.append(self)
+
+            def shutdown(self):
+                shut_down.append(self)
+
+        monkeypatch.setattr(preprocess, "ProcessPoolExecutor", Executor)
+        preprocessor = preprocess.ImagePreprocessor(workers=1)
+
+        def concurrently(method):
+            threads = [threading.Thread(target=method) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        concurrently(preprocessor.get_executor)
+        assert len(started) == 1
+
+        concurrently(preprocessor.close)
+        assert shut_down == started
+        assert preprocessor.executor is None
+        print_test_pass()
@@ -0,0 +1,44 @@
+from matroid.src.rate_limit import RateLimiter, TokenBucket
+from test.helper import print_test_pass
+
+
+class TestRateLimit(object):
+    def test_rate_limit(self):
+        self.token_bucket_test()
+        self.endpoint_groups_test()
+        self.adaptive_rate_test()
+
+    # test cases
+    def token_bucket_test(self):
+        bucket = TokenBucket(rate=10, burst=2)
+
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+        # callers past the burst queue up one interval apart
+        assert abs(bucket.reserve() - 0.1) < 0.01
+        assert abs(bucket.reserve() - 0.2) < 0.01
+        print_test_pass()
+
+    def endpoint_groups_test(self):
+        limiter = RateLimiter({"classify": 5, "metadata": 20})
+
+        assert limiter.bucket("classify_image").rate == 5
+        assert limiter.bucket("get_detector_info").rate == 20
+        # groups without a rate are not limited
+        assert limiter.bucket("push_image") is None
+        print_test_pass()
+
+    def adaptive_rate_test(self):
+        limiter = RateLimiter({"classify": 10}, decrease_factor=0.5)
+        bucket = limiter.bucket("classify_image")
+
+        limiter.on_rate_limited("classify_image")
+        assert bucket.rate == 5
+        # a burst of 429s from requests already in flight only slows down once
+        limiter.on_rate_limited("localize_image")
+        assert bucket.rate == 5
+
+        for _ in range(1000):
+            limiter.on_success("classify_image")
+        assert bucket.rate == 10
+        print_test_pass()
@@ -0,0 +1,149 @@
+import io
+
+from matroid.src.detectors import detector_info_seen
+from matroid.src.images import cached_classification
+from matroid.src.result_cache import ResultCache, image_digest
+from test.helper import print_test_pass
+
+
+class TestResultCache(object):
+    def test_result_cache(self, tmp_path):
+        self.lru_test()
+        self.ttl_test()
+        self.disk_tier_test(str(tmp_path))
+        self.training_test()
+        self.image_digest_test()
+        self.cached_response_test()
+        self.cached_file_test()
+
+    # test cases
+    def lru_test(self):
+        cache = ResultCache(max_entries=2)
+        cache.put("detector", "a", {"label": "a"})
+        cache.put("detector", "b", {"label": "b"})
+        cache.get("detector", "a")
+        cache.put("detector", "c", {"label": "c"})
+
+        assert cache.get("detector", "b") is None
+        assert cache.get("detector", "a") == {"label": "a"}
+        print_test_pass()
+
+    def ttl_test(self):
+        cache = ResultCache(ttl=-1)
+        cache.put("detector", "a", {"label": "a"})
+
+        assert cache.get("detector", "a") is None
+        print_test_pass()
+
+    def disk_tier_test(self, directory):
+        cache = ResultCache(directory=directory)
+        other_cache = ResultCache(directory=directory)
+        cache.put("detector", "a", {"label": "a"})
+        cache.put("other-detector", "b", {"label": "b"})
+
+        assert other_cache.get("detector", "a") == {"label": "a"}
+
+        other_cache.invalidate("detector")
+        # the memory tier of other processes keeps its results until they expire
+        assert cache.get("detector", "a") == {"label": "a"}
+        fresh_cache = ResultCache(directory=directory)
+        assert fresh_cache.get("detector", "a") is None
+        assert fresh_cache.get("other-detector", "b") == {"label": "b"}
+        print_test_pass()
+
+    def training_test(self):
+        class Client(object):
+            json_format = True
+            result_cache = ResultCache()
+
+        client = Client()
+        cache = client.result_cache
+        cache.put("detector", "a", {"label": "a"})
+        cache.start_training("detector")
+        cache.put("detector", "b", {"label": "b"})
+
+        # classifications made while the detector trains aren't cached
+        assert cache.get("detector", "a") is None
+        assert cache.get("detector", "b") is None
+
+        detector_info_seen(client, "detector", {"detector": {"state": "training"}})
+        cache.put("detector", "b", {"label": "b"})
+        assert cache.get("detector", "b") is None
+
+        detector_info_seen(client, "detector", {"state": "trained"})
+        cache.put("detector", "b", {"label": "b"})
+        assert cache.get("detector", "b") == {"label": "b"}
+
+        # only the first trained state seen after training drops results
+        detector_info_seen(client, "detector", {"detector": {"state": "trained"}})
+        assert cache.get("detector", "b") == {"label": "b"}
+        print_test_pass()
+
+    def image_digest_test(self):
+        image = io.BytesIO(b"image")
+        image.read(2)
+
+        assert image_digest(image) == image_digest(b"image"[2:])
+        assert image.tell() == 2
+        print_test_pass()
+
+    def cached_response_test(self):
+        class Client(object):
+            json_format = True
+            result_cache = ResultCache()
+            requested = []
+
+            def classify_image_batch(self, detectorId, url=None, **options):
+                self.requested.append(url)
+                return {
+                    "results": [{"url": image} for image in url],
+                    "label_dict": {"1": "cat"},
+                }
+
+        client = Client()
+        response = cached_classification(client, "detector", url=["a", "b"])
+        cached = cached_classification(client, "detector", url=["b", "a"])
+
+        # a response answered from the cache has the same fields as one from the API
+        assert client.requested == [["a", "b"]]
+        assert cached["label_dict"] == response["label_dict"]
+        assert [result["url"] for result in cached["results"]] == ["b", "a"]
+        print_test_pass()
+
+    def cached_file_test(self):
+        class Preprocessor(object):
+            max_side = 1024
+
+            def settings(self):
+                return {"max_side": self.max_side}
+
+        class Client(object):
+            json_format = True
+            result_cache = ResultCache()
+            image_preprocessor = Preprocessor()
+            requested = 0
+
+            def classify_image_batch(self, detectorId, file=None, **options):
+                self.requested += 1
+                return {"results": [{"file": {"name": "first.png"}, "predictions": []}]}
+
+        client = Client()
+        cached_classification(client, "detector", file=b"\x89PNG\r\n\x1a\nimage")
+        cached = cached_classification(
+            client, "detector", file=io.BytesIO(b"\x89PNG\r\n\x1a\nimage")
+        )
+        named = io.BytesIO(b"\x89PNG\r\n\x1a\nimage")
+        named.name = "/images/second.png"
+        named_cached = cached_classification(client, "detector", file=named)
+
+        # hits describe the file of the call, not the one the result was cached for
+        assert client.requested == 1
+        assert cached["results"][0]["file"] == {"name": "image.png"}
+        assert named_cached["results"][0]["file"] == {"name": "second.png"}
+        assert cached_classification(client, "detector", file=named) == named_cached
+
+        # images preprocessed differently are different images
+        client.image_preprocessor.max_side = 512
+        cached_classification(client, "detector", file=named)
+        assert client.requested == 2
+        print_test_pass()
@@ -0,0 +1,120 @@
+import math
+
+import pytest
+
+from matroid.client import Matroid
+from matroid.src.results import DetectionResults, typed_results
+from test.helper import print_test_pass
+
+CLASSIFICATION = {
+    "results": [
+        {
+            "file": {"name": "a.jpg"},
+            "predictions": [
+                {
+                    "labels": {"cat": 0.9, "dog": 0.1},
+                    "bbox": {"left": 0.1, "top": 0.2, "width": 0.3, "height": 0.4},
+                }
+            ],
+        },
+        {"file": {"name": "b.jpg"}, "predictions": [{"labels": {"dog": 0.7}}]},
+    ]
+}
+
+VIDEO_RESULTS = {
+    "download_progress": 100,
+    "label_dict": {"0": "cat", "1": "dog"},
+    "detections": {
+        "0": [{"labels": {"0": 0.8}, "bbox": {"left": 0, "top": 0, "width": 1, "height": 1}}],
+        "1.5": [{"labels": {"1": 0.6}}, {"labels": {"0": 0.2, "1": 0.3}}],
+    },
+}
+
+
+class TestResults(object):
+    def test_classification_results(self):
+        api = Matroid("https://example.com", "id", "secret", options={"typed_results": True})
+        results = typed_results(api, "classify_image", CLASSIFICATION)
+        detections = results.detections
+
+        assert isinstance(results, DetectionResults)
+        assert results["files"] == [{"name": "a.jpg"}, {"name": "b.jpg"}]
+        assert len(detections) == 3
+        assert detections.labels == ["cat", "dog"]
+        assert list(detections.column("image")) == [0, 0, 1]
+
+        first = detections[0]
+        assert first.label_name == "cat"
+        assert first.score == pytest.approx(0.9)
+        assert first.width == pytest.approx(0.3)
+        assert math.isnan(detections[2].left)
+        assert math.isnan(first.time)
+
+        confident = detections.filter(min_score=0.5, labels=["dog"])
+        assert [d.score for d in confident] == [pytest.approx(0.7)]
+        print_test_pass()
+
+    def test_filter(self, monkeypatch):
+        api = Matroid("https://example.com", "id", "secret", options={"typed_results": True})
+        detections = typed_results(api, "classify_image", CLASSIFICATION).detections
+        detections.add({"labels": {"cat": float("nan")}}, image=2)
+
+        def filtered(**filters):
+            found = detections.filter(**filters)
+            return [
+                (d.image, d.label_name, None if math.isnan(d.score) else round(d.score, 3))
+                for d in found
+            ]
+
+        with_numpy = [
+            filtered(min_score=0.1),
+            filtered(min_score=0.5),
+            filtered(labels=["cat", "bird"]),
+            filtered(min_score=0.5, labels=["dog"]),
+            filtered(labels=[]),
+        ]
+        monkeypatch.setattr("matroid.src.results.numpy", None)
+        without_numpy = [
+            filtered(min_score=0.1),
+            filtered(min_score=0.5),
+            filtered(labels=["cat", "bird"]),
+            filtered(min_score=0.5, labels=["dog"]),
+            filtered(labels=[]),
+        ]
+
+        # NaN scores pass min_score either way
+        assert with_numpy == without_numpy
+        assert without_numpy[0] == [
+            (0, "cat", 0.9),
+            (0, "dog", 0.1),
+            (1, "dog", 0.7),
+            (2, "cat", None),
+        ]
+        assert without_numpy[4] == []
+        print_test_pass()
+
+    def test_timed_results(self):
+        api = Matroid(
+            "https://example.com",
+            "id",
+            "secret",
+            options={"typed_results": True, "json_format": False},
+        )
+        results = typed_results(api, "get_video_results", str(VIDEO_RESULTS).replace("'", '"'))
+        detections = results.detections
+
+        assert results["download_progress"] == 100
+        assert [d.label_name for d in detections] == ["cat", "dog", "cat", "dog"]
+        assert list(detections.column("time")) == [0, 1.5, 1.5, 1.5]
+        assert list(detections.column("box")) == [0, 1, 2, 2]
+        assert detections.nbytes() == 4 * 40
+        print_test_pass()
+
+    def test_untyped(self):
+        api = Matroid("https://example.com", "id", "secret")
+        assert typed_results(api, "classify_image", CLASSIFICATION) is CLASSIFICATION
+
+        api.typed_results = True
+        assert typed_results(api, "get_video_results", "time,label\n") == "time,label\n"
+        assert typed_results(api, "get_account_info", {"account": 1}) == {"account": 1}
+        print_test_pass()
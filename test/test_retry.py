@@ -0,0 +1,129 @@
+import json
+
+import requests
+
+from matroid import error
+from matroid.client import Matroid, MatroidAPI
+from matroid.src import helpers
+from matroid.src.helpers import get_retry_policy
+from matroid.src.retry import RetryBudget, RetryPolicy
+from test.helper import print_test_pass
+
+
+def make_response(status_code, headers=None, body=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    if body is not None:
+        response._content = json.dumps(body).encode()
+    return response
+
+
+class TestRetry(object):
+    def test_retry_policy(self):
+        self.backoff_test()
+        self.retry_after_test()
+        self.idempotent_only_test()
+        self.deadline_test()
+        self.budget_test()
+        self.public_name_override_test()
+
+    # test cases
+    def backoff_test(self):
+        policy = RetryPolicy(
+            max_retries=3, backoff_factor=1, max_backoff=3, jitter=False
+        )
+        e = error.ServerError(make_response(500))
+
+        delays = [policy.next_delay(e, attempt, "GET", 0) for attempt in range(4)]
+        assert delays == [1, 2, 3, None]
+        print_test_pass()
+
+    def retry_after_test(self):
+        policy = RetryPolicy()
+        e = error.RateLimitError(make_response(429, {"Retry-After": "7"}))
+
+        assert policy.next_delay(e, 0, "GET", 0) == 7
+        print_test_pass()
+
+    def idempotent_only_test(self):
+        e = error.APIError(make_response(503))
+
+        assert RetryPolicy().next_delay(e, 0, "POST", 0) is None
+        assert RetryPolicy(idempotent_only=False).next_delay(e, 0, "POST", 0) != None
+        # the server didn't process these, they are safe to repeat whatever the method
+        rate_limited = error.RateLimitError(make_response(429, {"Retry-After": "2"}))
+        assert RetryPolicy().next_delay(rate_limited, 0, "POST", 0) == 2
+        unavailable = error.APIError(make_response(503, {"Retry-After": "3"}))
+        assert RetryPolicy().next_delay(unavailable, 0, "POST", 0) == 3
+        user_error = error.InvalidQueryError(make_response(400))
+        assert RetryPolicy().next_delay(user_error, 0, "GET", 0) is None
+        print_test_pass()
+
+    def deadline_test(self):
+        policy = RetryPolicy(backoff_factor=1, jitter=False, deadline=10)
+        e = error.APIConnectionError(message="connection reset")
+
+        assert policy.next_delay(e, 0, "GET", 5) == 1
+        assert policy.next_delay(e, 0, "GET", 9.5) is None
+        print_test_pass()
+
+    def budget_test(self):
+        budget = RetryBudget(ratio=0.5, min_retries=1)
+        policy = RetryPolicy(budget=budget)
+        e = error.APIConnectionError(message="connection reset")
+
+        assert policy.next_delay(e, 0, "GET", 0) != None
+        assert policy.next_delay(e, 0, "GET", 0) is None
+
+        policy.record_request()
+        policy.record_request()
+        assert policy.next_delay(e, 0, "GET", 0) != None
+        print_test_pass()
+
+    def public_name_override_test(self):
+        class Client(object):
+            retry_policy = RetryPolicy()
+            retry_overrides = {"classify_image": RetryPolicy(idempotent_only=False)}
+
+        # classify_image and localize_image send their requests with *_batch functions
+        for batch_call in (MatroidAPI.classify_image_batch, MatroidAPI.localize_image_batch):
+            policy = get_retry_policy(Client(), batch_call.__name__, batch_call.public_name)
+            expected = Client.retry_overrides.get(batch_call.public_name, Client.retry_policy)
+            assert policy is expected
+
+        Client.retry_overrides["classify_image_batch"] = None
+        call = MatroidAPI.classify_image_batch
+        assert get_retry_policy(Client(), call.__name__, call.public_name) is None
+        print_test_pass()
+
+    def test_rate_limited_post(self, monkeypatch):
+        delays = []
+        monkeypatch.setattr(helpers.time, "sleep", delays.append)
+
+        class Session(object):
+            """Rate limits the first classification"""
+
+            def __init__(self):
+                self.classifications = 0
+
+            def request(self, method, endpoint, **kwargs):
+                if endpoint.endswith("/oauth/token"):
+                    token = {"access_token": "t", "token_type": "Bearer", "expires_in": 3600}
+                    return make_response(200, body=token)
+                self.classifications += 1
+                if self.classifications == 1:
+                    rate_error = {"code": "rate_err", "message": "slow down"}
+                    return make_response(429, {"Retry-After": "4"}, rate_error)
+                return make_response(200, body={"results": []})
+
+        options = {"retry_policy": RetryPolicy()}
+        api = Matroid("https://example.com/api/v1", "id", "secret", options=options)
+        api.session = Session()
+
+        assert api.classify_image("detector", url="https://example.com/cat.jpg") == {
+            "results": []
+        }
+        assert api.session.classifications == 2
+        assert delays == [4]
+        print_test_pass()
@@ -0,0 +1,93 @@
+import gzip
+import io
+import json
+from unittest import mock
+
+import requests
+import urllib3
+
+from matroid.src import sse
+from matroid.src.sse import SSEParser, stream_sse_events
+from matroid.src.streams import raw_chunks
+from test.helper import print_test_pass
+
+STREAM = (
+    b": heartbeat\n\n"
+    b'data: {"a": 1}\n\n'
+    b"id: 7\r\n"
+    b"event: detection\r\n"
+    b'data: {"b":\r\n'
+    b"data: 2}\r\n\r\n"
+    b"retry: 5000\r\r"
+    b'data:{"c": "x\\ny"}\r\n'
+    b"id: 8\n\n"
+    b"data: not json\n\n"
+)
+
+
+def parse(chunks):
+    parser = SSEParser()
+    events = [event for chunk in chunks for event in parser.feed(chunk)]
+    return (events, parser)
+
+
+class TestSSEParser(object):
+    def test_any_chunking(self):
+        for size in (1, 2, 3, 5, len(STREAM)):
+            chunks = [STREAM[i : i + size] for i in range(0, len(STREAM), size)]
+            (events, parser) = parse(chunks)
+
+            assert [event.data for event in events] == [
+                {"a": 1},
+                {"b": 2},
+                {"c": "x\ny"},
+            ]
+            assert events[1].event == "detection"
+            assert events[1].id == "7"
+            assert parser.last_event_id == "8"
+            assert parser.retry == 5000
+        print_test_pass()
+
+    def test_incomplete_event(self):
+        parser = SSEParser()
+        assert parser.feed(b'data: {"a": 1}\r\n\r') == []
+        assert [event.data for event in parser.feed(b"\n")] == [{"a": 1}]
+        print_test_pass()
+
+    def test_heartbeats(self):
+        parser = SSEParser()
+        assert parser.idle_seconds() is None
+        assert parser.feed(b": heartbeat\n\n: heart") == []
+        assert parser.heartbeats == 1
+        assert 0 <= parser.idle_seconds() < 1
+
+        parser.feed(b"beat\n\n")
+        assert parser.heartbeats == 2
+        print_test_pass()
+
+    def test_large_event_in_small_chunks(self):
+        data = json.dumps({"detections": list(range(100000))}).encode()
+        body = b"data: " + data + b"\n\n"
+        chunks = [body[i : i + 64] for i in range(0, len(body), 64)]
+        with mock.patch(
+            "matroid.src.sse.decode_json", wraps=sse.decode_json
+        ) as decode_json:
+            events = list(stream_sse_events(chunks))
+
+        assert len(events[0]["detections"]) == 100000
+        assert decode_json.call_count == 1
+        print_test_pass()
+
+    def test_gzip_stream(self):
+        body = gzip.compress(b'data: {"a": 1}\n\ndata: {"a": 2}\n\n')
+        response = requests.Response()
+        response.raw = urllib3.HTTPResponse(
+            io.BytesIO(body),
+            headers={"Content-Encoding": "gzip"},
+            preload_content=False,
+            # as requests opens it, leaving decoding to whoever reads it
+            decode_content=False,
+        )
+
+        assert list(stream_sse_events(raw_chunks(response, 8))) == [{"a": 1}, {"a": 2}]
+        print_test_pass()